@@ -16,7 +16,7 @@ import {
   RefreshCw,
   AlertCircle
 } from 'lucide-react';
-import { sendSMS, getHistory } from '../utils/api';
+import { sendSMS, getHistory, getMessageStats, createCampaign } from '../utils/api';
 import { useNavigate } from 'react-router-dom';
 import wsService from '../utils/websocket';
 import notificationService from '../utils/notifications';
@@ -386,33 +386,22 @@ const Dashboard: React.FC = () => {
     };
   }, [isWebSocketConnected]); 
 
-  // Memoized stats calculation
-  const calculateStats = useCallback((messages: Message[]): Stats => {
-    const sent = messages.filter((msg) => msg.is_sent).length;
-    const received = messages.filter((msg) => msg.is_received).length;
-    const total = messages.length;
-    const thisMonth = messages.filter((msg) => {
-      const msgDate = new Date(msg.sent_at);
-      const now = new Date();
-      return msgDate.getMonth() === now.getMonth() && msgDate.getFullYear() === now.getFullYear();
-    }).length;
-
-    return {
-      totalSent: sent,
-      totalReceived: received,
-      successRate: total > 0 ? Math.round((sent / total) * 100) : 0,
-      thisMonth,
-    };
-  }, []);
+  // Stats du tableau de bord: compteurs quotidiens agrégés côté serveur
+  const statsFromSummary = useCallback((summary: any): Stats => ({
+    totalSent: summary.totals.sent,
+    totalReceived: summary.totals.received,
+    successRate: Math.round(summary.success_rate),
+    thisMonth: summary.this_month.sent + summary.this_month.received,
+  }), []);
 
   // Fetch data
   const fetchData = useCallback(async () => {
     setFetchLoading(true);
     setFetchError('');
     try {
-      const data = await getHistory();
+      const [data, summary] = await Promise.all([getHistory(), getMessageStats()]);
       setMessages(data);
-      setStats(calculateStats(data));
+      setStats(statsFromSummary(summary));
     } catch (err: any) {
       setFetchError('Erreur lors du chargement des données. Veuillez réessayer.');
       console.error('Erreur lors du chargement:', err);
@@ -420,7 +409,7 @@ const Dashboard: React.FC = () => {
     } finally {
       setFetchLoading(false);
     }
-  }, [calculateStats]);
+  }, [statsFromSummary]);
 
   useEffect(() => {
     fetchData();
@@ -504,31 +493,18 @@ const Dashboard: React.FC = () => {
     }
 
     try {
-      let successCount = 0;
-      let errorCount = 0;
-
-      for (const recipient of validRecipients) {
-        try {
-          await sendSMS({
-            recipient,
-            message: bulkMessage.message.trim(),
-          });
-          successCount++;
-        } catch (err) {
-          errorCount++;
-          console.error(`Erreur envoi vers ${recipient}:`, err);
-        }
-      }
+      // Une seule requête: le serveur persiste et diffuse la campagne
+      const response = await createCampaign({
+        recipients: validRecipients,
+        message: bulkMessage.message.trim(),
+      });
 
       setBulkMessage({ recipients: '', message: '', file: null });
+      notificationService.success(
+        `Campagne créée: ${response.campaign.total_recipients} messages en cours d'envoi`
+      );
+      setActiveTab('overview');
       await fetchData();
-      
-      if (errorCount === 0) {
-        notificationService.success(`${successCount} messages envoyés avec succès !`);
-        setActiveTab('overview');
-      } else {
-        notificationService.warning(`${successCount} envoyés, ${errorCount} échecs`);
-      }
 
     } catch (err: any) {
       setError(err.response?.data?.error || 'Erreur lors de l\'envoi en masse.');
@@ -284,11 +284,23 @@ const Channels = () => {
         handleNewMessageReceived(data);
       });
 
+      // SMS entrants traités par lots: une seule notification pour plusieurs messages
+      wsService.on('new_messages', (data) => {
+        console.log(`${data.count} nouveaux messages reçus`);
+        (data.messages || []).forEach(handleNewMessageReceived);
+      });
+
       wsService.on('message_status_update', (data) => {
         console.log('Statut message mis à jour:', data);
         handleMessageStatusUpdate(data);
       });
 
+      // Accusés de réception traités par lots: une seule notification pour plusieurs statuts
+      wsService.on('message_status_updates', (data) => {
+        console.log(`${data.count} statuts mis à jour`);
+        (data.updates || []).forEach(handleMessageStatusUpdate);
+      });
+
       wsService.on('error', (error) => {
         console.error('Erreur WebSocket:', error);
         notificationService.error('Erreur de connexion temps réel');
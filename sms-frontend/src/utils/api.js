@@ -66,6 +66,34 @@ export const sendSMS = async (data) => {
   return response.data;
 };
 
+// Créer une campagne d'envoi en masse (diffusion côté serveur)
+export const createCampaign = async (data) => {
+  const response = await api.post('sms/campaigns/create/', data);
+  return response.data;
+};
+
+// Suivre la progression d'une campagne
+export const getCampaign = async (campaignId) => {
+  const response = await api.get(`sms/campaigns/${campaignId}/`);
+  return response.data;
+};
+
+// Importer des contacts depuis un fichier CSV/XLSX (traitement côté serveur)
+export const importContacts = async (file) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  const response = await api.post('sms/contacts/import/', formData, {
+    headers: { 'Content-Type': 'multipart/form-data' },
+  });
+  return response.data;
+};
+
+// Suivre la progression d'un import de contacts
+export const getContactImport = async (importId) => {
+  const response = await api.get(`sms/contacts/imports/${importId}/`);
+  return response.data;
+};
+
 // Obtenir toutes les conversations de l'utilisateur
 export const getConversations = async () => {
   const response = await api.get('sms/conversations/');
@@ -79,8 +107,9 @@ export const getConversationDetail = async (conversationId) => {
 };
 
 // Obtenir les messages d'une conversation spécifique
-export const getConversationMessages = async (conversationId) => {
-  const response = await api.get(`sms/conversations/${conversationId}/messages/`);
+// Réponse paginée par curseur: { results, before, after } (before = page plus ancienne)
+export const getConversationMessages = async (conversationId, cursors = {}) => {
+  const response = await api.get(`sms/conversations/${conversationId}/messages/`, { params: cursors });
   return response.data;
 };
 
@@ -102,15 +131,21 @@ export const markMessagesAsRead = async (conversationId) => {
   return response.data;
 };
 
-// Rechercher des conversations
-export const searchConversations = async (query) => {
-  const response = await api.get(`sms/conversations/search/?q=${encodeURIComponent(query)}`);
+// Rechercher des conversations (résultats classés et paginés: { count, next, previous, results })
+export const searchConversations = async (query, page = 1) => {
+  const response = await api.get('sms/conversations/search/', { params: { q: query, page } });
   return response.data;
 };
 
-// Obtenir l'historique global des SMS (ancien endpoint)
-export const getHistory = async () => {
-  const response = await api.get('sms/history/');
+// Obtenir l'historique global des SMS (ancien endpoint), page la plus récente
+export const getHistory = async (cursors = {}) => {
+  const response = await api.get('sms/history/', { params: cursors });
+  return response.data.results;
+};
+
+// Statistiques d'envoi agrégées par jour côté serveur (compteurs quotidiens)
+export const getMessageStats = async (days = 30) => {
+  const response = await api.get('sms/stats/', { params: { days } });
   return response.data;
 };
 
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import CustomUser, OAuthToken
+from .models import CustomUser, OAuthToken, RateLimitBucket
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
@@ -18,4 +18,9 @@ class OAuthTokenAdmin(admin.ModelAdmin):
     list_display = ('access_token', 'expires_in', 'created_at')
     search_fields = ('access_token',)
     list_filter = ('created_at',)
-    readonly_fields = ('access_token', 'refresh_token', 'expires_in', 'created_at')
\ No newline at end of file
+    readonly_fields = ('access_token', 'refresh_token', 'expires_in', 'created_at')
+
+@admin.register(RateLimitBucket)
+class RateLimitBucketAdmin(admin.ModelAdmin):
+    list_display = ('key', 'tokens', 'updated_at')
+    readonly_fields = ('key', 'tokens', 'updated_at')
\ No newline at end of file
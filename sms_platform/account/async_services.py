@@ -0,0 +1,153 @@
+# account/async_services.py - Client Orange SMS asyncio (vues ASGI, consumers, dispatchers)
+
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .circuitbreaker import CircuitBreaker, is_breaker_failure
+from .metrics import metrics
+from .ratelimit import OrangeRateLimiter
+from .services import OrangeAPIError, OrangeOAuth
+from .transport import get_transport_config
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_async_config(key, default=None):
+    """Lit une option de ORANGE_SMS_CONFIG['ASYNC'] avec valeur par défaut"""
+    return getattr(settings, 'ORANGE_SMS_CONFIG', {}).get('ASYNC', {}).get(key, default)
+
+
+class AsyncOrangeClient:
+    """
+    Équivalent asynchrone de OrangeOAuth.send_sms / check_sms_balance
+    Un sémaphore borne le nombre de requêtes Orange en vol pour ce client;
+    les résultats ont la même forme que le chemin synchrone.
+
+    Usage:
+        async with AsyncOrangeClient() as client:
+            result = await client.send_sms('+221771234567', 'Bonjour')
+    """
+
+    def __init__(self, max_concurrency=None, base_url=None):
+        if httpx is None:
+            raise ImproperlyConfigured("Le client Orange asynchrone nécessite httpx (pip install httpx)")
+
+        config = get_transport_config()
+        self.max_concurrency = max_concurrency or get_async_config('MAX_CONCURRENCY', 200)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=(base_url or config['BASE_URL']).rstrip('/'),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=config['POOL_SIZE']
+            ),
+            timeout=httpx.Timeout(config['READ_TIMEOUT'], connect=config['CONNECT_TIMEOUT']),
+            headers={'User-Agent': 'Orange-SMS-Django/1.0'}
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _request(self, method, path, **kwargs):
+        """Requête bornée par le sémaphore et surveillée par le disjoncteur partagé avec OrangeTransport"""
+        breaker = CircuitBreaker.get('orange')
+        breaker.before_call()
+
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except Exception:
+                breaker.record_failure(time.monotonic() - started)
+                raise
+
+        if is_breaker_failure(response.status_code):
+            breaker.record_failure(time.monotonic() - started)
+        else:
+            breaker.record_success(time.monotonic() - started)
+        return response
+
+    async def get_access_token(self):
+        """Token en mémoire si possible, sinon renouvellement synchrone hors boucle"""
+        provider = OrangeOAuth.token_provider()
+        token = provider.get_cached_token()
+        if token:
+            return token
+        return await sync_to_async(provider.get_token)()
+
+    async def send_sms(self, recipient_phone, message, sender_name=None):
+        """Envoi SMS asynchrone, même résultat que OrangeOAuth.send_sms"""
+        sms_request = OrangeOAuth.prepare_sms_request(recipient_phone, message, sender_name)
+
+        try:
+            CircuitBreaker.get('orange').raise_if_open()
+
+            for attempt in range(2):
+                access_token = await self.get_access_token()
+                if not access_token:
+                    raise Exception("Impossible d'obtenir un token d'accès")
+
+                await OrangeRateLimiter.get_default().acquire_async(OrangeOAuth.API_SENDER_PHONE)
+
+                started = time.monotonic()
+                response = await self._request(
+                    'POST',
+                    sms_request['path'],
+                    json=sms_request['payload'],
+                    headers=OrangeOAuth.api_headers(access_token)
+                )
+                metrics.observe('orange.sms.latency', time.monotonic() - started)
+
+                try:
+                    result = OrangeOAuth.parse_sms_response(response, sms_request)
+                except OrangeAPIError as e:
+                    if e.status_code == 401:
+                        await sync_to_async(OrangeOAuth.token_provider().invalidate)(access_token)
+                        if attempt == 0:
+                            continue  # Nouvel essai immédiat avec le token renouvelé
+                    raise
+                metrics.incr('orange.sms.sent')
+                return result
+
+        except Exception as e:
+            metrics.incr('orange.sms.errors')
+            logger.error(f"Erreur envoi SMS (async): {e}")
+            raise
+
+    async def send_sms_with_default_sender(self, recipient_phone, message):
+        return await self.send_sms(
+            recipient_phone=recipient_phone,
+            message=message,
+            sender_name=OrangeOAuth.DEFAULT_SENDER_NAME
+        )
+
+    async def check_sms_balance(self):
+        """Vérifie le solde SMS restant, même résultat que OrangeOAuth.check_sms_balance"""
+        try:
+            access_token = await self.get_access_token()
+            response = await self._request(
+                'GET',
+                OrangeOAuth.CONTRACTS_PATH,
+                headers={'Authorization': f'Bearer {access_token}', 'Accept': 'application/json'}
+            )
+            return OrangeOAuth.parse_balance_response(response)
+
+        except Exception as e:
+            logger.error(f"Erreur vérification solde (async): {e}")
+            return None
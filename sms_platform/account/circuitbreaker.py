@@ -0,0 +1,186 @@
+# account/circuitbreaker.py - Disjoncteur autour de l'API Orange
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def get_breaker_config(key, default=None):
+    """Lit une option de ORANGE_SMS_CONFIG['CIRCUIT_BREAKER'] avec valeur par défaut"""
+    return getattr(settings, 'ORANGE_SMS_CONFIG', {}).get('CIRCUIT_BREAKER', {}).get(key, default)
+
+
+def is_breaker_failure(status_code):
+    """Réponses qui comptent comme une défaillance d'Orange (pas les erreurs client 4xx)"""
+    return status_code >= 500 or status_code in (408, 429)
+
+
+class CircuitOpenError(Exception):
+    """Orange est considéré indisponible: l'appel est refusé sans attendre le timeout"""
+
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à fenêtre glissante (par process)
+    - fermé: les appels passent, erreurs et latences sont mesurées sur WINDOW secondes
+    - ouvert: au-delà du seuil d'erreurs ou d'appels lents, les appels échouent immédiatement
+    - semi-ouvert: après OPEN_SECONDS, quelques appels de test décident de la fermeture
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, name):
+        self.name = name
+        self.enabled = get_breaker_config('ENABLED', True)
+        self.window = get_breaker_config('WINDOW', 30)
+        self.min_calls = get_breaker_config('MIN_CALLS', 10)
+        self.error_threshold = get_breaker_config('ERROR_THRESHOLD', 0.5)
+        self.slow_call_seconds = get_breaker_config('SLOW_CALL_SECONDS', 5)
+        self.slow_threshold = get_breaker_config('SLOW_THRESHOLD', 0.5)
+        self.open_seconds = get_breaker_config('OPEN_SECONDS', 30)
+        self.half_open_calls = get_breaker_config('HALF_OPEN_CALLS', 1)
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (instant, échec, lent)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        metrics.set_gauge(f"{self.name}.circuit.state", STATE_GAUGE[CLOSED])
+
+    @classmethod
+    def get(cls, name='orange'):
+        """Disjoncteur partagé du process pour un service donné"""
+        if name not in cls._instances:
+            with cls._instances_lock:
+                if name not in cls._instances:
+                    cls._instances[name] = cls(name)
+        return cls._instances[name]
+
+    @classmethod
+    def reset(cls):
+        """Oublie tous les disjoncteurs (changement de configuration, tests)"""
+        with cls._instances_lock:
+            cls._instances = {}
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh_state(time.monotonic())
+            return self._state
+
+    def retry_after(self):
+        """Secondes avant le prochain appel de test (0 si le circuit est fermé)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refresh_state(now)
+            if self._state != OPEN:
+                return 0
+            return max(self.open_seconds - (now - self._opened_at), 0)
+
+    def raise_if_open(self):
+        """Refus anticipé (avant token et limiteur de débit) sans consommer d'appel de test"""
+        retry_after = self.retry_after() if self.enabled else 0
+        if retry_after:
+            metrics.incr(f"{self.name}.circuit.rejected")
+            raise CircuitOpenError(f"Service {self.name} indisponible (circuit ouvert)", retry_after=retry_after)
+
+    def before_call(self):
+        """À appeler avant chaque requête: lève CircuitOpenError si elle doit être refusée"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._refresh_state(now)
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return
+            retry_after = max(self.open_seconds - (now - self._opened_at), 1)
+
+        metrics.incr(f"{self.name}.circuit.rejected")
+        raise CircuitOpenError(f"Service {self.name} indisponible (circuit ouvert)", retry_after=retry_after)
+
+    def record_success(self, latency):
+        self._record(failed=False, latency=latency)
+
+    def record_failure(self, latency):
+        self._record(failed=True, latency=latency)
+
+    def _record(self, failed, latency):
+        if not self.enabled:
+            return
+
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+                if failed or slow:
+                    self._transition(OPEN, now, "appel de test en echec")
+                else:
+                    self._calls.clear()
+                    self._transition(CLOSED, now, "appel de test reussi")
+                return
+
+            self._calls.append((now, failed, slow))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                total = len(self._calls)
+                error_rate = sum(1 for _, f, _ in self._calls if f) / total
+                slow_rate = sum(1 for _, _, s in self._calls if s) / total
+                if error_rate >= self.error_threshold or slow_rate >= self.slow_threshold:
+                    self._transition(
+                        OPEN, now,
+                        f"taux d'erreur {error_rate:.0%}, appels lents {slow_rate:.0%} sur {total} appels"
+                    )
+
+    def _refresh_state(self, now):
+        """Doit être appelé avec self._lock"""
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN, now, "delai d'ouverture ecoule")
+
+    def _transition(self, state, now, reason):
+        """Doit être appelé avec self._lock"""
+        previous = self._state
+        self._state = state
+        if state == OPEN:
+            self._opened_at = now
+            self._probes = 0
+            metrics.incr(f"{self.name}.circuit.opened")
+        metrics.set_gauge(f"{self.name}.circuit.state", STATE_GAUGE[state])
+
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Disjoncteur {self.name}: {previous} -> {state} ({reason})")
+
+
+def _reset_after_fork():
+    # Un process enfant repart d'un état fermé et d'un verrou neuf
+    CircuitBreaker._instances = {}
+    CircuitBreaker._instances_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,96 @@
+# account/management/commands/run_orange_stub.py - Faux serveur Orange pour tests et benchmarks
+
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class OrangeStubHandler(BaseHTTPRequestHandler):
+    """Répond aux endpoints OAuth, envoi SMS et contrats comme l'API Orange"""
+    protocol_version = 'HTTP/1.1'  # Keep-alive comme api.orange.com
+    disable_nagle_algorithm = True
+    latency = 0.0
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status_code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self._reply(503, {'requestError': {'serviceException': {'text': 'Stub: service indisponible'}}})
+            return False
+        return True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+
+        if not self._simulate():
+            return
+
+        if self.path.startswith('/oauth/'):
+            self._reply(200, {'token_type': 'Bearer', 'access_token': uuid.uuid4().hex, 'expires_in': 3600})
+        elif self.path.startswith('/smsmessaging/'):
+            request_id = str(uuid.uuid4())
+            self._reply(201, {'outboundSMSMessageRequest': {
+                'resourceURL': f"http://{self.headers.get('Host')}{self.path}/{request_id}"
+            }})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_GET(self):
+        if not self._simulate():
+            return
+
+        if self.path.startswith('/sms/admin/v1/contracts'):
+            self._reply(200, [{
+                'availableUnits': 1000000, 'status': 'ACTIVE', 'expirationDate': None,
+                'country': 'SEN', 'offerName': 'STUB'
+            }])
+        else:
+            self._reply(404, {'error': 'not found'})
+
+
+class OrangeStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Supporte des centaines de connexions simultanées
+
+
+class Command(BaseCommand):
+    help = "Démarre un faux serveur API Orange local (ORANGE_TRANSPORT_URL=http://127.0.0.1:<port>)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latency', type=float, default=0.0, help="Latence simulée par requête (ms)")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Proportion de réponses 503 (0-1)")
+
+    def handle(self, *args, **options):
+        OrangeStubHandler.latency = options['latency'] / 1000
+        OrangeStubHandler.error_rate = options['error_rate']
+
+        server = OrangeStubServer((options['host'], options['port']), OrangeStubHandler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub Orange sur http://{options['host']}:{options['port']} "
+            f"(latence {options['latency']} ms, erreurs {options['error_rate']:.0%})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
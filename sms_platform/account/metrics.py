@@ -0,0 +1,96 @@
+# account/metrics.py - Métriques en mémoire du process (compteurs, durées, jauges)
+
+import threading
+import time
+from collections import deque
+
+
+class Metrics:
+    """
+    Registre de métriques simple et thread-safe, propre à chaque process
+    - incr(): compteurs cumulés + débit sur la dernière minute
+    - observe(): durées (nombre, total, moyenne, max)
+    - set_gauge(): valeurs instantanées (état d'un disjoncteur, taille d'un cache...)
+    """
+
+    RATE_WINDOW = 60  # Secondes prises en compte pour les débits
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._counters = {}
+        self._windows = {}
+        self._timers = {}
+        self._gauges = {}
+
+    def incr(self, name, value=1):
+        now = int(time.time())
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            window = self._windows.setdefault(name, deque())
+            if window and window[-1][0] == now:
+                window[-1][1] += value
+            else:
+                window.append([now, value])
+            self._trim(window, now)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self._timers.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            timer['count'] += 1
+            timer['total'] += seconds
+            timer['max'] = max(timer['max'], seconds)
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def rate(self, name):
+        """Événements par seconde sur la dernière fenêtre"""
+        now = int(time.time())
+        with self._lock:
+            window = self._windows.get(name)
+            if not window:
+                return 0.0
+            self._trim(window, now)
+            span = min(self.RATE_WINDOW, max(now - self._started_at, 1))
+            return sum(count for _, count in window) / span
+
+    def snapshot(self):
+        names = list(self._counters)
+        rates = {name: round(self.rate(name), 3) for name in names}
+        with self._lock:
+            return {
+                'uptime_seconds': round(time.time() - self._started_at, 1),
+                'counters': dict(self._counters),
+                'rates_per_second': rates,
+                'timers': {
+                    name: {
+                        'count': timer['count'],
+                        'total': round(timer['total'], 6),
+                        'avg': round(timer['total'] / timer['count'], 6) if timer['count'] else 0.0,
+                        'max': round(timer['max'], 6),
+                    }
+                    for name, timer in self._timers.items()
+                },
+                'gauges': dict(self._gauges),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._started_at = time.time()
+            self._counters.clear()
+            self._windows.clear()
+            self._timers.clear()
+            self._gauges.clear()
+
+    def _trim(self, window, now):
+        while window and window[0][0] <= now - self.RATE_WINDOW:
+            window.popleft()
+
+
+metrics = Metrics()
@@ -67,4 +67,13 @@ class OAuthToken(models.Model):
                 expires_in__gt=timezone.now()
             ).latest('created_at')
         except cls.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+class RateLimitBucket(models.Model):
+    """Seau à jetons partagé entre process (limiteur de débit Orange)"""
+    key = models.CharField(max_length=100, primary_key=True)  # Ex: numéro expéditeur
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.2f} jetons"
@@ -0,0 +1,88 @@
+# account/phone.py - Normalisation et validation des numéros sénégalais, à l'unité ou en masse
+
+import re
+
+# Séparateurs supprimés avant analyse (espaces, tirets, parenthèses)
+_SEPARATORS = str.maketrans('', '', ' -()\t\r\n')
+
+# 221XXXXXXXXX, 00221XXXXXXXXX ou numéro local 7XXXXXXXX / 3XXXXXXXX
+_SHAPE = re.compile(r'(?:221|00221)(.{9})|([37].{8})')
+
+# Cas courant d'un numéro déjà propre et valide: une seule expression, sans nettoyage
+_CLEAN_MOBILE = re.compile(r'\+?(?:221|00221)?([37][0-9]{8})')
+
+# Préfixes mobiles Sénégal: 9 chiffres commençant par 3 ou 7
+_MOBILE = re.compile(r'[37][0-9]{8}')
+
+REASON_EMPTY = "Numéro vide"
+REASON_FORMAT = "Format non reconnu"
+REASON_NOT_MOBILE = "Numéro non mobile sénégalais"
+
+
+def normalize_phone(phone_number):
+    """
+    Analyse un numéro: retourne (numéro normalisé +221XXXXXXXXX ou None, motif de rejet ou None)
+    Un numéro au bon format mais non mobile est normalisé et rejeté (REASON_NOT_MOBILE)
+    """
+    if not phone_number:
+        return None, REASON_EMPTY
+
+    match = _CLEAN_MOBILE.fullmatch(phone_number) if isinstance(phone_number, str) else None
+    if match:
+        return f"+221{match.group(1)}", None
+
+    clean = str(phone_number).translate(_SEPARATORS)
+    if clean.startswith('+'):
+        clean = clean[1:]
+
+    match = _SHAPE.fullmatch(clean)
+    if not match:
+        return None, REASON_FORMAT
+
+    local = match.group(1) or match.group(2)
+    normalized = f"+221{local}"
+    if not _MOBILE.fullmatch(local):
+        return normalized, REASON_NOT_MOBILE
+    return normalized, None
+
+
+def normalize_phone_numbers(phone_numbers):
+    """
+    Normalise, valide et déduplique une liste de numéros en un seul passage
+    Retourne un dict:
+        valid: numéros normalisés uniques, dans l'ordre d'arrivée
+        rejected: [{'row': index, 'value': valeur brute, 'reason': motif}]
+        duplicates: nombre de lignes valides ignorées car déjà présentes
+        total: nombre de lignes analysées
+    """
+    valid = []
+    rejected = []
+    seen = set()
+    duplicates = 0
+    total = 0
+
+    fast_match = _CLEAN_MOBILE.fullmatch
+
+    for row, raw in enumerate(phone_numbers):
+        total += 1
+        # Chemin rapide en ligne pour les numéros déjà propres (l'immense majorité)
+        match = fast_match(raw) if type(raw) is str else None
+        if match:
+            normalized, reason = '+221' + match.group(1), None
+        else:
+            normalized, reason = normalize_phone(raw)
+
+        if reason:
+            rejected.append({'row': row, 'value': raw, 'reason': reason})
+        elif normalized in seen:
+            duplicates += 1
+        else:
+            seen.add(normalized)
+            valid.append(normalized)
+
+    return {
+        'valid': valid,
+        'rejected': rejected,
+        'duplicates': duplicates,
+        'total': total,
+    }
@@ -0,0 +1,180 @@
+# account/ratelimit.py - Limiteur de débit (seau à jetons) aligné sur le contrat Orange
+
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def get_rate_limit_config():
+    return getattr(settings, 'ORANGE_SMS_CONFIG', {}).get('RATE_LIMIT', {})
+
+
+class RateLimitTimeout(Exception):
+    """Aucun jeton disponible avant MAX_WAIT (Orange n'a pas été appelé)"""
+
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after  # Secondes avant le prochain jeton
+
+
+class LocalTokenBucketBackend:
+    """Seaux en mémoire: limite par process (développement, tests, process unique)"""
+    uses_database = False
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key, rate, burst):
+        """Consomme un jeton si possible; retourne 0 ou le délai (s) avant le prochain jeton"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            available = min(burst, tokens + rate * (now - updated_at))
+            if available >= 1:
+                self._buckets[key] = (available - 1, now)
+                return 0
+            self._buckets[key] = (available, now)
+            return (1 - available) / rate
+
+
+class PostgresTokenBucketBackend:
+    """Seaux dans la table account_ratelimitbucket: limite partagée par tous les process"""
+    uses_database = True
+
+    ACQUIRE_SQL = """
+        WITH bucket AS (
+            SELECT key, LEAST(%(burst)s, tokens + %(rate)s * EXTRACT(EPOCH FROM clock_timestamp() - updated_at)) AS available
+            FROM account_ratelimitbucket
+            WHERE key = %(key)s
+            FOR UPDATE
+        )
+        UPDATE account_ratelimitbucket AS b
+        SET tokens = CASE WHEN bucket.available >= 1 THEN bucket.available - 1 ELSE bucket.available END,
+            updated_at = clock_timestamp()
+        FROM bucket
+        WHERE b.key = bucket.key
+        RETURNING bucket.available
+    """
+
+    def __init__(self):
+        self._known_keys = set()
+
+    def try_acquire(self, key, rate, burst):
+        with connection.cursor() as cursor:
+            if key not in self._known_keys:
+                cursor.execute(
+                    "INSERT INTO account_ratelimitbucket (key, tokens, updated_at) "
+                    "VALUES (%s, %s, clock_timestamp()) ON CONFLICT (key) DO NOTHING",
+                    [key, burst]
+                )
+                self._known_keys.add(key)
+
+            cursor.execute(self.ACQUIRE_SQL, {'key': key, 'rate': rate, 'burst': burst})
+            available = float(cursor.fetchone()[0])
+
+        if available >= 1:
+            return 0
+        return (1 - available) / rate
+
+
+class OrangeRateLimiter:
+    """
+    Débit maximal par numéro expéditeur (RATE jetons/s, rafales jusqu'à BURST)
+    Les envois attendent un jeton au lieu d'être refusés par Orange
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, backend=None):
+        config = get_rate_limit_config()
+        self.enabled = config.get('ENABLED', True)
+        self.rate = config.get('RATE', 5)
+        self.burst = config.get('BURST', 10)
+        self.per_sender = config.get('PER_SENDER', {})
+        self.max_wait = config.get('MAX_WAIT', 30)
+
+        if backend is None:
+            backend = config.get('BACKEND', 'auto')
+            if backend == 'auto':
+                backend = 'postgres' if connection.vendor == 'postgresql' else 'local'
+        if isinstance(backend, str):
+            backend = PostgresTokenBucketBackend() if backend == 'postgres' else LocalTokenBucketBackend()
+        self.backend = backend
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls()
+        return cls._default
+
+    def limits_for(self, sender):
+        limits = self.per_sender.get(sender, {})
+        return limits.get('RATE', self.rate), limits.get('BURST', self.burst)
+
+    def capacity(self, sender):
+        """
+        Envois que le seau peut servir en MAX_WAIT au débit configuré (None si le limiteur est désactivé)
+        Réserver davantage de messages d'un coup ne ferait que produire des RateLimitTimeout
+        La réserve (BURST) n'est pas comptée: elle est partagée avec les autres process
+        """
+        if not self.enabled:
+            return None
+        rate, _ = self.limits_for(sender)
+        return max(int(rate * self.max_wait), 1)
+
+    def acquire(self, sender):
+        """Bloque jusqu'à obtenir un jeton, retourne le temps d'attente"""
+        if not self.enabled:
+            return 0.0
+
+        rate, burst = self.limits_for(sender)
+        started = time.monotonic()
+        while True:
+            delay = self.backend.try_acquire(f"orange:{sender}", rate, burst)
+            waited = time.monotonic() - started
+            if not delay:
+                return self._record(waited)
+            if waited + delay > self.max_wait:
+                metrics.incr('orange.ratelimit.timeouts')
+                raise RateLimitTimeout(f"Limite de débit Orange atteinte pour {sender}", retry_after=delay)
+            time.sleep(delay)
+
+    async def acquire_async(self, sender):
+        """Version asyncio de acquire(): attend sans bloquer la boucle"""
+        if not self.enabled:
+            return 0.0
+
+        rate, burst = self.limits_for(sender)
+        started = time.monotonic()
+        while True:
+            delay = await self._try_acquire_async(f"orange:{sender}", rate, burst)
+            waited = time.monotonic() - started
+            if not delay:
+                return self._record(waited)
+            if waited + delay > self.max_wait:
+                metrics.incr('orange.ratelimit.timeouts')
+                raise RateLimitTimeout(f"Limite de débit Orange atteinte pour {sender}", retry_after=delay)
+            await asyncio.sleep(delay)
+
+    async def _try_acquire_async(self, key, rate, burst):
+        if self.backend.uses_database:
+            return await sync_to_async(self.backend.try_acquire)(key, rate, burst)
+        return self.backend.try_acquire(key, rate, burst)
+
+    def _record(self, waited):
+        metrics.incr('orange.ratelimit.acquired')
+        metrics.observe('orange.ratelimit.wait', waited)
+        return waited
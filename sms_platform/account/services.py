@@ -1,13 +1,20 @@
 # account/services.py - Version corrigée pour Orange SMS
 
-import requests
 import os
 import logging
-import urllib.parse
+import threading
+import time
 import base64
 from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
+from .circuitbreaker import CircuitBreaker, CircuitOpenError
 from .models import OAuthToken
+from .metrics import metrics
+from .phone import normalize_phone, normalize_phone_numbers
+from .ratelimit import OrangeRateLimiter
+from .transport import OrangeTransport
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from dotenv import load_dotenv
@@ -17,6 +24,144 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+
+def get_token_config(key, default=None):
+    """Lit une option de ORANGE_SMS_CONFIG['TOKEN'] avec valeur par défaut"""
+    return getattr(settings, 'ORANGE_SMS_CONFIG', {}).get('TOKEN', {}).get(key, default)
+
+
+class OrangeAPIError(Exception):
+    """Réponse d'erreur de l'API Orange, avec le code HTTP"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class OrangeTokenProvider:
+    """
+    Cache mémoire du token OAuth Orange
+    - lecture sans requête SQL tant que le token n'a pas expiré
+    - un seul renouvellement à la fois: verrou local + verrou consultatif Postgres entre process
+    - renouvellement en arrière-plan avant l'expiration
+    """
+
+    ADVISORY_LOCK_ID = 72157760  # Clé pg_advisory_xact_lock propre au token Orange
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self):
+        self._access_token = None
+        self._expires_at = None
+        self._lock = threading.Lock()
+        self._timer = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls()
+        return cls._default
+
+    def get_token(self):
+        """Retourne un token valide, en ne touchant la base que s'il faut le renouveler"""
+        token = self.get_cached_token()
+        if token:
+            return token
+
+        with self._lock:
+            # Un autre thread a pu renouveler pendant l'attente du verrou
+            token = self.get_cached_token()
+            if token:
+                return token
+            return self._refresh()
+
+    def invalidate(self, rejected_token):
+        """Oublie un token refusé par Orange (401) et en obtient un autre"""
+        with self._lock:
+            if self._access_token == rejected_token:
+                self._access_token = None
+                self._expires_at = None
+            token = self.get_cached_token()
+            if token:
+                return token
+            return self._refresh(rejected_token=rejected_token)
+
+    def refresh(self, force=False):
+        """Renouvelle le token; force=True ignore un éventuel token encore valide en base"""
+        with self._lock:
+            return self._refresh(force=force)
+
+    def get_cached_token(self):
+        """Token en mémoire s'il est encore valide, sans jamais toucher la base"""
+        if self._access_token and self._expires_at > timezone.now():
+            return self._access_token
+        return None
+
+    def _refresh(self, force=False, rejected_token=None, min_validity=0):
+        """Doit être appelé avec self._lock"""
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Les autres process attendent ici puis réutilisent le token sauvegardé
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", [self.ADVISORY_LOCK_ID])
+
+            token = None
+            if not force:
+                candidates = OAuthToken.objects.filter(
+                    expires_in__gt=timezone.now() + timedelta(seconds=min_validity)
+                )
+                if rejected_token:
+                    candidates = candidates.exclude(access_token=rejected_token)
+                token = candidates.order_by('-created_at').first()
+
+            if token:
+                logger.info("Token valide recupere depuis la base")
+            else:
+                logger.info("Génération d'un nouveau token OAuth")
+                token = OrangeOAuth.fetch_token()
+
+        self._access_token = token.access_token
+        self._expires_at = token.expires_in
+        self._schedule_background_refresh()
+        return token.access_token
+
+    def _schedule_background_refresh(self):
+        if not get_token_config('BACKGROUND_REFRESH', True):
+            return
+
+        renew_before = get_token_config('RENEW_BEFORE', 300)
+        delay = (self._expires_at - timezone.now()).total_seconds() - renew_before
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(delay, 1), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                # Un token avec assez de marge (obtenu par un autre process) est réutilisé
+                self._refresh(min_validity=get_token_config('RENEW_BEFORE', 300))
+            logger.info("Token OAuth renouvele en arriere-plan")
+        except Exception as e:
+            logger.error(f"Erreur renouvellement token en arriere-plan: {e}")
+        finally:
+            connection.close()
+
+
+def _reset_token_provider_after_fork():
+    # Le timer et les verrous du parent n'existent pas dans l'enfant
+    OrangeTokenProvider._default = None
+    OrangeTokenProvider._default_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_token_provider_after_fork)
+
+
 class OrangeOAuth:
     CLIENT_ID = os.getenv('ORANGE_CLIENT_ID', 'c6HwTEwXwa4z4w3PD6bDrvG3FICjvHLo')
     CLIENT_SECRET = os.getenv('ORANGE_CLIENT_SECRET', '0rLdTGf3aNhkTBPgrnVhB9RfI9s9qyX2HRjtj6raTzrV')
@@ -28,28 +173,33 @@ class OrangeOAuth:
     
     SMS_BASE_URL_HTTPS = "https://api.orange.com"
     OAUTH_URL = "https://api.orange.com/oauth/v3/token"
+    OAUTH_PATH = "/oauth/v3/token"
+    CONTRACTS_PATH = "/sms/admin/v1/contracts"
 
     @staticmethod
-    def get_access_token():
-        """Obtient un token OAuth valide"""
-        try:
-            token = OAuthToken.get_valid_token()
-            if token:
-                logger.info("Token existant valide trouvé")
-                return token.access_token
-        except Exception as e:
-            logger.warning(f"Pas de token valide en cache: {e}")
+    def transport():
+        """Transport HTTP partagé (pool de connexions keep-alive)"""
+        return OrangeTransport.get_default()
+
+    @staticmethod
+    def token_provider():
+        """Cache de token partagé par le process"""
+        return OrangeTokenProvider.get_default()
 
-        logger.info("Génération d'un nouveau token OAuth")
-        return OrangeOAuth.force_new_token()
+    @staticmethod
+    def get_access_token():
+        """Obtient un token OAuth valide (cache mémoire, sans requête SQL si valide)"""
+        return OrangeOAuth.token_provider().get_token()
 
     @staticmethod
     def force_new_token():
         """Force la génération d'un nouveau token"""
+        return OrangeOAuth.token_provider().refresh(force=True)
+
+    @staticmethod
+    def fetch_token():
+        """Demande un nouveau token à Orange et le sauvegarde, retourne l'OAuthToken"""
         try:
-            # Supprimer anciens tokens
-            OAuthToken.objects.all().delete()
-            
             # Générer Basic Auth header
             auth_string = base64.b64encode(
                 f"{OrangeOAuth.CLIENT_ID}:{OrangeOAuth.CLIENT_SECRET}".encode()
@@ -58,19 +208,18 @@ class OrangeOAuth:
             headers = {
                 'Content-Type': 'application/x-www-form-urlencoded',
                 'Accept': 'application/json',
-                'Authorization': f'Basic {auth_string}',
-                'User-Agent': 'Orange-SMS-Django/1.0'
+                'Authorization': f'Basic {auth_string}'
             }
             
             data = {"grant_type": "client_credentials"}
             
-            logger.info(f"Requête OAuth vers: {OrangeOAuth.OAUTH_URL}")
+            transport = OrangeOAuth.transport()
+            logger.info(f"Requête OAuth vers: {transport.url(OrangeOAuth.OAUTH_PATH)}")
             
-            response = requests.post(
-                OrangeOAuth.OAUTH_URL,
+            response = transport.post(
+                OrangeOAuth.OAUTH_PATH,
                 data=data,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             logger.info(f"OAuth Response Status: {response.status_code}")
@@ -81,19 +230,21 @@ class OrangeOAuth:
                 expires_in_seconds = result.get('expires_in', 3600)
                 expires_at = timezone.now() + timedelta(seconds=expires_in_seconds - 60)
                 
-                # Sauvegarder le token
-                token = OAuthToken(
+                # Sauvegarder le token, supprimer uniquement les tokens expirés
+                token = OAuthToken.objects.create(
                     access_token=result['access_token'],
                     refresh_token=result.get('refresh_token', ''),
                     expires_in=expires_at
                 )
-                token.save()
+                OAuthToken.objects.filter(expires_in__lte=timezone.now()).delete()
                 
                 logger.info(f"Token sauvegardé - Length: {len(result['access_token'])}")
-                return result['access_token']
+                return token
             else:
                 raise Exception(f"OAuth failed: {response.status_code} - {response.text}")
                 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Erreur OAuth: {e}")
             raise Exception(str(e))
@@ -105,162 +256,173 @@ class OrangeOAuth:
         Input: +221777123456, 221777123456, 777123456
         Output: +221777123456
         """
-        if not phone_number:
-            return None
-            
-        # Nettoyer le numéro
-        clean = phone_number.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-        
-        # Supprimer le + initial pour traitement
-        if clean.startswith('+'):
-            clean = clean[1:]
-        
-        # Cas 1: Numéro complet avec code pays (221XXXXXXXXX)
-        if clean.startswith('221') and len(clean) == 12:
-            return f"+{clean}"
-        
-        # Cas 2: Numéro local sénégalais (7XXXXXXXX ou 3XXXXXXXX)
-        elif (clean.startswith('7') or clean.startswith('3')) and len(clean) == 9:
-            return f"+221{clean}"
-        
-        # Cas 3: Format 00221XXXXXXXXX
-        elif clean.startswith('00221') and len(clean) == 14:
-            return f"+{clean[2:]}"
-        
-        return None
+        return normalize_phone(phone_number)[0]
 
     @staticmethod
     def validate_phone_number(phone_number):
         """Valide un numéro sénégalais selon les standards Orange"""
-        normalized = OrangeOAuth.normalize_senegal_phone(phone_number)
-        if not normalized:
-            return False
-        
-        # Vérifier le format final: +221XXXXXXXXX
-        clean = normalized[1:]  # Enlever le +
-        return (
-            clean.startswith('221') and 
-            len(clean) == 12 and 
-            clean.isdigit() and
-            clean[3] in ['3', '7']  # Préfixes mobiles Sénégal
-        )
+        return normalize_phone(phone_number)[1] is None
 
     @staticmethod
-    def send_sms(recipient_phone, message, sender_name=None):
-        """
-        Envoi SMS via l'API Orange - Version corrigée selon documentation
-        """
-        # ✅ Normalisation stricte du destinataire
-        normalized_recipient = OrangeOAuth.normalize_senegal_phone(recipient_phone)
+    def normalize_phone_numbers(phone_numbers):
+        """Version en masse: voir account.phone.normalize_phone_numbers"""
+        return normalize_phone_numbers(phone_numbers)
+
+    @staticmethod
+    def prepare_sms_request(recipient_phone, message, sender_name=None):
+        """Valide le destinataire et construit le chemin et le payload Orange"""
+        # ✅ Normalisation stricte du destinataire (une seule analyse)
+        normalized_recipient, reason = normalize_phone(recipient_phone)
         if not normalized_recipient:
             raise ValueError(f"Numéro destinataire invalide: {recipient_phone}")
         
-        if not OrangeOAuth.validate_phone_number(normalized_recipient):
+        if reason:
             raise ValueError(f"Numéro destinataire non valide pour le Sénégal: {normalized_recipient}")
         
         if len(message) > 160:
             raise ValueError("Message trop long (max 160 caractères)")
         
-        try:
-            # Obtenir token d'accès
-            access_token = OrangeOAuth.get_access_token()
-            if not access_token:
-                raise Exception("Impossible d'obtenir un token d'accès")
-            
-            # URL selon la documentation Orange avec encoding correct
-            sender_encoded = urllib.parse.quote(OrangeOAuth.API_SENDER_PHONE, safe='')
-            sms_url = f"{OrangeOAuth.SMS_BASE_URL_HTTPS}/smsmessaging/v1/outbound/tel%3A%2B{OrangeOAuth.COUNTRY_CODE}777567226/requests"
-            
-            # Payload conforme à la documentation Orange
-            payload = {
-                "outboundSMSMessageRequest": {
-                    "address": f"tel:{normalized_recipient}",  # Format: tel:+221XXXXXXXXX
-                    "senderAddress": f"tel:{OrangeOAuth.API_SENDER_PHONE}",  # Format: tel:+221777567226
-                    "outboundSMSTextMessage": {
-                        "message": message
-                    }
+        # URL selon la documentation Orange avec encoding correct
+        sms_path = f"/smsmessaging/v1/outbound/tel%3A%2B{OrangeOAuth.COUNTRY_CODE}777567226/requests"
+        
+        # Payload conforme à la documentation Orange
+        payload = {
+            "outboundSMSMessageRequest": {
+                "address": f"tel:{normalized_recipient}",  # Format: tel:+221XXXXXXXXX
+                "senderAddress": f"tel:{OrangeOAuth.API_SENDER_PHONE}",  # Format: tel:+221777567226
+                "outboundSMSTextMessage": {
+                    "message": message
                 }
             }
+        }
+        
+        # Ajouter sender name si configuré
+        if sender_name or OrangeOAuth.DEFAULT_SENDER_NAME:
+            payload["outboundSMSMessageRequest"]["senderName"] = sender_name or OrangeOAuth.DEFAULT_SENDER_NAME
+        
+        return {
+            'recipient': normalized_recipient,
+            'message': message,
+            'sender_name': sender_name or OrangeOAuth.DEFAULT_SENDER_NAME,
+            'path': sms_path,
+            'payload': payload,
+        }
+
+    @staticmethod
+    def api_headers(access_token):
+        return {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+
+    @staticmethod
+    def parse_sms_response(response, sms_request):
+        """
+        Interprète la réponse Orange (requests ou httpx)
+        Retourne le dict résultat, lève OrangeAPIError si Orange refuse l'envoi
+        """
+        logger.info(f"SMS Response Status: {response.status_code}")
+        logger.info(f"SMS Response Headers: {dict(response.headers)}")
+        logger.info(f"SMS Response Body: {response.text}")
+        
+        # Vérification du code de succès selon la doc Orange
+        if response.status_code == 201:
+            result = response.json()
+            outbound_request = result.get('outboundSMSMessageRequest', {})
+            resource_url = outbound_request.get('resourceURL', '')
+            
+            # Extraire message ID du resourceURL
+            message_id = None
+            if resource_url:
+                try:
+                    # Format: .../requests/xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx
+                    message_id = resource_url.split('/')[-1]
+                except:
+                    message_id = resource_url
             
-            # Ajouter sender name si configuré
-            if sender_name or OrangeOAuth.DEFAULT_SENDER_NAME:
-                payload["outboundSMSMessageRequest"]["senderName"] = sender_name or OrangeOAuth.DEFAULT_SENDER_NAME
+            logger.info(f"✅ SMS envoyé avec succès! ID: {message_id}")
             
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'User-Agent': 'Orange-SMS-Django/1.0'
+            return {
+                'success': True,
+                'message_id': message_id,
+                'delivery_status': 'DeliveredToNetwork',  # Accepté par Orange, livraison confirmée par les accusés
+                'recipient': sms_request['recipient'],
+                'sender_used': OrangeOAuth.API_SENDER_PHONE,
+                'sender_name': sms_request['sender_name'],
+                'message': sms_request['message'],
+                'resource_url': resource_url,
+                'raw_response': result
             }
             
-            logger.info(f"=== ENVOI SMS ===")
-            logger.info(f"Destinataire normalisé: {normalized_recipient}")
-            logger.info(f"URL: {sms_url}")
-            logger.info(f"Payload: {payload}")
-            
-            response = requests.post(
-                sms_url,
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            
-            logger.info(f"SMS Response Status: {response.status_code}")
-            logger.info(f"SMS Response Headers: {dict(response.headers)}")
-            logger.info(f"SMS Response Body: {response.text}")
-            
-            # Vérification du code de succès selon la doc Orange
-            if response.status_code == 201:
-                result = response.json()
-                sms_request = result.get('outboundSMSMessageRequest', {})
-                resource_url = sms_request.get('resourceURL', '')
-                
-                # Extraire message ID du resourceURL
-                message_id = None
-                if resource_url:
-                    try:
-                        # Format: .../requests/xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx
-                        message_id = resource_url.split('/')[-1]
-                    except:
-                        message_id = resource_url
+        elif response.status_code == 401:
+            # Token expiré - l'appelant invalide le token
+            logger.warning("Token expiré, génération d'un nouveau...")
+            raise OrangeAPIError("Token expiré, veuillez réessayer", status_code=401)
+            
+        elif response.status_code == 400:
+            # Erreur de requête - analyser le détail
+            try:
+                error_detail = response.json()
+                logger.error(f"Erreur 400 détail: {error_detail}")
+            except:
+                pass
+            raise OrangeAPIError(f"Requête invalide (400): {response.text}", status_code=400)
+            
+        else:
+            error_msg = f"SMS failed: {response.status_code} - {response.text}"
+            logger.error(error_msg)
+            raise OrangeAPIError(error_msg, status_code=response.status_code)
+
+    @staticmethod
+    def send_sms(recipient_phone, message, sender_name=None):
+        """
+        Envoi SMS via l'API Orange - Version corrigée selon documentation
+        """
+        sms_request = OrangeOAuth.prepare_sms_request(recipient_phone, message, sender_name)
+        
+        try:
+            # ✅ Orange indisponible: inutile de réserver un token de débit
+            CircuitBreaker.get('orange').raise_if_open()
+
+            for attempt in range(2):
+                # Obtenir token d'accès
+                access_token = OrangeOAuth.get_access_token()
+                if not access_token:
+                    raise Exception("Impossible d'obtenir un token d'accès")
                 
-                logger.info(f"✅ SMS envoyé avec succès! ID: {message_id}")
+                # Attendre un jeton plutôt que de dépasser le débit du contrat Orange
+                OrangeRateLimiter.get_default().acquire(OrangeOAuth.API_SENDER_PHONE)
                 
-                return {
-                    'success': True,
-                    'message_id': message_id,
-                    'delivery_status': 'DeliveredToNetwork',  # Statut initial selon Orange
-                    'recipient': normalized_recipient,
-                    'sender_used': OrangeOAuth.API_SENDER_PHONE,
-                    'sender_name': sender_name or OrangeOAuth.DEFAULT_SENDER_NAME,
-                    'message': message,
-                    'resource_url': resource_url,
-                    'raw_response': result
-                }
+                transport = OrangeOAuth.transport()
+                logger.info(f"=== ENVOI SMS ===")
+                logger.info(f"Destinataire normalisé: {sms_request['recipient']}")
+                logger.info(f"URL: {transport.url(sms_request['path'])}")
+                logger.info(f"Payload: {sms_request['payload']}")
                 
-            elif response.status_code == 401:
-                # Token expiré - retry automatique
-                logger.warning("Token expiré, génération d'un nouveau...")
-                OrangeOAuth.force_new_token()
-                raise Exception("Token expiré, veuillez réessayer")
+                started = time.monotonic()
+                response = transport.post(
+                    sms_request['path'],
+                    json=sms_request['payload'],
+                    headers=OrangeOAuth.api_headers(access_token)
+                )
+                metrics.observe('orange.sms.latency', time.monotonic() - started)
                 
-            elif response.status_code == 400:
-                # Erreur de requête - analyser le détail
                 try:
-                    error_detail = response.json()
-                    logger.error(f"Erreur 400 détail: {error_detail}")
-                except:
-                    pass
-                raise Exception(f"Requête invalide (400): {response.text}")
-                
-            else:
-                error_msg = f"SMS failed: {response.status_code} - {response.text}"
-                logger.error(error_msg)
-                raise Exception(error_msg)
+                    result = OrangeOAuth.parse_sms_response(response, sms_request)
+                except OrangeAPIError as e:
+                    if e.status_code == 401:
+                        OrangeOAuth.token_provider().invalidate(access_token)
+                        if attempt == 0:
+                            continue  # Nouvel essai immédiat avec le token renouvelé
+                    raise
+                metrics.incr('orange.sms.sent')
+                return result
                 
         except Exception as e:
+            metrics.incr('orange.sms.errors')
             logger.error(f"Erreur envoi SMS: {e}")
-            raise Exception(str(e))
+            raise
 
     @staticmethod
     def send_sms_with_default_sender(recipient_phone, message):
@@ -285,29 +447,30 @@ class OrangeOAuth:
             }
             
             # Endpoint selon documentation Orange
-            url = f"{OrangeOAuth.SMS_BASE_URL_HTTPS}/sms/admin/v1/contracts"
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                contracts = response.json()
-                if contracts and len(contracts) > 0:
-                    contract = contracts[0]  # Premier contrat (Sénégal)
-                    return {
-                        'available_units': contract.get('availableUnits', 0),
-                        'status': contract.get('status', 'UNKNOWN'),
-                        'expiration_date': contract.get('expirationDate'),
-                        'country': contract.get('country'),
-                        'offer_name': contract.get('offerName')
-                    }
-            
-            logger.warning(f"Erreur récupération solde: {response.status_code}")
-            return None
+            response = OrangeOAuth.transport().get(OrangeOAuth.CONTRACTS_PATH, headers=headers)
+            return OrangeOAuth.parse_balance_response(response)
             
         except Exception as e:
             logger.error(f"Erreur vérification solde: {e}")
             return None
 
+    @staticmethod
+    def parse_balance_response(response):
+        if response.status_code == 200:
+            contracts = response.json()
+            if contracts and len(contracts) > 0:
+                contract = contracts[0]  # Premier contrat (Sénégal)
+                return {
+                    'available_units': contract.get('availableUnits', 0),
+                    'status': contract.get('status', 'UNKNOWN'),
+                    'expiration_date': contract.get('expirationDate'),
+                    'country': contract.get('country'),
+                    'offer_name': contract.get('offerName')
+                }
+        
+        logger.warning(f"Erreur récupération solde: {response.status_code}")
+        return None
+
 
 class RealtimeNotificationService:
     """Service pour gérer les notifications temps réel via WebSockets"""
@@ -349,6 +512,48 @@ class RealtimeNotificationService:
             logger.error(f"Erreur notification temps réel: {e}")
             return False
     
+    @staticmethod
+    def notify_new_messages(user_id, notifications):
+        """
+        Notifie en un seul envoi plusieurs nouveaux messages (SMS entrants traités par lots)
+        notifications: liste de {'conversation_id': ..., 'message': message_data}
+        """
+        if len(notifications) == 1:
+            return RealtimeNotificationService.notify_new_message(
+                user_id=user_id,
+                conversation_id=notifications[0]['conversation_id'],
+                message_data=notifications[0]['message']
+            )
+        try:
+            channel_layer = get_channel_layer()
+            if not channel_layer:
+                logger.warning("Channel layer non configuré - Notifications WebSocket désactivées")
+                return False
+
+            user_group = f"user_{user_id}"
+            notification = {
+                'type': 'new_messages',
+                'messages': notifications,
+                'count': len(notifications),
+                'timestamp': timezone.now().isoformat(),
+                'user_id': user_id
+            }
+
+            async_to_sync(channel_layer.group_send)(
+                user_group,
+                {
+                    'type': 'send_notification',
+                    'notification': notification
+                }
+            )
+
+            logger.info(f"Notification de {len(notifications)} nouveaux messages envoyée au groupe {user_group}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Erreur notification temps réel: {e}")
+            return False
+
     @staticmethod
     def notify_message_status_update(user_id, message_id, new_status):
         """Notifie la mise à jour du statut d'un message"""
@@ -378,6 +583,47 @@ class RealtimeNotificationService:
             logger.info(f"Notification statut message envoyée: {message_id} -> {new_status}")
             return True
             
+        except Exception as e:
+            logger.error(f"Erreur notification statut: {e}")
+            return False
+
+    @staticmethod
+    def notify_message_status_updates(user_id, updates):
+        """
+        Notifie en un seul envoi plusieurs changements de statut (accusés de réception traités par lots)
+        updates: liste de {'message_id': ..., 'status': ...}
+        """
+        if len(updates) == 1:
+            return RealtimeNotificationService.notify_message_status_update(
+                user_id=user_id,
+                message_id=updates[0]['message_id'],
+                new_status=updates[0]['status']
+            )
+        try:
+            channel_layer = get_channel_layer()
+            if not channel_layer:
+                logger.warning("Channel layer non configuré")
+                return False
+
+            user_group = f"user_{user_id}"
+            notification = {
+                'type': 'message_status_updates',
+                'updates': updates,
+                'count': len(updates),
+                'timestamp': timezone.now().isoformat()
+            }
+
+            async_to_sync(channel_layer.group_send)(
+                user_group,
+                {
+                    'type': 'send_notification',
+                    'notification': notification
+                }
+            )
+
+            logger.info(f"Notification de {len(updates)} statuts envoyée au groupe {user_group}")
+            return True
+
         except Exception as e:
             logger.error(f"Erreur notification statut: {e}")
             return False
\ No newline at end of file
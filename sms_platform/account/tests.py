@@ -1,3 +1,317 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .circuitbreaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from .models import OAuthToken
+from .phone import REASON_EMPTY, REASON_FORMAT, REASON_NOT_MOBILE, normalize_phone, normalize_phone_numbers
+from .services import OrangeOAuth, OrangeTokenProvider
+from .transport import BaseTransportBackend, OrangeTransport, RequestsBackend
+
+
+class FakeResponse:
+    """Réponse HTTP simulée (interface utilisée de requests.Response)"""
+
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self.data = data or {}
+        self.text = str(self.data)
+
+    def json(self):
+        return self.data
+
+
+class RecordingBackend(BaseTransportBackend):
+    """Backend de test: note les requêtes et rejoue les réponses préparées"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+        self.responses = []
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        return self.responses.pop(0) if self.responses else FakeResponse()
+
+    def close(self):
+        self.closed = True
+
+
+STUB_TRANSPORT = {
+    'BASE_URL': 'http://orange-stub:8080/',
+    'TRANSPORT': {'BACKEND': 'account.tests.RecordingBackend', 'POOL_SIZE': 4, 'READ_TIMEOUT': 7},
+}
+
+
+class OrangeTransportTests(TestCase):
+    """Backend HTTP choisi par configuration: stub local à la place de requests, sans toucher aux services"""
+
+    def setUp(self):
+        OrangeTransport.reset()
+        CircuitBreaker.reset()
+        self.addCleanup(OrangeTransport.reset)
+        self.addCleanup(CircuitBreaker.reset)
+
+    def test_default_backend_is_requests(self):
+        transport = OrangeTransport(base_url='https://api.orange.com')
+        self.assertIsInstance(transport.backend, RequestsBackend)
+        self.assertEqual(transport.backend.timeout, (5, 30))
+
+    @override_settings(ORANGE_SMS_CONFIG=STUB_TRANSPORT)
+    def test_configured_backend_and_base_url(self):
+        transport = OrangeTransport.get_default()
+        self.assertIsInstance(transport.backend, RecordingBackend)
+        self.assertEqual((transport.backend.pool_size, transport.backend.timeout), (4, (5, 7)))
+        self.assertIs(OrangeTransport.get_default(), transport)
+
+        transport.get('/sms/admin/v1/contracts', headers={'Accept': 'application/json'})
+        self.assertEqual(transport.backend.requests, [
+            ('GET', 'http://orange-stub:8080/sms/admin/v1/contracts', {'headers': {'Accept': 'application/json'}}),
+        ])
+
+    def test_reset_closes_backend_and_applies_new_configuration(self):
+        with override_settings(ORANGE_SMS_CONFIG=STUB_TRANSPORT):
+            stub = OrangeTransport.get_default()
+        OrangeTransport.reset()
+        self.assertTrue(stub.backend.closed)
+
+        with override_settings(ORANGE_SMS_CONFIG={'BASE_URL': 'https://api.orange.com'}):
+            transport = OrangeTransport.get_default()
+        self.assertIsNot(transport, stub)
+        self.assertIsInstance(transport.backend, RequestsBackend)
+
+    @override_settings(ORANGE_SMS_CONFIG=STUB_TRANSPORT)
+    def test_services_use_the_configured_backend(self):
+        backend = OrangeOAuth.transport().backend
+        backend.responses.append(FakeResponse(data={'access_token': 'jeton-stub', 'expires_in': 3600}))
+
+        token = OrangeOAuth.fetch_token()
+
+        self.assertEqual(token.access_token, 'jeton-stub')
+        self.assertTrue(OAuthToken.objects.filter(access_token='jeton-stub').exists())
+        method, url, kwargs = backend.requests[0]
+        self.assertEqual((method, url), ('POST', 'http://orange-stub:8080/oauth/v3/token'))
+        self.assertEqual(kwargs['data'], {'grant_type': 'client_credentials'})
+
+
+@override_settings(ORANGE_SMS_CONFIG={'TOKEN': {'BACKGROUND_REFRESH': False}})
+class OrangeTokenProviderTests(TransactionTestCase):
+    """Token OAuth en mémoire: un seul renouvellement à la fois, base relue seulement à l'expiration"""
+
+    def setUp(self):
+        self.provider = OrangeTokenProvider()
+        self.fetches = 0
+        fetch = patch.object(OrangeOAuth, 'fetch_token', side_effect=self.fetch_token)
+        fetch.start()
+        self.addCleanup(fetch.stop)
+
+    def fetch_token(self):
+        self.fetches += 1
+        time.sleep(0.05)  # Appel Orange: laisse les autres threads arriver sur le verrou
+        return OAuthToken.objects.create(
+            access_token=f"jeton-{self.fetches}", expires_in=timezone.now() + timedelta(hours=1)
+        )
+
+    def test_concurrent_callers_share_a_single_refresh(self):
+        barrier = threading.Barrier(8)
+        tokens = []
+
+        def caller():
+            try:
+                barrier.wait()
+                tokens.append(self.provider.get_token())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=caller) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(tokens, ['jeton-1'] * 8)
+
+    def test_valid_token_is_served_without_queries(self):
+        self.provider.get_token()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.provider.get_token(), 'jeton-1')
+
+    def test_expired_token_reuses_a_valid_token_saved_by_another_process(self):
+        self.provider.get_token()
+        self.provider._expires_at = timezone.now() - timedelta(seconds=1)
+        OAuthToken.objects.create(access_token='jeton-autre', expires_in=timezone.now() + timedelta(hours=2))
+
+        self.assertEqual(self.provider.get_token(), 'jeton-autre')
+        self.assertEqual(self.fetches, 1)
+
+    def test_expired_tokens_in_database_trigger_a_new_fetch(self):
+        OAuthToken.objects.create(access_token='jeton-expire', expires_in=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.provider.get_token(), 'jeton-1')
+        self.assertEqual(self.fetches, 1)
+
+    def test_rejected_token_is_not_reused(self):
+        self.provider.get_token()
+        self.assertEqual(self.provider.invalidate('jeton-1'), 'jeton-2')
+        self.assertEqual(self.fetches, 2)
+        # Token déjà remplacé par un autre thread: pas de second appel à Orange
+        self.assertEqual(self.provider.invalidate('jeton-1'), 'jeton-2')
+        self.assertEqual(self.fetches, 2)
+
+
+BREAKER_CONFIG = {'CIRCUIT_BREAKER': {
+    'WINDOW': 30, 'MIN_CALLS': 4, 'ERROR_THRESHOLD': 0.5, 'SLOW_CALL_SECONDS': 5, 'SLOW_THRESHOLD': 0.5,
+    'OPEN_SECONDS': 30, 'HALF_OPEN_CALLS': 1,
+}}
+
+
+@override_settings(ORANGE_SMS_CONFIG=BREAKER_CONFIG)
+class CircuitBreakerTests(TestCase):
+    """Disjoncteur Orange: fermé -> ouvert au-delà du seuil -> semi-ouvert après le délai -> fermé ou rouvert"""
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = patch('account.circuitbreaker.time')
+        clock.start().monotonic.side_effect = lambda: self.now
+        self.addCleanup(clock.stop)
+        self.breaker = CircuitBreaker('test')
+
+    def calls(self, failures, successes=0, latency=0.1):
+        for _ in range(failures):
+            self.breaker.before_call()
+            self.breaker.record_failure(latency)
+        for _ in range(successes):
+            self.breaker.before_call()
+            self.breaker.record_success(latency)
+
+    def open_circuit(self):
+        self.calls(failures=2, successes=2)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_stays_closed_below_minimum_calls_and_threshold(self):
+        self.calls(failures=3)
+        self.assertEqual(self.breaker.state, CLOSED)  # MIN_CALLS non atteint
+
+        self.breaker = CircuitBreaker('test')
+        self.calls(failures=0, successes=3)
+        self.calls(failures=2)
+        self.assertEqual(self.breaker.state, CLOSED)  # 2 échecs sur 5
+
+    def test_old_calls_leave_the_window(self):
+        self.calls(failures=3)
+        self.now += 31
+        self.calls(failures=1, successes=3)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_opens_on_errors_and_rejects_calls(self):
+        self.open_circuit()
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 30)
+        self.now += 10
+        self.assertEqual(self.breaker.retry_after(), 20)
+
+    def test_opens_on_slow_calls(self):
+        self.calls(failures=0, successes=2, latency=6)
+        self.calls(failures=0, successes=2)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_half_open_probe_success_closes(self):
+        self.open_circuit()
+        self.now += 30
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()  # Un seul appel de test à la fois
+        self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.calls(failures=1, successes=2)
+        self.assertEqual(self.breaker.state, CLOSED)  # Fenêtre vidée à la fermeture
+
+    def test_half_open_probe_failure_reopens(self):
+        self.open_circuit()
+        self.now += 30
+        self.breaker.before_call()
+        self.breaker.record_failure(0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.retry_after(), 30)
+
+    def test_disabled_breaker_never_rejects(self):
+        with override_settings(ORANGE_SMS_CONFIG={'CIRCUIT_BREAKER': {**BREAKER_CONFIG['CIRCUIT_BREAKER'], 'ENABLED': False}}):
+            self.breaker = CircuitBreaker('test')
+        self.calls(failures=10)
+        self.breaker.raise_if_open()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_transport_counts_server_errors_but_not_client_errors(self):
+        CircuitBreaker.reset()
+        self.addCleanup(CircuitBreaker.reset)
+        self.addCleanup(OrangeTransport.reset)
+        with override_settings(ORANGE_SMS_CONFIG={**STUB_TRANSPORT, **BREAKER_CONFIG}):
+            transport = OrangeTransport(backend=RecordingBackend)
+            breaker = CircuitBreaker.get('orange')
+        transport.backend.responses.extend(FakeResponse(status_code=400) for _ in range(4))
+        for _ in range(4):
+            transport.post('/smsmessaging/v1/outbound')
+        self.assertEqual(breaker.state, CLOSED)
+
+        transport.backend.responses.extend(FakeResponse(status_code=503) for _ in range(4))
+        for _ in range(4):
+            transport.post('/smsmessaging/v1/outbound')
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            transport.post('/smsmessaging/v1/outbound')
+        self.assertEqual(len(transport.backend.requests), 8)
+
+
+class PhoneNormalizationTests(SimpleTestCase):
+    """Numéros sénégalais: formats acceptés, motifs de rejet, doublons après normalisation"""
+
+    def test_accepted_formats(self):
+        for raw in ('+221771234567', '221771234567', '00221771234567', '771234567', '+221 77 123-45-67',
+                    '(221) 77 123 45 67', '331234567'):
+            self.assertEqual(normalize_phone(raw)[1], None, raw)
+        self.assertEqual(normalize_phone(' 77 123 45 67 '), ('+221771234567', None))
+
+    def test_rejection_reasons(self):
+        self.assertEqual(normalize_phone(''), (None, REASON_EMPTY))
+        self.assertEqual(normalize_phone(None), (None, REASON_EMPTY))
+        self.assertEqual(normalize_phone('77123'), (None, REASON_FORMAT))
+        self.assertEqual(normalize_phone('+33612345678'), (None, REASON_FORMAT))
+        self.assertEqual(normalize_phone('7712a4567'), ('+2217712a4567', REASON_NOT_MOBILE))
+        self.assertEqual(normalize_phone('221812345678'), ('+221812345678', REASON_NOT_MOBILE))
+
+    def test_bulk_result_matches_single_normalization(self):
+        raws = ['+221771234567', '77 123 45 67', '', '221812345678', '00221781234567', 'abc', 771234568]
+        result = normalize_phone_numbers(raws)
+        for row, raw in enumerate(raws):
+            normalized, reason = normalize_phone(raw)
+            if reason:
+                self.assertIn({'row': row, 'value': raw, 'reason': reason}, result['rejected'])
+            else:
+                self.assertIn(normalized, result['valid'])
+
+    def test_bulk_counts_rejections_and_duplicates(self):
+        result = normalize_phone_numbers([
+            '+221771234567', '771234567', '00221 77 123 45 67',  # Même numéro, trois écritures
+            '781234567', '', 'inconnu', '221812345678', '781234567',
+        ])
+        self.assertEqual(result['valid'], ['+221771234567', '+221781234567'])
+        self.assertEqual(result['duplicates'], 3)
+        self.assertEqual(result['total'], 8)
+        self.assertEqual(result['rejected'], [
+            {'row': 4, 'value': '', 'reason': REASON_EMPTY},
+            {'row': 5, 'value': 'inconnu', 'reason': REASON_FORMAT},
+            {'row': 6, 'value': '221812345678', 'reason': REASON_NOT_MOBILE},
+        ])
+        self.assertEqual(OrangeOAuth.normalize_phone_numbers(['771234567', '771234567'])['duplicates'], 1)
+
+    def test_rejected_numbers_are_not_deduplicated(self):
+        result = normalize_phone_numbers(['inconnu', 'inconnu'])
+        self.assertEqual((result['valid'], result['duplicates'], len(result['rejected'])), ([], 0, 2))
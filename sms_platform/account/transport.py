@@ -0,0 +1,160 @@
+# account/transport.py - Couche HTTP vers l'API Orange (sessions persistantes)
+
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .circuitbreaker import CircuitBreaker, is_breaker_failure
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRANSPORT_CONFIG = {
+    'BACKEND': 'account.transport.RequestsBackend',
+    'BASE_URL': None,  # None = ORANGE_SMS_CONFIG['BASE_URL'] (surchargeable pour un stub local)
+    'POOL_SIZE': 20,  # Connexions gardées ouvertes par process
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 30,
+    'KEEP_ALIVE': True,
+}
+
+
+def get_transport_config():
+    """Configuration du transport fusionnée avec les valeurs par défaut"""
+    orange_config = getattr(settings, 'ORANGE_SMS_CONFIG', {})
+    config = dict(DEFAULT_TRANSPORT_CONFIG)
+    config.update(orange_config.get('TRANSPORT', {}))
+    if not config['BASE_URL']:
+        config['BASE_URL'] = orange_config.get('BASE_URL') or 'https://api.orange.com'
+    return config
+
+
+class BaseTransportBackend:
+    """Interface des backends HTTP: request() retourne un objet type requests.Response"""
+
+    def __init__(self, pool_size, connect_timeout, read_timeout, keep_alive=True):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+
+    def request(self, method, url, **kwargs):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RequestsBackend(BaseTransportBackend):
+    """Backend par défaut: requests.Session avec pool de connexions keep-alive"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,  # Un seul hôte: api.orange.com (ou le stub)
+            pool_maxsize=self.pool_size,
+            pool_block=False,
+            max_retries=0  # Les reprises sont gérées au niveau applicatif
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': 'Orange-SMS-Django/1.0',
+            'Connection': 'keep-alive' if self.keep_alive else 'close',
+        })
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class OrangeTransport:
+    """
+    Client HTTP partagé par process vers l'API Orange
+    Les chemins sont relatifs à BASE_URL, le backend est choisi par configuration
+    """
+
+    _default = None
+    _lock = threading.Lock()
+
+    def __init__(self, base_url=None, backend=None, pool_size=None,
+                 connect_timeout=None, read_timeout=None, keep_alive=None):
+        config = get_transport_config()
+        self.base_url = (base_url or config['BASE_URL']).rstrip('/')
+
+        backend_class = backend or config['BACKEND']
+        if isinstance(backend_class, str):
+            backend_class = import_string(backend_class)
+
+        self.backend = backend_class(
+            pool_size=pool_size or config['POOL_SIZE'],
+            connect_timeout=connect_timeout or config['CONNECT_TIMEOUT'],
+            read_timeout=read_timeout or config['READ_TIMEOUT'],
+            keep_alive=config['KEEP_ALIVE'] if keep_alive is None else keep_alive
+        )
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        # ✅ Circuit ouvert: échec immédiat au lieu d'attendre READ_TIMEOUT
+        breaker = CircuitBreaker.get('orange')
+        breaker.before_call()
+
+        started = time.monotonic()
+        try:
+            response = self.backend.request(method, self.url(path), **kwargs)
+        except Exception:
+            breaker.record_failure(time.monotonic() - started)
+            raise
+
+        if is_breaker_failure(response.status_code):
+            breaker.record_failure(time.monotonic() - started)
+        else:
+            breaker.record_success(time.monotonic() - started)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def close(self):
+        self.backend.close()
+
+    @classmethod
+    def get_default(cls):
+        """Transport du process courant, créé à la première utilisation"""
+        if cls._default is None:
+            with cls._lock:
+                if cls._default is None:
+                    cls._default = cls()
+                    logger.info(f"Transport Orange initialise vers {cls._default.base_url}")
+        return cls._default
+
+    @classmethod
+    def reset(cls):
+        """Ferme le transport partagé (changement de configuration, tests)"""
+        with cls._lock:
+            if cls._default is not None:
+                cls._default.close()
+            cls._default = None
+
+
+def _reset_after_fork():
+    # Un process enfant ne doit pas réutiliser les sockets du parent
+    OrangeTransport._default = None
+    OrangeTransport._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
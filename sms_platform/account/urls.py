@@ -1,6 +1,6 @@
 # account/urls.py - Version complète avec toutes les routes
 from django.urls import path
-from .views import RegisterView, ProfileView, ChangePasswordView
+from .views import RegisterView, ProfileView, ChangePasswordView, MetricsView
 
 urlpatterns = [
     # ✅ Endpoint d'inscription - Accès public
@@ -11,4 +11,7 @@ urlpatterns = [
     
     # ✅ Endpoint de changement de mot de passe - Authentification requise
     path('change-password/', ChangePasswordView.as_view(), name='change_password'),
+    
+    # ✅ Métriques d'exploitation - Administrateurs
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -2,8 +2,9 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from .serializers import RegisterSerializer
+from .metrics import metrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -147,4 +148,11 @@ class ChangePasswordView(APIView):
             return Response(
                 {"error": "Erreur lors du changement de mot de passe"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+class MetricsView(APIView):
+    """Métriques du process (débit Orange, attentes du limiteur...) - Administrateurs"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response(metrics.snapshot(), status=status.HTTP_200_OK)
@@ -1,6 +1,6 @@
 # sms/admin.py
 from django.contrib import admin
-from .models import SMSMessage, Conversation, Contact, MessageStatus
+from .models import SMSMessage, Conversation, Contact, ContactImport, InboundMessage, MessageStatus, Campaign, CampaignRecipient
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
@@ -32,6 +32,49 @@ class SMSMessageAdmin(admin.ModelAdmin):
 
 @admin.register(MessageStatus)
 class MessageStatusAdmin(admin.ModelAdmin):
-    list_display = ('message', 'status', 'updated_at')
+    list_display = ('message', 'status', 'attempts', 'next_attempt_at', 'updated_at')
     list_filter = ('status', 'updated_at')
-    search_fields = ('message__message', 'error_message')
\ No newline at end of file
+    search_fields = ('message__message', 'error_message')
+    actions = ['requeue_messages']
+
+    def requeue_messages(self, request, queryset):
+        from .services import OutboxService
+        count = OutboxService.requeue(queryset)
+        self.message_user(request, f"{count} message(s) remis en file d'attente")
+    requeue_messages.short_description = "Remettre en file d'attente (abandonnés / échecs)"
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'name', 'status', 'total_recipients', 'sent_count', 'failed_count', 'created_at')
+    search_fields = ('user__username', 'name', 'message')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'started_at', 'completed_at')
+
+@admin.register(CampaignRecipient)
+class CampaignRecipientAdmin(admin.ModelAdmin):
+    list_display = ('campaign', 'phone_number', 'status', 'updated_at')
+    search_fields = ('phone_number', 'error_message')
+    list_filter = ('status',)
+    raw_id_fields = ('campaign', 'sms')
+
+@admin.register(ContactImport)
+class ContactImportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'file_name', 'status', 'processed_rows', 'imported_count', 'rejected_count', 'created_at')
+    search_fields = ('user__username', 'file_name')
+    list_filter = ('status', 'file_format', 'created_at')
+    readonly_fields = ('created_at', 'started_at', 'completed_at')
+
+@admin.register(InboundMessage)
+class InboundMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'sender_phone', 'recipient_phone', 'status', 'attempts', 'received_at')
+    list_filter = ('status', 'received_at')
+    search_fields = ('sender_phone', 'recipient_phone', 'message_id', 'error_message')
+    readonly_fields = ('received_at', 'claimed_at')
+    actions = ['retry_messages']
+
+    def retry_messages(self, request, queryset):
+        count = queryset.filter(status__in=['rejected', 'failed']).update(
+            status='pending', attempts=0, claimed_at=None, next_attempt_at=None, error_message=''
+        )
+        self.message_user(request, f"{count} SMS entrant(s) remis en file")
+    retry_messages.short_description = "Remettre en file (rejetés / échecs)"
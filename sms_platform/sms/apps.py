@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SmsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sms'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - invalidation du cache des correspondances
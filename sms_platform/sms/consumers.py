@@ -195,11 +195,10 @@ class SMSConsumer(AsyncWebsocketConsumer):
                 user=self.user
             )
             
+            from .services import ConversationService
+
             # Marquer tous les messages non lus comme lus
-            updated_count = conversation.messages.filter(
-                recipient_phone=self.user.telephone,
-                is_read=False
-            ).update(is_read=True)
+            updated_count = ConversationService.mark_as_read(conversation, self.user.telephone)
             
             logger.info(f"{updated_count} messages marques comme lus pour conversation {conversation_id}")  # ✅ Émoji supprimé
             return updated_count
@@ -0,0 +1,110 @@
+# sms/dedup.py - Idempotence des webhooks Orange rejoués (SMS entrants, accusés de réception) par messageId
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from account.metrics import metrics
+from .models import WebhookEvent
+
+
+def get_dedup_config(key, default=None):
+    """Lit une option de SMS_WEBHOOK_DEDUP_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_WEBHOOK_DEDUP_CONFIG', {}).get(key, default)
+
+
+class RecentKeys:
+    """
+    Notifications traitées récemment par ce process (LRU bornée à LOCAL_MAX_SIZE, durée LOCAL_TTL)
+    Acquitte les rejeus d'Orange sans requête; la contrainte unique de WebhookEvent reste la garantie
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()  # clé -> expire à
+
+    def __contains__(self, key):
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._keys.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._keys[key]
+                return False
+            self._keys.move_to_end(key)
+            return True
+
+    def add(self, key):
+        max_size = get_dedup_config('LOCAL_MAX_SIZE', 50000)
+        with self._lock:
+            self._keys[key] = time.monotonic() + get_dedup_config('LOCAL_TTL', 3600)
+            self._keys.move_to_end(key)
+            while len(self._keys) > max_size:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+recent_keys = RecentKeys()
+
+
+def _record(kind, outcome):
+    """Compteurs dedup.<kind>.local_hits / db_hits / misses et part de doublons (jauge dedup.<kind>.hit_rate)"""
+    metrics.incr(f"dedup.{kind}.{outcome}")
+    hits = metrics.get(f"dedup.{kind}.local_hits") + metrics.get(f"dedup.{kind}.db_hits")
+    total = hits + metrics.get(f"dedup.{kind}.misses")
+    metrics.set_gauge(f"dedup.{kind}.hit_rate", round(hits / total, 4) if total else 0.0)
+
+
+def seen_recently(kind, message_id, event=''):
+    """True si ce process a déjà traité cette notification (aucune requête)"""
+    if not message_id or not get_dedup_config('ENABLED', True):
+        return False
+    if (kind, message_id, event) in recent_keys:
+        _record(kind, 'local_hits')
+        return True
+    return False
+
+
+def claim(kind, message_id, event=''):
+    """
+    Enregistre la notification (INSERT ... ON CONFLICT DO NOTHING), à appeler dans la transaction
+    de son traitement: False si elle a déjà été traitée. Sans messageId, rien n'est dédoublonné.
+    La clé n'entre dans le filtre mémoire qu'après validation: un traitement annulé pourra être rejoué
+    """
+    if not message_id or not get_dedup_config('ENABLED', True):
+        return True
+
+    key = (kind, message_id, event)
+    table = WebhookEvent._meta.db_table
+    received_at = WebhookEvent._meta.get_field('received_at').get_db_prep_value(timezone.now(), connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (kind, message_id, event, received_at) VALUES (%s, %s, %s, %s) "
+            f"ON CONFLICT (kind, message_id, event) DO NOTHING",
+            [kind, message_id, event, received_at]
+        )
+        claimed = cursor.rowcount == 1
+
+    if claimed:
+        _record(kind, 'misses')
+        transaction.on_commit(lambda: recent_keys.add(key))
+    else:
+        _record(kind, 'db_hits')
+        recent_keys.add(key)
+    return claimed
+
+
+def purge(days=None):
+    """Supprime les notifications de plus de `days` jours (RETENTION_DAYS): Orange ne les rejouera plus"""
+    days = days or get_dedup_config('RETENTION_DAYS', 7)
+    deleted, _ = WebhookEvent.objects.filter(received_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
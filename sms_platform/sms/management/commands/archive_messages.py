@@ -0,0 +1,92 @@
+# sms/management/commands/archive_messages.py - Partitions mensuelles: création, archivage et restauration
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sms.partitioning import (
+    PARTITIONED_TABLES, PartitionArchiver, add_months, ensure_partitions, get_archive_config,
+    is_partitioned, is_supported, list_partitions, month_start, parse_month
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Gère les partitions mensuelles des messages et statuts: création des mois à venir (--ensure), "
+        "liste (--list), archivage des vieux mois (--archive) et restauration (--restore)"
+    )
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument('--list', action='store_true', help="Lister les partitions attachées")
+        action.add_argument('--ensure', action='store_true', help="Créer les partitions des mois à venir (à lancer chaque mois)")
+        action.add_argument('--archive', action='store_true', help="Détacher et exporter les partitions antérieures à --before / --older-than")
+        action.add_argument('--restore', metavar='PARTITION', help="Réattacher une partition archivée (ex: sms_smsmessage_p2025_01)")
+
+        parser.add_argument('--months-ahead', type=int, help="Mois créés à l'avance avec --ensure")
+        parser.add_argument('--before', help="Archiver les mois antérieurs à AAAA-MM")
+        parser.add_argument('--older-than', type=int, help="Archiver les mois de plus de N mois (défaut: SMS_ARCHIVE_CONFIG['RETENTION_MONTHS'])")
+        parser.add_argument('--format', choices=PartitionArchiver.FORMATS, help="Format d'export (défaut: SMS_ARCHIVE_CONFIG['FORMAT'])")
+        parser.add_argument('--directory', help="Répertoire des archives (défaut: SMS_ARCHIVE_CONFIG['DIRECTORY'])")
+        parser.add_argument('--drop', action='store_true', help="Supprimer les tables détachées une fois l'export vérifié")
+        parser.add_argument('--dry-run', action='store_true', help="Afficher les partitions concernées sans rien modifier")
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError("Le partitionnement n'est disponible que sous PostgreSQL")
+        if not all(is_partitioned(table) for table in PARTITIONED_TABLES):
+            raise CommandError("Tables non partitionnées: appliquez d'abord la migration sms 0009")
+
+        if options['list']:
+            self.list_partitions()
+        elif options['ensure']:
+            created = ensure_partitions(months_ahead=options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS(f"{len(created)} partition(s) créée(s)"))
+            for name in created:
+                self.stdout.write(f"  {name}")
+        elif options['archive']:
+            self.archive(options)
+        else:
+            archiver = PartitionArchiver(directory=options['directory'], file_format=options['format'])
+            try:
+                count = archiver.restore(options['restore'])
+            except FileNotFoundError:
+                raise CommandError(f"Aucun manifeste d'archive pour {options['restore']} dans {archiver.directory}")
+            self.stdout.write(self.style.SUCCESS(f"{options['restore']} réattachée ({count} ligne(s) rechargée(s))"))
+
+    def list_partitions(self):
+        for table in PARTITIONED_TABLES:
+            self.stdout.write(table)
+            for partition in list_partitions(table):
+                if partition['is_default']:
+                    bounds = "DEFAULT"
+                else:
+                    start = partition['from'].date() if partition['from'] else '...'
+                    bounds = f"{start} -> {partition['to'].date()}"
+                self.stdout.write(f"  {partition['name']:<40} {bounds:<28} ~{partition['rows']} ligne(s)")
+
+    def archive(self, options):
+        if options['before']:
+            try:
+                before = parse_month(options['before'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            months = options['older_than'] or get_archive_config('RETENTION_MONTHS', 12)
+            before = add_months(month_start(timezone.now()), -months)
+
+        archiver = PartitionArchiver(directory=options['directory'], file_format=options['format'])
+        candidates = archiver.archivable(before)
+        if not candidates:
+            self.stdout.write(f"Aucune partition antérieure à {before.date()}")
+            return
+
+        for table, partition in candidates:
+            if options['dry_run']:
+                self.stdout.write(f"{partition['name']} serait archivée (~{partition['rows']} ligne(s))")
+                continue
+            manifest = archiver.archive(table, partition, drop=options['drop'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{partition['name']}: {manifest['rows']} ligne(s) -> {manifest['file']}"
+                + (" (table supprimée)" if options['drop'] else " (table détachée conservée)")
+            ))
+
@@ -0,0 +1,194 @@
+# sms/management/commands/benchmark_channel_layer.py - Diffusion multi-process du channel layer PostgreSQL (LISTEN/NOTIFY)
+
+import asyncio
+import multiprocessing
+import queue
+import time
+import uuid
+from collections import Counter
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from sms_platform.channel_layer import PostgresChannelLayer
+
+PHASES = ('broadcast', 'ciblé')
+
+
+def percentile(values, ratio):
+    if not values:
+        return 0
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def expected_counts(options, process):
+    """Messages attendus par consommateur de ce process: chaque diffusion + sa part des envois ciblés"""
+    total = options['processes'] * options['consumers']
+    counts = []
+    for consumer in range(options['consumers']):
+        target = process * options['consumers'] + consumer
+        targeted = len(range(target, options['messages'], total))
+        counts.append({'broadcast': options['messages'], 'ciblé': targeted})
+    return counts
+
+
+def subscriber(process, options, prefix, ready, results):
+    """Process abonné (démarrage spawn: Django est initialisé ici)"""
+    django.setup()
+    results.put(asyncio.run(subscribe(process, options, prefix, ready)))
+
+
+async def subscribe(process, options, prefix, ready):
+    layer = PostgresChannelLayer(
+        database=options['database'], prefix=prefix, capacity=options['messages'] * 2 + 10
+    )
+    counts = expected_counts(options, process)
+    latencies = {phase: [] for phase in PHASES}
+    last_received = {phase: 0 for phase in PHASES}
+
+    # Messages restant à recevoir par phase, pour tout le process
+    remaining = {phase: sum(expected[phase] for expected in counts) for phase in PHASES}
+
+    async def consume(channel, expected):
+        expected = dict(expected)
+        while any(expected.values()):
+            message = await layer.receive(channel)
+            phase, now = message['phase'], time.time()
+            latencies[phase].append(now - message['sent_at'])
+            last_received[phase] = max(last_received[phase], now)
+            expected[phase] -= 1
+            remaining[phase] -= 1
+            if not remaining[phase]:
+                ready.put((phase, process))
+
+    # Comme SMSConsumer: un canal par WebSocket, dans le groupe de son utilisateur (+ un groupe commun)
+    tasks = []
+    for consumer, expected in enumerate(counts):
+        channel = await layer.new_channel()
+        await layer.group_add('bench_all', channel)
+        await layer.group_add(f"bench_user_{process * options['consumers'] + consumer}", channel)
+        tasks.append(asyncio.create_task(consume(channel, expected)))
+    ready.put(('ready', process))
+    # Moins de messages ciblés que de consommateurs: rien à attendre pour ce process
+    for phase in PHASES:
+        if not remaining[phase]:
+            ready.put((phase, process))
+
+    done, pending = await asyncio.wait(tasks, timeout=options['timeout'])
+    for task in pending:
+        task.cancel()
+    await layer.close()
+    return {'latencies': latencies, 'last_received': last_received, 'incomplete': len(pending)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la diffusion du channel layer PostgreSQL entre processus: des process abonnés "
+        "(N consommateurs chacun, comme des WebSockets) et un process émetteur (group_send)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help="Process abonnés (workers daphne simulés)")
+        parser.add_argument('--consumers', type=int, default=50, help="Consommateurs par process")
+        parser.add_argument('--messages', type=int, default=500, help="group_send par phase (diffusion, puis ciblé)")
+        parser.add_argument('--payload', type=int, default=200, help="Taille du texte de chaque notification (octets)")
+        parser.add_argument('--timeout', type=float, default=60, help="Secondes d'attente maximale des abonnés")
+        parser.add_argument('--database', default='default', help="Alias de la base PostgreSQL utilisée")
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['consumers'] < 1 or options['messages'] < 1:
+            raise CommandError("--processes, --consumers et --messages doivent être positifs")
+
+        # Préfixe propre à la mesure: aucun WebSocket réel ne reçoit ces messages
+        prefix = f"bench{uuid.uuid4().hex[:8]}"
+        context = multiprocessing.get_context('spawn')
+        ready, results = context.Queue(), context.Queue()
+        workers = [
+            context.Process(target=subscriber, args=(process, options, prefix, ready, results))
+            for process in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        self.markers = Counter()
+        if not self.wait_for(ready, 'ready', options):
+            for worker in workers:
+                worker.terminate()
+            raise CommandError("Process abonnés non prêts (base PostgreSQL joignable ?)")
+
+        sent = asyncio.run(self.publish(options, prefix, ready))
+
+        reports = []
+        for _ in workers:
+            try:
+                reports.append(results.get(timeout=options['timeout'] + 10))
+            except queue.Empty:
+                break
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+        self.report(options, sent, reports)
+
+    async def publish(self, options, prefix, ready):
+        layer = PostgresChannelLayer(database=options['database'], prefix=prefix)
+        text = 'x' * options['payload']
+        total = options['processes'] * options['consumers']
+        sent = {}
+        for phase in PHASES:
+            started = time.time()
+            for i in range(options['messages']):
+                group = 'bench_all' if phase == 'broadcast' else f"bench_user_{i % total}"
+                await layer.group_send(group, {
+                    'type': 'send_notification',
+                    'phase': phase,
+                    'sent_at': time.time(),
+                    'notification': {'type': 'new_message', 'message': {'id': i, 'message': text}},
+                })
+            sent[phase] = (started, time.time())
+            # Phase suivante une fois tout reçu: ses latences ne comptent pas l'arriéré de celle-ci
+            await asyncio.get_running_loop().run_in_executor(None, self.wait_for, ready, phase, options)
+        await layer.close()
+        return sent
+
+    def wait_for(self, ready, phase, options):
+        """Attend le marqueur de chaque process pour cette étape (ceux des autres étapes sont comptés au passage)"""
+        deadline = time.monotonic() + options['timeout']
+        while self.markers[phase] < options['processes']:
+            try:
+                self.markers[ready.get(timeout=max(deadline - time.monotonic(), 0.01))[0]] += 1
+            except queue.Empty:
+                return False
+        return True
+
+    def report(self, options, sent, reports):
+        total = options['processes'] * options['consumers']
+        expected = {'broadcast': options['messages'] * total, 'ciblé': options['messages']}
+        self.stdout.write(
+            f"{options['processes']} process x {options['consumers']} consommateurs, "
+            f"{options['messages']} group_send par phase, {options['payload']} octets"
+        )
+
+        for phase in PHASES:
+            latencies = sorted(value for report in reports for value in report['latencies'][phase])
+            started, finished = sent[phase]
+            last = max([report['last_received'][phase] for report in reports] + [finished])
+            publish_rate = options['messages'] / (finished - started) if finished > started else 0
+            delivery_rate = len(latencies) / (last - started) if last > started else 0
+            self.stdout.write(
+                f"{phase:>9}: {len(latencies)}/{expected[phase]} livrés - "
+                f"{publish_rate:,.0f} group_send/s - {delivery_rate:,.0f} livraisons/s - "
+                f"latence p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+                f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms, "
+                f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+                f"max {(latencies[-1] if latencies else 0) * 1000:.1f} ms"
+            )
+
+        delivered = sum(len(report['latencies'][phase]) for report in reports for phase in PHASES)
+        if len(reports) < options['processes'] or delivered < sum(expected.values()):
+            self.stdout.write(self.style.WARNING(
+                f"Livraison incomplète: {delivered}/{sum(expected.values())} ({len(reports)} rapport(s) reçu(s))"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Tous les messages ont été livrés à tous les process"))
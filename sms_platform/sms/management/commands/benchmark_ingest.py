@@ -0,0 +1,91 @@
+# sms/management/commands/benchmark_ingest.py - Débit d'enregistrement: SMSMessage.save() contre ingestion en masse
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from account.models import CustomUser
+from sms.models import MessageStatus, SMSMessage
+from sms.services import MessageIngestService
+
+
+class Rollback(Exception):
+    """Annule les données de mesure en fin de benchmark"""
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit (messages/s) de SMSMessage.save() et de MessageIngestService.ingest, sans rien conserver"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000, help="Messages enregistrés par chemin")
+        parser.add_argument('--conversations', type=int, default=500, help="Contacts distincts sur lesquels répartir les messages")
+        parser.add_argument('--batch-size', type=int, help="Taille des lots d'ingestion (SMS_INGEST_CONFIG par défaut)")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            self.stdout.write("Données de mesure annulées")
+
+    def run(self, options):
+        count = options['messages']
+        results = []
+        for label, path in (('save()', self.save_path), ('ingest', self.ingest_path)):
+            # Utilisateur distinct par chemin: chaque mesure crée ses propres conversations
+            user = CustomUser.objects.create(
+                username=f'benchmark-{label}',
+                email=f'benchmark-{len(results)}@example.com',
+                telephone=f'+22170000000{len(results)}'
+            )
+            messages = self.build_messages(user, count, options['conversations'])
+
+            queries = []
+            with connection.execute_wrapper(self.count_queries(queries)):
+                started = time.perf_counter()
+                path(messages, options)
+                elapsed = time.perf_counter() - started
+
+            rate = count / elapsed if elapsed else 0
+            results.append(rate)
+            self.stdout.write(
+                f"{label:>8}: {count} messages en {elapsed:.2f}s - {rate:,.0f} msg/s - {len(queries)} requêtes"
+            )
+
+        if results[0]:
+            self.stdout.write(self.style.SUCCESS(f"Ingestion en masse: x{results[1] / results[0]:.1f}"))
+
+    @staticmethod
+    def count_queries(queries):
+        def wrapper(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+        return wrapper
+
+    @staticmethod
+    def build_messages(user, count, conversations):
+        # Alternance envoyés / reçus pour exercer aussi le compteur de non lus
+        messages = []
+        for i in range(count):
+            contact = f'+2217{i % conversations:08d}'
+            outgoing = i % 2 == 0
+            messages.append(SMSMessage(
+                sender_phone=user.telephone if outgoing else contact,
+                recipient_phone=contact if outgoing else user.telephone,
+                message=f'Message de test {i}',
+                is_sent=outgoing,
+                is_received=not outgoing
+            ))
+        return messages
+
+    @staticmethod
+    def save_path(messages, options):
+        for sms in messages:
+            sms.save()
+            MessageStatus.objects.create(message=sms, status='sent')
+
+    @staticmethod
+    def ingest_path(messages, options):
+        MessageIngestService.ingest(messages, status='sent', batch_size=options['batch_size'])
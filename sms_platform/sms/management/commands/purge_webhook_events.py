@@ -0,0 +1,20 @@
+# sms/management/commands/purge_webhook_events.py - Purge des clés d'idempotence des webhooks Orange
+
+from django.core.management.base import BaseCommand
+
+from sms.dedup import get_dedup_config, purge
+
+
+class Command(BaseCommand):
+    help = "Supprime les notifications Orange traitées depuis plus de N jours (WebhookEvent), à lancer chaque jour"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help="Ancienneté minimale en jours (défaut: SMS_WEBHOOK_DEDUP_CONFIG['RETENTION_DAYS'])"
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] or get_dedup_config('RETENTION_DAYS', 7)
+        deleted = purge(days)
+        self.stdout.write(self.style.SUCCESS(f"{deleted} notification(s) de plus de {days} jour(s) supprimée(s)"))
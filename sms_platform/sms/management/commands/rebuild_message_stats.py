@@ -0,0 +1,44 @@
+# sms/management/commands/rebuild_message_stats.py - Reconstruction des statistiques quotidiennes (DailyMessageStats)
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from account.models import CustomUser
+from sms.services import MessageStatsService
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les compteurs quotidiens à partir des messages et de leurs statuts, "
+        "par paquets d'utilisateurs (une transaction par paquet). À lancer une fois après la migration 0010."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', help="Limiter à ce nom d'utilisateur (répétable)")
+        parser.add_argument('--since', help="Seulement les jours à partir de AAAA-MM-JJ")
+        parser.add_argument('--chunk-size', type=int, default=100, help="Utilisateurs par transaction")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Date invalide: {options['since']} (attendu AAAA-MM-JJ)")
+
+        users = CustomUser.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username__in=options['user'])
+        user_ids = list(users.values_list('id', flat=True))
+
+        chunk_size = max(options['chunk_size'], 1)
+        rows = 0
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            with transaction.atomic():
+                rows += MessageStatsService.rebuild(chunk, since=since)
+            self.stdout.write(f"{min(start + chunk_size, len(user_ids))}/{len(user_ids)} utilisateur(s) traité(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"{rows} compteur(s) reconstruit(s) pour {len(user_ids)} utilisateur(s)"))
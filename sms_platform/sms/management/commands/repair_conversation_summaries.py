@@ -0,0 +1,33 @@
+# sms/management/commands/repair_conversation_summaries.py - Recalcul du résumé des conversations
+
+from django.core.management.base import BaseCommand
+
+from sms.models import Conversation
+from sms.services import ConversationService
+
+
+class Command(BaseCommand):
+    help = "Recalcule dernier message et compteur de non lus des conversations, par lots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Limiter à un nom d'utilisateur")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Conversations recalculées par requête")
+
+    def handle(self, *args, **options):
+        queryset = Conversation.objects.all()
+        if options['user']:
+            queryset = queryset.filter(user__username=options['user'])
+
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        while True:
+            # Lots par clé primaire: chaque UPDATE reste court et ne verrouille qu'un lot
+            ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            total += ConversationService.recompute(Conversation.objects.filter(id__in=ids))
+            self.stdout.write(f"{total} conversation(s) recalculée(s)...")
+
+        self.stdout.write(self.style.SUCCESS(f"{total} conversation(s) réparée(s)"))
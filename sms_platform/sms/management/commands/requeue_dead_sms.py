@@ -0,0 +1,35 @@
+# sms/management/commands/requeue_dead_sms.py - Remise en file des SMS abandonnés
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sms.models import MessageStatus
+from sms.services import OutboxService
+
+
+class Command(BaseCommand):
+    help = "Remet en file d'attente les SMS abandonnés ('dead') pour un nouvel envoi par le dispatcher"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--include-failed', action='store_true', help="Inclure aussi les échecs définitifs")
+        parser.add_argument('--user', help="Limiter à un nom d'utilisateur")
+        parser.add_argument('--since-hours', type=int, help="Seulement les messages mis à jour récemment")
+        parser.add_argument('--dry-run', action='store_true', help="Compter sans modifier")
+
+    def handle(self, *args, **options):
+        statuses = ['dead', 'failed'] if options['include_failed'] else ['dead']
+        queryset = MessageStatus.objects.filter(status__in=statuses)
+
+        if options['user']:
+            queryset = queryset.filter(message__conversation__user__username=options['user'])
+        if options['since_hours']:
+            queryset = queryset.filter(updated_at__gte=timezone.now() - timedelta(hours=options['since_hours']))
+
+        if options['dry_run']:
+            self.stdout.write(f"{queryset.count()} message(s) seraient remis en file")
+            return
+
+        count = OutboxService.requeue(queryset)
+        self.stdout.write(self.style.SUCCESS(f"{count} message(s) remis en file d'attente"))
@@ -0,0 +1,34 @@
+# sms/management/commands/run_campaigns.py - Reprise des campagnes interrompues (et diffusion hors process web)
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from sms.services import CampaignService, get_campaign_config
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprend les campagnes 'running' sans signe de vie depuis STALE_AFTER (process web redémarré) "
+        "et les campagnes jamais démarrées; seuls les destinataires encore en attente sont envoyés. "
+        "Avec SMS_CAMPAIGN_CONFIG['BACKGROUND_THREAD'] = False, lancer avec --loop: toutes les campagnes passent par ici"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Continuer à surveiller les campagnes (sinon un seul passage)")
+        parser.add_argument('--poll-interval', type=float, default=5, help="Secondes entre deux passages avec --loop")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Campagnes reprises après {get_campaign_config('STALE_AFTER', 600)}s sans signe de vie"
+        )
+        try:
+            while True:
+                for campaign_id in CampaignService.claim_stale():
+                    self.stdout.write(f"Reprise de la campagne {campaign_id}")
+                    CampaignService.run(campaign_id)
+                if not options['loop']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Arrêt demandé")
@@ -0,0 +1,29 @@
+# sms/management/commands/run_inbound_processor.py - Traitement par lots des SMS entrants et accusés de réception
+
+import signal
+
+from django.core.management.base import BaseCommand
+
+from sms.services import InboundProcessor
+
+
+class Command(BaseCommand):
+    help = "Traite par lots les SMS entrants et les accusés de réception mis en file par les webhooks Orange (SMS_INBOUND_CONFIG)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Notifications réservées à chaque tour")
+        parser.add_argument('--poll-interval', type=float, help="Attente (s) quand la file est vide")
+        parser.add_argument('--once', action='store_true', help="Vider la file puis s'arrêter")
+
+    def handle(self, *args, **options):
+        processor = InboundProcessor(batch_size=options['batch_size'], poll_interval=options['poll_interval'])
+
+        def shutdown(signum, frame):
+            self.stdout.write("Arrêt demandé, fin du lot en cours...")
+            processor.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write(self.style.SUCCESS(f"Processeur SMS entrants: lots de {processor.batch_size}"))
+        processor.run(once=options['once'])
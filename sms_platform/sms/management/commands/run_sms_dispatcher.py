@@ -0,0 +1,58 @@
+# sms/management/commands/run_sms_dispatcher.py - Workers d'envoi de l'outbox SMS
+
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+
+from sms.services import AsyncOutboxDispatcher, OutboxDispatcher
+
+
+class Command(BaseCommand):
+    help = "Démarre les workers qui envoient les SMS en file d'attente (outbox) vers Orange"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Nombre d'envois Orange simultanés")
+        parser.add_argument('--batch-size', type=int, help="Messages réservés par worker à chaque tour")
+        parser.add_argument('--poll-interval', type=float, help="Attente (s) quand l'outbox est vide")
+        parser.add_argument('--once', action='store_true', help="Vider l'outbox puis s'arrêter")
+        parser.add_argument(
+            '--async', dest='use_async', action='store_true',
+            help="Boucle asyncio unique (httpx) au lieu d'un thread par envoi"
+        )
+        parser.add_argument('--concurrency', type=int, help="Envois simultanés en mode --async")
+
+    def handle(self, *args, **options):
+        if options['use_async']:
+            return self.handle_async(options)
+
+        dispatcher = OutboxDispatcher(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval']
+        )
+
+        def shutdown(signum, frame):
+            self.stdout.write("Arrêt demandé, fin des envois en cours...")
+            dispatcher.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write(self.style.SUCCESS(f"Dispatcher outbox: {dispatcher.workers} workers"))
+        dispatcher.run(once=options['once'])
+
+    def handle_async(self, options):
+        dispatcher = AsyncOutboxDispatcher(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval']
+        )
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, dispatcher.stop)
+            await dispatcher.run(once=options['once'])
+
+        self.stdout.write(self.style.SUCCESS(f"Dispatcher outbox asynchrone: {dispatcher.concurrency} envois simultanés"))
+        asyncio.run(main())
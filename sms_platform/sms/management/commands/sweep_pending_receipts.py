@@ -0,0 +1,23 @@
+# sms/management/commands/sweep_pending_receipts.py - Accusés de réception en attente de leur message
+
+from django.core.management.base import BaseCommand
+
+from sms.models import PendingReceipt
+from sms.services import DeliveryReceiptService
+
+
+class Command(BaseCommand):
+    help = (
+        "Applique les accusés de réception en attente dont le message est maintenant connu et supprime "
+        "ceux expirés (PENDING_RECEIPT_TTL). Inutile si run_inbound_processor tourne (il le fait déjà)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Accusés traités par transaction")
+
+    def handle(self, *args, **options):
+        recovered, lost = DeliveryReceiptService.sweep(batch_size=options['batch_size'])
+        remaining = PendingReceipt.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f"{recovered} accusé(s) appliqué(s), {lost} perdu(s), {remaining} toujours en attente"
+        ))
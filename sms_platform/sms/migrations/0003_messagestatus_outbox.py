@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0002_campaign_campaignrecipient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagestatus',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='messagestatus',
+            name='status',
+            field=models.CharField(choices=[('queued', "En file d'attente"), ('sending', 'Envoi en cours'), ('sent', 'Envoyé'), ('delivered', 'Livré'), ('read', 'Lu'), ('failed', 'Échec')], default='sent', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='messagestatus',
+            index=models.Index(condition=models.Q(('status__in', ['queued', 'sending'])), fields=['status', 'id'], name='sms_status_outbox_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0003_messagestatus_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagestatus',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='messagestatus',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='messagestatus',
+            name='status',
+            field=models.CharField(choices=[('queued', "En file d'attente"), ('sending', 'Envoi en cours'), ('sent', 'Envoyé'), ('delivered', 'Livré'), ('read', 'Lu'), ('failed', 'Échec'), ('dead', 'Abandonné')], default='sent', max_length=20),
+        ),
+    ]
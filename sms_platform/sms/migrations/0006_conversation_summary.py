@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_conversation_summary(apps, schema_editor):
+    # Même calcul que ConversationService.recompute, sur les modèles historiques
+    Conversation = apps.get_model('sms', 'Conversation')
+    SMSMessage = apps.get_model('sms', 'SMSMessage')
+
+    last = SMSMessage.objects.filter(conversation=OuterRef('pk')).order_by('-sent_at', '-id')
+    unread = (
+        SMSMessage.objects.filter(conversation=OuterRef('pk'), sender_phone=OuterRef('contact_phone'), is_read=False)
+        .order_by().values('conversation').annotate(total=Count('id')).values('total')
+    )
+    Conversation.objects.update(
+        last_message_id=Subquery(last.values('id')[:1]),
+        last_message_text=Coalesce(Subquery(last.values('message')[:1]), Value('')),
+        last_message_at=Subquery(last.values('sent_at')[:1]),
+        unread_count=Coalesce(Subquery(unread), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0005_contactimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_conversation_summary, migrations.RunPython.noop),
+    ]
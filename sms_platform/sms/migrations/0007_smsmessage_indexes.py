@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:50
+
+from django.db import migrations, models
+
+from sms.operations import AddIndexConcurrently, AddUniqueIndexConcurrently
+
+
+def empty_message_id_to_null(apps, schema_editor):
+    # Les messages reçus sans messageId étaient enregistrés avec '' au lieu de NULL
+    SMSMessage = apps.get_model('sms', 'SMSMessage')
+    SMSMessage.objects.filter(message_id='').update(message_id=None)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY ne peut pas s'exécuter dans une transaction
+    atomic = False
+
+    dependencies = [
+        ('sms', '0006_conversation_summary'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='smsmessage',
+            index=models.Index(fields=['conversation', 'sent_at', 'id'], name='sms_msg_conv_sent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='smsmessage',
+            index=models.Index(fields=['sender_phone', 'sent_at'], name='sms_msg_sender_sent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='smsmessage',
+            index=models.Index(fields=['recipient_phone', 'sent_at'], name='sms_msg_recipient_sent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='smsmessage',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['conversation', 'recipient_phone'], name='sms_msg_unread_idx'),
+        ),
+        migrations.RunPython(empty_message_id_to_null, migrations.RunPython.noop),
+        AddUniqueIndexConcurrently(
+            model_name='smsmessage',
+            constraint=models.UniqueConstraint(condition=models.Q(('message_id__isnull', False)), fields=('message_id',), name='sms_msg_message_id_uniq'),
+        ),
+    ]
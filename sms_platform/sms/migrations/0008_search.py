@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:06
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from sms.operations import AddPostgresIndexConcurrently
+
+# Tient search_vector à jour pour toute écriture, y compris bulk_create (MessageIngestService)
+CREATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION sms_smsmessage_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('french', coalesce(NEW.message, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sms_smsmessage_search_vector_trg ON sms_smsmessage;
+CREATE TRIGGER sms_smsmessage_search_vector_trg
+    BEFORE INSERT OR UPDATE OF message, search_vector ON sms_smsmessage
+    FOR EACH ROW EXECUTE FUNCTION sms_smsmessage_search_vector();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS sms_smsmessage_search_vector_trg ON sms_smsmessage;
+DROP FUNCTION IF EXISTS sms_smsmessage_search_vector();
+"""
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGER)
+
+
+def backfill_search_vector(apps, schema_editor):
+    # Par tranches de clé primaire: migration non atomique, chaque UPDATE est validé aussitôt
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT coalesce(max(id), 0) FROM sms_smsmessage")
+        max_id = cursor.fetchone()[0]
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                "UPDATE sms_smsmessage SET search_vector = to_tsvector('french', coalesce(message, '')) "
+                "WHERE id >= %s AND id < %s AND search_vector IS NULL",
+                [start, start + BACKFILL_BATCH_SIZE]
+            )
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY ne peut pas s'exécuter dans une transaction
+    atomic = False
+
+    dependencies = [
+        ('sms', '0007_smsmessage_indexes'),
+    ]
+
+    operations = [
+        # CREATE EXTENSION pg_trgm: droits suffisants requis sur la base (sans effet hors PostgreSQL)
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='smsmessage',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        AddPostgresIndexConcurrently(
+            model_name='conversation',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('contact_name'), name='gin_trgm_ops'), name='sms_conv_name_trgm_idx'),
+        ),
+        AddPostgresIndexConcurrently(
+            model_name='conversation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['contact_phone'], name='sms_conv_phone_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddPostgresIndexConcurrently(
+            model_name='smsmessage',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='sms_msg_search_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_message_sent_at(apps, schema_editor):
+    # Par tranches de clé primaire, chaque UPDATE est validé aussitôt (migration non atomique)
+    if schema_editor.connection.vendor != 'postgresql':
+        MessageStatus = apps.get_model('sms', 'MessageStatus')
+        SMSMessage = apps.get_model('sms', 'SMSMessage')
+        MessageStatus.objects.update(
+            message_sent_at=models.Subquery(SMSMessage.objects.filter(id=models.OuterRef('message_id')).values('sent_at')[:1])
+        )
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT coalesce(max(id), 0) FROM sms_messagestatus")
+        max_id = cursor.fetchone()[0]
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                "UPDATE sms_messagestatus s SET message_sent_at = m.sent_at FROM sms_smsmessage m "
+                "WHERE m.id = s.message_id AND s.id >= %s AND s.id < %s",
+                [start, start + BACKFILL_BATCH_SIZE]
+            )
+
+
+def partition_tables(apps, schema_editor):
+    from sms.partitioning import convert_to_partitioned, get_archive_config, is_supported
+
+    if not is_supported(schema_editor.connection):
+        return
+    for table in ('sms_smsmessage', 'sms_messagestatus'):
+        convert_to_partitioned(schema_editor, table, months_ahead=get_archive_config('MONTHS_AHEAD', 3))
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY et VALIDATE CONSTRAINT hors transaction, échange des tables en transaction courte
+    atomic = False
+
+    dependencies = [
+        ('sms', '0008_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagestatus',
+            name='message_sent_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        # Une table partitionnée ne peut pas être la cible d'une clé étrangère (pas d'unicité sur id seul)
+        migrations.AlterField(
+            model_name='campaignrecipient',
+            name='sms',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sms.smsmessage'),
+        ),
+        migrations.AlterField(
+            model_name='messagestatus',
+            name='message',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='status', to='sms.smsmessage'),
+        ),
+        migrations.RunPython(backfill_message_sent_at, migrations.RunPython.noop),
+        # Partitionnement mensuel sur sent_at / message_sent_at (PostgreSQL uniquement, irréversible)
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
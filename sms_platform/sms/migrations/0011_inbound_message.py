@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0010_daily_message_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboundMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField()),
+                ('sender_phone', models.CharField(max_length=15)),
+                ('recipient_phone', models.CharField(max_length=15)),
+                ('message', models.TextField()),
+                ('message_id', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours'), ('rejected', 'Rejetée'), ('failed', 'Échec')], default='pending', max_length=20)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status__in', ['pending', 'processing'])), fields=['status', 'id'], name='sms_inbound_queue_idx')],
+            },
+        ),
+    ]
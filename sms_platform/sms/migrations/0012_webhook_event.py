@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0011_inbound_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('inbound', 'SMS entrant'), ('receipt', 'Accusé de réception')], max_length=20)),
+                ('message_id', models.CharField(max_length=100)),
+                ('event', models.CharField(blank=True, max_length=50)),
+                ('received_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'message_id', 'event'), name='sms_webhook_event_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sms', '0012_webhook_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.CharField(max_length=100)),
+                ('delivery_status', models.CharField(max_length=50)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
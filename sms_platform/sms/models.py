@@ -1,6 +1,11 @@
 # sms/models.py
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Upper
 from django.conf import settings
+from django.utils import timezone
 
 class Contact(models.Model):
     """Modèle pour gérer les contacts"""
@@ -25,8 +30,21 @@ class Conversation(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_archived = models.BooleanField(default=False)
 
+    # ✅ Résumé dénormalisé pour la liste des conversations (tenu à jour par SMSMessage.save
+    # et ConversationService.mark_as_read, réparable via manage.py repair_conversation_summaries)
+    last_message_text = models.TextField(blank=True, default='')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)  # Messages du contact non lus
+
     class Meta:
         unique_together = ['user', 'contact_phone']
+        # ✅ Recherche partielle par trigrammes (pg_trgm, PostgreSQL uniquement, migration 0008)
+        indexes = [
+            # contact_name__icontains est traduit en UPPER(contact_name) LIKE UPPER(...)
+            GinIndex(OpClass(Upper('contact_name'), name='gin_trgm_ops'), name='sms_conv_name_trgm_idx'),
+            GinIndex(fields=['contact_phone'], name='sms_conv_phone_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return f"Conversation {self.user.username} - {self.contact_name or self.contact_phone}"
@@ -35,13 +53,6 @@ class Conversation(models.Model):
     def last_message(self):
         return self.messages.order_by('-sent_at').first()
 
-    @property
-    def unread_count(self):
-        return self.messages.filter(
-            is_read=False, 
-            sender_phone=self.contact_phone
-        ).count()
-
 class SMSMessage(models.Model):
     """Modèle mis à jour pour les messages SMS avec conversations"""
     conversation = models.ForeignKey(
@@ -57,6 +68,35 @@ class SMSMessage(models.Model):
     is_received = models.BooleanField(default=False)
     is_read = models.BooleanField(default=False)
     message_id = models.CharField(max_length=100, blank=True, null=True)  # ID de l'API Orange
+    # ✅ Index plein texte (configuration française), calculé par un trigger PostgreSQL (migration 0008)
+    # y compris pour les insertions en masse; reste NULL sur les autres moteurs
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # ✅ Index des chemins chauds (créés en CONCURRENTLY par la migration 0007)
+        indexes = [
+            # Pagination des messages d'une conversation
+            models.Index(fields=['conversation', 'sent_at', 'id'], name='sms_msg_conv_sent_idx'),
+            # Historique: sender_phone OR recipient_phone, trié par date
+            models.Index(fields=['sender_phone', 'sent_at'], name='sms_msg_sender_sent_idx'),
+            models.Index(fields=['recipient_phone', 'sent_at'], name='sms_msg_recipient_sent_idx'),
+            # Marquage comme lus: seuls les messages non lus sont indexés
+            models.Index(
+                fields=['conversation', 'recipient_phone'],
+                name='sms_msg_unread_idx',
+                condition=models.Q(is_read=False)
+            ),
+            # Recherche plein texte dans les messages
+            GinIndex(fields=['search_vector'], name='sms_msg_search_idx'),
+        ]
+        constraints = [
+            # Accusés de réception Orange: recherche par message_id (NULL tant que non envoyé)
+            models.UniqueConstraint(
+                fields=['message_id'],
+                name='sms_msg_message_id_uniq',
+                condition=models.Q(message_id__isnull=False)
+            ),
+        ]
 
     def __str__(self):
         return f"SMS de {self.sender_phone} à {self.recipient_phone} le {self.sent_at}"
@@ -64,50 +104,336 @@ class SMSMessage(models.Model):
     def save(self, *args, **kwargs):
         # Auto-créer ou récupérer la conversation
         if not self.conversation_id:
-            user_phone = None
-            contact_phone = None
-            
+            # ✅ Correspondances en cache (sms/resolvers.py): pas de requête pour les numéros et conversations connus
+            from .resolvers import get_or_create_conversation, resolve_user_id
+
             # Déterminer qui est l'utilisateur et qui est le contact
-            try:
-                from account.models import CustomUser
-                user = CustomUser.objects.get(telephone=self.sender_phone)
-                user_phone = self.sender_phone
-                contact_phone = self.recipient_phone
-            except CustomUser.DoesNotExist:
-                try:
-                    user = CustomUser.objects.get(telephone=self.recipient_phone)
-                    user_phone = self.recipient_phone
-                    contact_phone = self.sender_phone
-                except CustomUser.DoesNotExist:
-                    raise ValueError("Aucun utilisateur trouvé pour ce message")
+            user_id = resolve_user_id(self.sender_phone)
+            contact_phone = self.recipient_phone
+            if user_id is None:
+                user_id = resolve_user_id(self.recipient_phone)
+                contact_phone = self.sender_phone
+            if user_id is None:
+                raise ValueError("Aucun utilisateur trouvé pour ce message")
 
             # Créer ou récupérer la conversation
-            conversation, created = Conversation.objects.get_or_create(
-                user=user,
-                contact_phone=contact_phone,
-                defaults={'contact_name': ''}
-            )
-            self.conversation = conversation
+            self.conversation, _ = get_or_create_conversation(user_id, contact_phone)
 
+        adding = self._state.adding
         super().save(*args, **kwargs)
 
-        # Mettre à jour le timestamp de la conversation
-        self.conversation.updated_at = self.sent_at
-        self.conversation.save()
+        if not adding:
+            # Mettre à jour le timestamp de la conversation
+            self.conversation.updated_at = timezone.now()
+            Conversation.objects.filter(id=self.conversation_id).update(updated_at=self.conversation.updated_at)
+            return
+
+        # ✅ Nouveau message: timestamp, résumé et compteur de non lus en une seule requête
+        # (le résumé n'est remplacé que si ce message est le plus récent)
+        is_newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=self.sent_at)
+        unread = int(not self.is_read and self.sender_phone == self.conversation.contact_phone)
+        Conversation.objects.filter(id=self.conversation_id).update(
+            updated_at=self.sent_at,
+            last_message_text=Case(When(is_newer, then=Value(self.message)), default=F('last_message_text'), output_field=models.TextField()),
+            last_message_at=Case(When(is_newer, then=Value(self.sent_at)), default=F('last_message_at'), output_field=models.DateTimeField()),
+            last_message_id=Case(When(is_newer, then=Value(self.id)), default=F('last_message_id'), output_field=models.BigIntegerField()),
+            unread_count=F('unread_count') + unread
+        )
+
+        if self.is_received:
+            from .services import MessageStatsService
+            MessageStatsService.apply({(self.conversation.user_id, timezone.localdate(self.sent_at), 'received'): 1})
+
+        conversation = self.conversation
+        conversation.updated_at = self.sent_at
+        if 'last_message_at' in conversation.get_deferred_fields():
+            # Conversation issue du cache: le résumé n'est pas chargé, inutile de le relire
+            return
+        if conversation.last_message_at is None or conversation.last_message_at <= self.sent_at:
+            conversation.last_message_text = self.message
+            conversation.last_message_at = self.sent_at
+            conversation.last_message_id = self.id
+        conversation.unread_count += unread
 
 class MessageStatus(models.Model):
     """Statuts de livraison des messages"""
     STATUS_CHOICES = [
+        ('queued', "En file d'attente"),
+        ('sending', 'Envoi en cours'),
         ('sent', 'Envoyé'),
         ('delivered', 'Livré'),
         ('read', 'Lu'),
         ('failed', 'Échec'),
+        ('dead', 'Abandonné'),  # Tentatives épuisées, à remettre en file manuellement
     ]
     
-    message = models.OneToOneField(SMSMessage, on_delete=models.CASCADE, related_name='status')
+    # ✅ Sans contrainte en base: SMSMessage est partitionnée (migration 0009), sa clé primaire réelle est (id, sent_at)
+    message = models.OneToOneField(SMSMessage, on_delete=models.CASCADE, related_name='status', db_constraint=False)
+    # Date du message, clé de partition mensuelle des statuts (copiée à la création)
+    message_sent_at = models.DateTimeField(default=timezone.now, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='sent')
     updated_at = models.DateTimeField(auto_now=True)
+    error_message = models.TextField(blank=True)  # Dernière erreur rencontrée
+    claimed_at = models.DateTimeField(null=True, blank=True)  # Prise en charge par un dispatcher (outbox)
+    attempts = models.PositiveIntegerField(default=0)  # Nombre d'appels Orange effectués
+    next_attempt_at = models.DateTimeField(null=True, blank=True)  # Prochain essai programmé
+
+    class Meta:
+        indexes = [
+            # File d'attente de l'outbox: seules les lignes à envoyer sont indexées
+            models.Index(
+                fields=['status', 'id'],
+                name='sms_status_outbox_idx',
+                condition=models.Q(status__in=['queued', 'sending'])
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut déjà compté dans DailyMessageStats (voir save)
+        instance._counted_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and MessageStatus.message.is_cached(self) and self.message.sent_at:
+            self.message_sent_at = self.message.sent_at
+        super().save(*args, **kwargs)
+
+        # ✅ Statistiques quotidiennes: seul le passage d'un statut à un autre est répercuté
+        previous = self.counted_status
+        if previous != self.status:
+            from .services import MessageStatsService
+            MessageStatsService.record_transition(self, previous)
+            self.mark_counted()
+
+    @property
+    def counted_status(self):
+        """Statut déjà compté dans DailyMessageStats (None: statut pas encore enregistré)"""
+        return getattr(self, '_counted_status', None)
+
+    def mark_counted(self, status=None):
+        """
+        Applique `status` (par défaut le statut courant) comme déjà compté dans DailyMessageStats:
+        pour les écritures qui répercutent elles-mêmes les statistiques (lots, accusés), save ne le recomptera pas
+        """
+        if status is not None:
+            self.status = status
+        self._counted_status = self.status
+
+    def __str__(self):
+        return f"Statut: {self.status} - {self.message}"
+
+class Campaign(models.Model):
+    """Campagne d'envoi en masse: un message, plusieurs destinataires"""
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('completed', 'Terminée'),
+        ('failed', 'Échec'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='campaigns')
+    name = models.CharField(max_length=100, blank=True)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_recipients = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Signe de vie du process qui diffuse: au-delà de STALE_AFTER, la campagne est reprise (run_campaigns)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Campagne {self.name or self.id} - {self.user.username}"
+
+    @property
+    def processed_count(self):
+        return self.sent_count + self.failed_count
+
+    @property
+    def progress(self):
+        """Pourcentage de destinataires traités"""
+        if not self.total_recipients:
+            return 100
+        return round(self.processed_count * 100 / self.total_recipients, 1)
+
+
+class CampaignRecipient(models.Model):
+    """Destinataire d'une campagne et son statut d'envoi"""
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('sent', 'Envoyé'),
+        ('failed', 'Échec'),
+    ]
+
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='recipients')
+    phone_number = models.CharField(max_length=15)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    sms = models.ForeignKey(SMSMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+    error_message = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['campaign', 'phone_number']
+
+    def __str__(self):
+        return f"{self.phone_number} ({self.status}) - {self.campaign}"
+
+
+class ContactImport(models.Model):
+    """Import de contacts depuis un fichier CSV/XLSX, traité par lots en arrière-plan"""
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('completed', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='contact_imports')
+    file_name = models.CharField(max_length=255, blank=True)
+    file_format = models.CharField(max_length=10, default='csv')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0)  # Estimation faite avant le traitement
+    processed_rows = models.PositiveIntegerField(default=0)
+    imported_count = models.PositiveIntegerField(default=0)  # Contacts créés ou mis à jour
+    rejected_count = models.PositiveIntegerField(default=0)
+    duplicate_count = models.PositiveIntegerField(default=0)
+    rejected_rows = models.JSONField(default=list, blank=True)  # Premières lignes rejetées avec leur motif
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import {self.file_name or self.id} - {self.user.username}"
+
+    @property
+    def progress(self):
+        """Pourcentage de lignes traitées"""
+        if self.status == 'completed':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(round(self.processed_rows * 100 / self.total_rows, 1), 99.9)
+
+class DailyMessageStats(models.Model):
+    """
+    ✅ Compteurs quotidiens par utilisateur: messages envoyés, livrés, en échec et reçus
+    Tenus à jour par MessageStatsService à chaque changement de statut, reconstruits par
+    manage.py rebuild_message_stats. Un message compte dans le jour de son envoi (sent_at).
+    """
+    STATUS_CHOICES = [
+        ('sent', 'Envoyés'),  # Acceptés par Orange (livrés et lus compris)
+        ('delivered', 'Livrés'),  # Livrés ou lus
+        ('failed', 'Échecs'),  # Échec définitif ou abandon
+        ('received', 'Reçus'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_message_stats')
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Cible du INSERT ... ON CONFLICT des mises à jour incrémentales
+            models.UniqueConstraint(fields=['user', 'day', 'status'], name='sms_daily_stats_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.day} {self.status}: {self.count}"
+
+
+
+class InboundMessage(models.Model):
+    """
+    ✅ File de réception des SMS entrants: notification Orange enregistrée telle quelle par le webhook,
+    ingérée ensuite par lots (manage.py run_inbound_processor). Supprimée une fois le message créé.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En cours'),  # Réservée par un processeur
+        ('rejected', 'Rejetée'),  # Aucun utilisateur pour le numéro destinataire
+        ('failed', 'Échec'),  # Tentatives épuisées
+    ]
+
+    payload = models.JSONField()  # Corps brut de la notification Orange
+    sender_phone = models.CharField(max_length=15)
+    recipient_phone = models.CharField(max_length=15)
+    message = models.TextField()
+    message_id = models.CharField(max_length=100, blank=True)  # ID de l'API Orange
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)  # Nouvel essai programmé après une erreur
     error_message = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            # Seules les notifications à traiter sont indexées
+            models.Index(
+                fields=['status', 'id'],
+                name='sms_inbound_queue_idx',
+                condition=models.Q(status__in=['pending', 'processing'])
+            ),
+        ]
+
+    def __str__(self):
+        return f"Entrant {self.sender_phone} -> {self.recipient_phone} ({self.status})"
+
+
+class WebhookEvent(models.Model):
+    """
+    ✅ Notifications Orange déjà traitées (idempotence des webhooks rejoués), par messageId
+    Table non partitionnée: l'unicité est globale, contrairement à l'index de sms_smsmessage
+    qui ne vaut que partition par partition. Purgée au-delà de RETENTION_DAYS (purge_webhook_events).
+    """
+    KIND_CHOICES = [
+        ('inbound', 'SMS entrant'),
+        ('receipt', 'Accusé de réception'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    message_id = models.CharField(max_length=100)  # ID de l'API Orange
+    event = models.CharField(max_length=50, blank=True)  # Statut de livraison pour les accusés de réception
+    received_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'message_id', 'event'], name='sms_webhook_event_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.message_id} {self.event}".strip()
+
+
+class DeliveryReceipt(models.Model):
+    """
+    ✅ Accusés de réception Orange en attente, appliqués par lots (manage.py run_inbound_processor)
+    Supprimés une fois le statut du message mis à jour.
+    """
+    message_id = models.CharField(max_length=100)  # ID de l'API Orange
+    delivery_status = models.CharField(max_length=50)  # Valeur brute (DeliveredToTerminal, DeliveryImpossible...)
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # Réservé par un processeur
+
+    def __str__(self):
+        return f"Accusé {self.message_id}: {self.delivery_status}"
+
+
+class PendingReceipt(models.Model):
+    """
+    ✅ Accusés de réception arrivés avant l'enregistrement du message_id Orange (réponse d'envoi pas encore traitée)
+    Appliqués dès que l'envoi enregistre ce message_id, ou par sweep_pending_receipts; perdus après expires_at.
+    """
+    message_id = models.CharField(max_length=100, db_index=True)  # ID de l'API Orange
+    delivery_status = models.CharField(max_length=50)
+    received_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
     def __str__(self):
-        return f"Statut: {self.status} - {self.message}"
\ No newline at end of file
+        return f"Accusé en attente {self.message_id}: {self.delivery_status}"
@@ -0,0 +1,83 @@
+# sms/operations.py - Opérations de migration sans verrou bloquant sous PostgreSQL
+
+from django.db.migrations.operations import AddConstraint, AddIndex
+
+
+def _is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(AddIndex):
+    """
+    CREATE INDEX CONCURRENTLY sous PostgreSQL (les écritures continuent pendant la création),
+    CREATE INDEX classique sur les autres moteurs (sqlite des tests)
+    La migration doit déclarer atomic = False
+    """
+
+    def describe(self):
+        return f"Concurrently create index {self.index.name} on model {self.model_name}"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _is_postgresql(schema_editor):
+                schema_editor.add_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _is_postgresql(schema_editor):
+                schema_editor.remove_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, self.index)
+
+
+class AddUniqueIndexConcurrently(AddConstraint):
+    """
+    Contrainte d'unicité partielle (UniqueConstraint avec condition) créée comme
+    CREATE UNIQUE INDEX CONCURRENTLY sous PostgreSQL, AddConstraint classique ailleurs
+    La migration doit déclarer atomic = False
+    """
+
+    def describe(self):
+        return f"Concurrently create unique index {self.constraint.name} on model {self.model_name}"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if not _is_postgresql(schema_editor):
+            schema_editor.add_constraint(model, self.constraint)
+            return
+
+        statement = self.constraint.create_sql(model, schema_editor)
+        if 'CREATE UNIQUE INDEX' not in statement.template:
+            raise ValueError(f"{self.constraint.name}: seules les contraintes créées comme index unique sont supportées")
+        statement.template = statement.template.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+        schema_editor.execute(statement)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _is_postgresql(schema_editor):
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(self.constraint.name)}")
+        else:
+            schema_editor.remove_constraint(model, self.constraint)
+
+
+class AddPostgresIndexConcurrently(AddIndexConcurrently):
+    """
+    Index propre à PostgreSQL (GIN, pg_trgm...) créé en CONCURRENTLY, ignoré sur les autres
+    moteurs: l'index reste déclaré dans l'état des migrations mais n'existe pas en base
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if _is_postgresql(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if _is_postgresql(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,140 @@
+# sms/pagination.py - Pagination par curseur (keyset) sur (sent_at, id)
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Pagination des messages par curseur sur (sent_at, id), au coût constant quelle que soit la page
+    - sans curseur: les page_size messages les plus récents
+    - ?before=<curseur>: les messages plus anciens que le curseur
+    - ?after=<curseur>: les messages plus récents que le curseur
+    La réponse donne le curseur 'before' de la page plus ancienne (null s'il n'y en a pas) et le
+    curseur 'after' du message le plus récent de la page, toujours renseigné: le client relève
+    les nouveaux messages avec ?after= même quand il n'y en a pas encore
+
+    paginate_queryset accepte aussi une liste de querysets (ex: messages envoyés OU reçus):
+    chacune est lue dans l'ordre de son index puis les résultats sont fusionnés,
+    ce qui évite le tri complet qu'imposerait un OR.
+    """
+
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    newest_first = False  # Ordre d'affichage: chronologique (fil de discussion) ou antéchronologique
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            page_size = self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        before = self.decode_cursor(request.query_params.get('before'))
+        after = self.decode_cursor(request.query_params.get('after'))
+        if before and after:
+            raise NotFound("Utilisez 'before' ou 'after', pas les deux")
+        return self.paginate(queryset, self.get_page_size(request), before=before, after=after)
+
+    def paginate(self, queryset, page_size, before=None, after=None):
+        """Retourne la page dans l'ordre d'affichage et renseigne self.before / self.after"""
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        newer = after is not None
+        cursor = after if newer else before
+
+        rows = []
+        for qs in querysets:
+            rows.extend(self._fetch(qs, cursor, newer, page_size + 1))
+        if len(querysets) > 1:
+            # Fusion des flux triés, dédoublonnée (un message peut appartenir à plusieurs querysets)
+            rows = list({row.id: row for row in rows}.values())
+            rows.sort(key=lambda row: (row.sent_at, row.id), reverse=not newer)
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        # rows va du plus proche au plus éloigné du curseur
+        if newer:
+            oldest, newest = (rows[0], rows[-1]) if rows else (None, None)
+            self.before = self.encode_cursor(oldest) if oldest else self.encode_cursor_value(after)
+            self.after = self.encode_cursor(newest) if newest else self.encode_cursor_value(after)
+        else:
+            newest, oldest = (rows[0], rows[-1]) if rows else (None, None)
+            self.before = self.encode_cursor(oldest) if has_more else None
+            if newest:
+                self.after = self.encode_cursor(newest)
+            else:
+                # Page vide: sans curseur, rien à suivre (aucun message); sinon on repart du curseur
+                self.after = self.encode_cursor_value(before) if before else None
+
+        ascending = rows if newer else rows[::-1]
+        return ascending[::-1] if self.newest_first else ascending
+
+    def get_paginated_response(self, data):
+        return Response({
+            'before': self.before,
+            'after': self.after,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        cursor = {'type': 'string', 'nullable': True}
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {'before': cursor, 'after': cursor, 'results': schema},
+        }
+
+    @staticmethod
+    def _fetch(queryset, cursor, newer, limit):
+        if cursor:
+            sent_at, pk = cursor
+            if newer:
+                # La borne sur sent_at seul permet un parcours d'index à partir du curseur
+                queryset = queryset.filter(sent_at__gte=sent_at).filter(Q(sent_at__gt=sent_at) | Q(id__gt=pk))
+            else:
+                queryset = queryset.filter(sent_at__lte=sent_at).filter(Q(sent_at__lt=sent_at) | Q(id__lt=pk))
+        ordering = ('sent_at', 'id') if newer else ('-sent_at', '-id')
+        return list(queryset.order_by(*ordering)[:limit])
+
+    @staticmethod
+    def encode_cursor(message):
+        return MessageKeysetPagination.encode_cursor_value((message.sent_at, message.id))
+
+    @staticmethod
+    def encode_cursor_value(value):
+        sent_at, pk = value
+        raw = f"{sent_at.isoformat()}|{pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            sent_at, pk = raw.split('|')
+            return datetime.fromisoformat(sent_at), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound("Curseur invalide")
+
+
+class HistoryKeysetPagination(MessageKeysetPagination):
+    """Historique global: les plus récents en premier"""
+    newest_first = True
+
+
+class SearchPagination(PageNumberPagination):
+    """Résultats de recherche classés: pages numérotées (?page=, ?page_size=) de taille bornée"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
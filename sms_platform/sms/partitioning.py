@@ -0,0 +1,528 @@
+# sms/partitioning.py - Partitionnement mensuel (PostgreSQL) des messages et statuts, archivage des vieux mois
+
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Tables partitionnées par mois: clé de partition, colonnes non archivées (recalculées à la restauration)
+# et objets propres à chaque partition. PostgreSQL n'accepte pas sur la table mère d'index unique
+# sans la clé de partition, ni de clé étrangère vers une table partitionnée: l'unicité de message_id
+# est donc garantie partition par partition.
+PARTITIONED_TABLES = {
+    'sms_smsmessage': {
+        'key': 'sent_at',
+        'skip_columns': ['search_vector'],
+        'local_sql': [
+            'CREATE UNIQUE INDEX IF NOT EXISTS "sms_msg_message_id_uniq_{suffix}" '
+            'ON "{partition}" (message_id) WHERE message_id IS NOT NULL',
+        ],
+        # Retirées au détachement: une partition archivée ne doit pas bloquer la suppression des conversations
+        'foreign_keys': [
+            'ALTER TABLE "{partition}" ADD CONSTRAINT "{partition}_conversation_fk" '
+            'FOREIGN KEY (conversation_id) REFERENCES sms_conversation (id) DEFERRABLE INITIALLY DEFERRED',
+        ],
+    },
+    'sms_messagestatus': {
+        'key': 'message_sent_at',
+        'skip_columns': [],
+        'local_sql': [
+            'CREATE UNIQUE INDEX IF NOT EXISTS "sms_status_message_uniq_{suffix}" ON "{partition}" (message_id)',
+        ],
+        'foreign_keys': [],
+    },
+}
+
+# Trigger plein texte (migration 0008), porté par la table mère une fois partitionnée
+SEARCH_TRIGGER = 'sms_smsmessage_search_vector_trg'
+
+_MONTH_SUFFIX = re.compile(r'p(\d{4})_(\d{2})$')
+
+# "CREATE [UNIQUE] INDEX nom ON [ONLY] schema.table " (sortie de pg_get_indexdef)
+_INDEX_TARGET = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ ')
+
+
+def get_archive_config(key, default=None):
+    """Lit une option de SMS_ARCHIVE_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_ARCHIVE_CONFIG', {}).get(key, default)
+
+
+def is_supported(conn=None):
+    return (conn or connection).vendor == 'postgresql'
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_suffix(month):
+    return f"p{month.year:04d}_{month.month:02d}"
+
+
+def partition_name(table, month):
+    return f"{table}_{partition_suffix(month)}"
+
+
+def parse_month(value):
+    """'2025-01' -> 1er janvier 2025 UTC"""
+    try:
+        return datetime.strptime(value, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+    except ValueError:
+        raise ValueError(f"Mois invalide '{value}' (format attendu AAAA-MM)")
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(table, conn=None):
+    with (conn or connection).cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table, conn=None):
+    """
+    Partitions attachées: [{'name', 'from', 'to', 'is_default', 'rows'}] triées par borne
+    ('from' vaut None pour la partition historique qui commence à MINVALUE)
+    """
+    with (conn or connection).cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [table]
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound, estimated_rows in rows:
+        values = re.findall(r"'([^']+)'", bound)
+        partitions.append({
+            'name': name,
+            'from': datetime.fromisoformat(values[0]) if len(values) == 2 else None,
+            'to': datetime.fromisoformat(values[-1]) if values else None,
+            'is_default': bound == 'DEFAULT',
+            'rows': max(estimated_rows, 0),
+        })
+    partitions.sort(key=lambda p: (p['is_default'], p['to'] or datetime.max.replace(tzinfo=dt_timezone.utc)))
+    return partitions
+
+
+def _columns(table, conn=None):
+    with (conn or connection).cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position
+            """,
+            [table]
+        )
+        return cursor.fetchall()
+
+
+def _add_foreign_keys(cursor, table, partition, validate=True):
+    # NOT VALID pour les données archivées: elles peuvent viser des conversations supprimées depuis
+    for statement in PARTITIONED_TABLES[table]['foreign_keys']:
+        cursor.execute(statement.format(partition=partition) + ('' if validate else ' NOT VALID'))
+
+
+def _drop_foreign_keys(cursor, partition):
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [partition]
+    )
+    for (constraint,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {_quote(partition)} DROP CONSTRAINT {_quote(constraint)}")
+
+
+def _attach_new_partition(cursor, table, name, bound, params, suffix, foreign_keys=True):
+    """
+    Attache une table (créée par LIKE) comme partition: les index de la table mère y sont créés
+    avant l'attachement sous le nom <index>_<suffixe>, pour des plans lisibles
+    """
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary
+        """,
+        [table]
+    )
+    for index, definition in cursor.fetchall():
+        definition = _INDEX_TARGET.sub(
+            lambda match: f"CREATE {match.group(1) or ''}INDEX {_quote(f'{index}_{suffix}'[:63])} ON {_quote(name)} ",
+            definition,
+            count=1
+        )
+        cursor.execute(definition)
+    cursor.execute(f"ALTER TABLE {_quote(table)} ATTACH PARTITION {_quote(name)} {bound}", params)
+    for statement in PARTITIONED_TABLES[table]['local_sql']:
+        cursor.execute(statement.format(partition=name, suffix=suffix))
+    if foreign_keys:
+        _add_foreign_keys(cursor, table, name)
+
+
+def create_partition(table, month):
+    """
+    Crée la partition du mois si aucune partition ne le couvre. Les lignes du mois déjà tombées
+    dans la partition par défaut y sont déplacées dans la même transaction.
+    """
+    name = partition_name(table, month)
+    key = PARTITIONED_TABLES[table]['key']
+    start, end = month, add_months(month, 1)
+
+    # Mois déjà couvert (partition existante ou partition historique allant jusqu'au mois prochain)
+    for partition in list_partitions(table):
+        if not partition['is_default'] and (partition['from'] is None or partition['from'] <= start) and start < partition['to']:
+            return False
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {_quote(name)} (LIKE {_quote(table)} INCLUDING DEFAULTS)")
+        default = f"{table}_default"
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [default])
+        if cursor.fetchone()[0]:
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {_quote(default)} WHERE {key} >= %s AND {key} < %s RETURNING *) "
+                f"INSERT INTO {_quote(name)} SELECT * FROM moved",
+                [start, end]
+            )
+            if cursor.rowcount:
+                logger.warning(f"{cursor.rowcount} ligne(s) deplacee(s) de {default} vers {name}")
+        _attach_new_partition(cursor, table, name, "FOR VALUES FROM (%s) TO (%s)", [start, end], partition_suffix(month))
+
+    logger.info(f"Partition {name} creee")
+    return True
+
+
+def ensure_partitions(months_ahead=None, now=None):
+    """Crée les partitions du mois courant et des mois suivants pour toutes les tables partitionnées"""
+    months_ahead = get_archive_config('MONTHS_AHEAD', 3) if months_ahead is None else months_ahead
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            continue
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if create_partition(table, month):
+                created.append(partition_name(table, month))
+    return created
+
+
+def convert_to_partitioned(schema_editor, table, months_ahead=3):
+    """
+    Transforme une table existante en table partitionnée par mois sans copier les données:
+    la table actuelle devient la partition historique <table>_legacy (MINVALUE -> mois prochain)
+    et les nouveaux mois reçoivent leurs propres partitions.
+    Les étapes longues (index, validation de la borne) ne bloquent pas les écritures,
+    seul l'échange final (quelques instructions de catalogue) prend un verrou exclusif.
+    """
+    conn = schema_editor.connection
+    if is_partitioned(table, conn):
+        return
+
+    key = PARTITIONED_TABLES[table]['key']
+    legacy = f"{table}_legacy"
+    upper = add_months(month_start(datetime.now(dt_timezone.utc)), 1)
+    pk_index = f"{table}_id_{key}_pk"
+    bound_check = f"{table}_partition_bound"
+
+    with conn.cursor() as cursor:
+        # 1. Index (id, clé) qui deviendra la clé primaire de la partition historique
+        cursor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {_quote(pk_index)} ON {_quote(table)} (id, {key})")
+        # 2. Borne vérifiée à l'avance: ATTACH PARTITION n'aura pas à parcourir la table
+        cursor.execute(f"ALTER TABLE {_quote(table)} DROP CONSTRAINT IF EXISTS {_quote(bound_check)}")
+        cursor.execute(f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(bound_check)} CHECK ({key} < %s) NOT VALID", [upper])
+        cursor.execute(f"ALTER TABLE {_quote(table)} VALIDATE CONSTRAINT {_quote(bound_check)}")
+
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {_quote(table)} IN ACCESS EXCLUSIVE MODE")
+
+        cursor.execute(
+            "SELECT count(*) FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass(%s)",
+            [table]
+        )
+        if cursor.fetchone()[0]:
+            raise RuntimeError(f"{table}: des clés étrangères pointent encore vers la table (db_constraint=False requis)")
+
+        # 3. Identifiants: séquence indépendante de la partition historique (qui pourra être archivée)
+        sequence = f"{table}_id_seq"
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {_quote(table)}")
+        next_id = cursor.fetchone()[0] + 1
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        current_sequence = cursor.fetchone()[0]
+        if current_sequence:
+            # Ne jamais réutiliser un identifiant déjà distribué (lignes supprimées depuis)
+            cursor.execute(f"SELECT last_value + 1 FROM {current_sequence}")
+            next_id = max(next_id, cursor.fetchone()[0])
+        cursor.execute(f"ALTER TABLE {_quote(table)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {_quote(table)} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {_quote(sequence)}")
+        cursor.execute(f"CREATE SEQUENCE {_quote(sequence)} AS bigint")
+        cursor.execute("SELECT setval(%s, %s, false)", [sequence, next_id])
+
+        # 4. Index existants: renommés sur la partition historique, recréés ensuite sur la table mère
+        cursor.execute(
+            """
+            SELECT i.relname, pg_get_indexdef(i.oid), x.indisunique, x.indisprimary
+            FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = to_regclass(%s)
+            """,
+            [table]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+            [table]
+        )
+        primary_key = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {_quote(table)} DROP CONSTRAINT {_quote(primary_key)}")
+        cursor.execute(f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(f'{legacy}_pkey')} PRIMARY KEY USING INDEX {_quote(pk_index)}")
+
+        shared_indexes = []
+        for name, definition, unique, primary in indexes:
+            if primary or name == pk_index:
+                continue
+            cursor.execute(f"ALTER INDEX {_quote(name)} RENAME TO {_quote(f'{name}_legacy'[:63])}")
+            if not unique:
+                shared_indexes.append((name, definition))
+
+        # Le trigger plein texte sera cloné depuis la table mère
+        cursor.execute(f"DROP TRIGGER IF EXISTS {_quote(SEARCH_TRIGGER)} ON {_quote(table)}")
+
+        # 5. Échange: la table actuelle devient la partition historique
+        cursor.execute(f"ALTER TABLE {_quote(table)} RENAME TO {_quote(legacy)}")
+        cursor.execute(f"CREATE TABLE {_quote(table)} (LIKE {_quote(legacy)} INCLUDING DEFAULTS) PARTITION BY RANGE ({key})")
+        cursor.execute(f"ALTER TABLE {_quote(table)} ALTER COLUMN id SET DEFAULT nextval(%s)", [sequence])
+        cursor.execute(f"ALTER SEQUENCE {_quote(sequence)} OWNED BY {_quote(table)}.id")
+        cursor.execute(f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(f'{table}_pkey')} PRIMARY KEY (id, {key})")
+
+        if table == 'sms_smsmessage':
+            cursor.execute(
+                f"CREATE TRIGGER {_quote(SEARCH_TRIGGER)} BEFORE INSERT OR UPDATE OF message, search_vector "
+                f"ON {_quote(table)} FOR EACH ROW EXECUTE FUNCTION sms_smsmessage_search_vector()"
+            )
+
+        cursor.execute(f"ALTER TABLE {_quote(table)} ATTACH PARTITION {_quote(legacy)} FOR VALUES FROM (MINVALUE) TO (%s)", [upper])
+        cursor.execute(f"ALTER TABLE {_quote(legacy)} DROP CONSTRAINT {_quote(bound_check)}")
+
+        for name, definition in shared_indexes:
+            # Index partitionné sur la table mère: l'index équivalent de la partition historique
+            # est rattaché tel quel, sans reconstruction
+            definition = re.sub(r' ON (\S+\.)?\S+ ', f' ON {_quote(table)} ', definition, count=1)
+            cursor.execute(definition)
+
+        # Filet de sécurité si ensure_partitions n'a pas été lancé à temps
+        default = f"{table}_default"
+        cursor.execute(f"CREATE TABLE {_quote(default)} (LIKE {_quote(table)} INCLUDING DEFAULTS)")
+        _attach_new_partition(cursor, table, default, "DEFAULT", [], 'default')
+
+    for offset in range(1, months_ahead + 1):
+        create_partition(table, add_months(upper, offset - 1))
+
+
+class PartitionArchiver:
+    """Détache, exporte (NDJSON gzip ou Parquet) et restaure les partitions mensuelles"""
+
+    FORMATS = ('ndjson', 'parquet')
+
+    def __init__(self, directory=None, file_format=None, batch_size=None):
+        self.directory = directory or get_archive_config('DIRECTORY', os.path.join(settings.BASE_DIR, 'archives'))
+        self.file_format = file_format or get_archive_config('FORMAT', 'ndjson')
+        self.batch_size = batch_size or get_archive_config('BATCH_SIZE', 10000)
+        if self.file_format not in self.FORMATS:
+            raise ImproperlyConfigured(f"Format d'archive inconnu: {self.file_format}")
+        if self.file_format == 'parquet' and pyarrow is None:
+            raise ImproperlyConfigured("L'export Parquet nécessite pyarrow (pip install pyarrow)")
+
+    def archivable(self, before):
+        """Partitions mensuelles (et historique) entièrement antérieures à `before`, par table"""
+        return [
+            (table, partition)
+            for table in PARTITIONED_TABLES
+            for partition in list_partitions(table)
+            if not partition['is_default'] and partition['to'] and partition['to'] <= before
+        ]
+
+    def manifest_path(self, partition):
+        return os.path.join(self.directory, f"{partition}.json")
+
+    def archive(self, table, partition, drop=False):
+        """Détache la partition, l'exporte puis (drop=True) supprime la table une fois l'export vérifié"""
+        name = partition['name']
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = {
+            'table': table,
+            'partition': name,
+            'from': partition['from'].isoformat() if partition['from'] else None,
+            'to': partition['to'].isoformat(),
+            'rows': None,
+            'format': self.file_format,
+            'file': None,
+            'archived_at': None,
+        }
+        # Manifeste écrit avant le détachement: une partition détachée reste toujours restaurable
+        self._write_manifest(manifest)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET lock_timeout = '{get_archive_config('LOCK_TIMEOUT', '5s')}'")
+            try:
+                with transaction.atomic():
+                    cursor.execute(f"ALTER TABLE {_quote(table)} DETACH PARTITION {_quote(name)}")
+                    _drop_foreign_keys(cursor, name)
+            finally:
+                cursor.execute("SET lock_timeout = DEFAULT")
+
+        columns = [column for column in _columns(name) if column[0] not in PARTITIONED_TABLES[table]['skip_columns']]
+        path, rows = (self.export_parquet if self.file_format == 'parquet' else self.export_ndjson)(name, columns)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {_quote(name)}")
+            expected = cursor.fetchone()[0]
+        if rows != expected:
+            raise RuntimeError(f"{name}: {rows} ligne(s) exportée(s) sur {expected}, table conservée")
+
+        manifest.update(rows=rows, file=os.path.basename(path), archived_at=datetime.now(dt_timezone.utc).isoformat())
+        self._write_manifest(manifest)
+
+        if drop:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {_quote(name)}")
+        logger.info(f"Partition {name} archivee: {rows} ligne(s) -> {path}")
+        return manifest
+
+    def _write_manifest(self, manifest):
+        with open(self.manifest_path(manifest['partition']), 'w') as handle:
+            json.dump(manifest, handle, indent=2)
+
+    def _read_rows(self, name, columns):
+        # Curseur côté serveur: mémoire constante quelle que soit la taille de la partition
+        select = ', '.join(_quote(column) for column, _ in columns)
+        with transaction.atomic(), connection.chunked_cursor() as cursor:
+            cursor.execute(f"SELECT {select} FROM {_quote(name)} ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def export_ndjson(self, name, columns):
+        path = os.path.join(self.directory, f"{name}.ndjson.gz")
+        names = [column for column, _ in columns]
+        count = 0
+        with gzip.open(path, 'wt', encoding='utf-8') as handle:
+            for rows in self._read_rows(name, columns):
+                for row in rows:
+                    handle.write(json.dumps(dict(zip(names, row)), default=str, ensure_ascii=False))
+                    handle.write('\n')
+                count += len(rows)
+        return path, count
+
+    def export_parquet(self, name, columns):
+        path = os.path.join(self.directory, f"{name}.parquet")
+        types = {
+            'bigint': pyarrow.int64(),
+            'integer': pyarrow.int32(),
+            'boolean': pyarrow.bool_(),
+            'timestamp with time zone': pyarrow.timestamp('us', tz='UTC'),
+        }
+        schema = pyarrow.schema([(column, types.get(data_type, pyarrow.string())) for column, data_type in columns])
+        count = 0
+        with pyarrow.parquet.ParquetWriter(path, schema, compression=get_archive_config('PARQUET_COMPRESSION', 'zstd')) as writer:
+            for rows in self._read_rows(name, columns):
+                batch = {column: [row[i] for row in rows] for i, (column, _) in enumerate(columns)}
+                writer.write_table(pyarrow.Table.from_pydict(batch, schema=schema))
+                count += len(rows)
+        return path, count
+
+    def restore(self, name):
+        """
+        Réattache une partition archivée: directement si la table détachée existe encore,
+        sinon recréée puis rechargée depuis le fichier d'archive
+        """
+        with open(self.manifest_path(name)) as handle:
+            manifest = json.load(handle)
+        table = manifest['table']
+        if table not in PARTITIONED_TABLES:
+            raise RuntimeError(f"{name}: table inconnue dans le manifeste ({table})")
+        # Bornes du manifeste (fichier modifiable à la main) validées puis passées en paramètres
+        try:
+            end = datetime.fromisoformat(manifest['to'])
+            start = datetime.fromisoformat(manifest['from']) if manifest['from'] else None
+        except (TypeError, ValueError):
+            raise RuntimeError(f"{name}: bornes invalides dans le manifeste ({manifest['from']!r}, {manifest['to']!r})")
+        if start is None:
+            bound, params = "FOR VALUES FROM (MINVALUE) TO (%s)", [end]
+        else:
+            bound, params = "FOR VALUES FROM (%s) TO (%s)", [start, end]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+            if cursor.fetchone()[0]:
+                cursor.execute(f"ALTER TABLE {_quote(table)} ATTACH PARTITION {_quote(name)} {bound}", params)
+                _add_foreign_keys(cursor, table, name, validate=False)
+                logger.info(f"Partition {name} rattachee")
+                return 0
+
+            if not manifest['file']:
+                raise RuntimeError(f"{name}: table détachée introuvable et export incomplet")
+
+            match = _MONTH_SUFFIX.search(name)
+            cursor.execute(f"CREATE TABLE {_quote(name)} (LIKE {_quote(table)} INCLUDING DEFAULTS)")
+            _attach_new_partition(
+                cursor, table, name, bound, params,
+                match.group(0) if match else 'legacy', foreign_keys=False
+            )
+
+            # Insertion par la table mère: le trigger recalcule les colonnes non archivées
+            count = 0
+            for rows in self._load(os.path.join(self.directory, manifest['file']), manifest['format']):
+                cursor.execute(
+                    f"INSERT INTO {_quote(table)} SELECT * FROM json_populate_recordset(NULL::{_quote(table)}, %s)",
+                    [json.dumps(rows, default=str)]
+                )
+                count += len(rows)
+            _add_foreign_keys(cursor, table, name, validate=False)
+
+        logger.info(f"Partition {name} restauree depuis l'archive: {count} ligne(s)")
+        return count
+
+    def _load(self, path, file_format):
+        if file_format == 'parquet':
+            if pyarrow is None:
+                raise ImproperlyConfigured("La restauration Parquet nécessite pyarrow (pip install pyarrow)")
+            for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=self.batch_size):
+                yield batch.to_pylist()
+            return
+
+        rows = []
+        with gzip.open(path, 'rt', encoding='utf-8') as handle:
+            for line in handle:
+                rows.append(json.loads(line))
+                if len(rows) >= self.batch_size:
+                    yield rows
+                    rows = []
+        if rows:
+            yield rows
@@ -0,0 +1,145 @@
+# sms/resolvers.py - Cache à deux niveaux des correspondances téléphone -> utilisateur et (utilisateur, téléphone) -> conversation
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from account.metrics import metrics
+from account.models import CustomUser
+from .models import Conversation
+
+# Valeur absente du cache (None est une valeur légitime: numéro sans utilisateur)
+MISSING = object()
+
+
+def get_resolver_config(key, default=None):
+    """Lit une option de SMS_RESOLVER_CACHE_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_RESOLVER_CACHE_CONFIG', {}).get(key, default)
+
+
+def shared_tier_enabled():
+    """
+    Niveau partagé seulement si le cache Django est commun aux process (Redis, Memcached, base...)
+    LocMemCache est propre au process: une invalidation n'y atteindrait pas les autres workers
+    """
+    shared = get_resolver_config('SHARED')
+    if shared is not None:
+        return shared
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+class TwoTierCache:
+    """
+    LRU en mémoire du process (durée de vie LOCAL_TTL) devant le cache Django partagé (SHARED_TTL)
+    delete() efface le cache local de ce process et le cache partagé: les autres process gardent
+    l'ancienne valeur au plus LOCAL_TTL. Sans cache partagé (LocMemCache), seul le niveau local sert
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (expire à, valeur)
+
+    def _shared_key(self, key):
+        return f"sms:resolver:{self.name}:{key}"
+
+    def get(self, key):
+        if not get_resolver_config('ENABLED', True):
+            return MISSING
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    metrics.incr(f"resolver.{self.name}.local_hits")
+                    return entry[1]
+                del self._entries[key]
+
+        if not shared_tier_enabled():
+            metrics.incr(f"resolver.{self.name}.misses")
+            return MISSING
+        value = cache.get(self._shared_key(key), MISSING)
+        if value is MISSING:
+            metrics.incr(f"resolver.{self.name}.misses")
+            return MISSING
+        metrics.incr(f"resolver.{self.name}.shared_hits")
+        self._set_local(key, value)
+        return value
+
+    def set(self, key, value):
+        if not get_resolver_config('ENABLED', True):
+            return
+        if shared_tier_enabled():
+            cache.set(self._shared_key(key), value, get_resolver_config('SHARED_TTL', 3600))
+        self._set_local(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if shared_tier_enabled():
+            cache.delete(self._shared_key(key))
+        metrics.incr(f"resolver.{self.name}.invalidations")
+
+    def clear(self):
+        """Vide le niveau local (le cache partagé expire de lui-même)"""
+        with self._lock:
+            self._entries.clear()
+
+    def _set_local(self, key, value):
+        max_size = get_resolver_config('LOCAL_MAX_SIZE', 10000)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + get_resolver_config('LOCAL_TTL', 60), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+            size = len(self._entries)
+        metrics.set_gauge(f"resolver.{self.name}.local_size", size)
+
+
+phone_users = TwoTierCache('phone_user')
+conversations = TwoTierCache('conversation')
+
+
+def conversation_key(user_id, contact_phone):
+    return f"{user_id}:{contact_phone}"
+
+
+def resolve_user_id(phone):
+    """Identifiant de l'utilisateur propriétaire de ce numéro, None si aucun (absence mise en cache aussi)"""
+    if not phone:
+        return None
+    user_id = phone_users.get(phone)
+    if user_id is MISSING:
+        user_id = CustomUser.objects.filter(telephone=phone).values_list('id', flat=True).first()
+        phone_users.set(phone, user_id)
+    return user_id
+
+
+def get_or_create_conversation(user_id, contact_phone):
+    """
+    Équivalent de Conversation.objects.get_or_create(user, contact_phone) sans requête si la conversation est en cache
+    L'instance retournée n'a que id, user_id et contact_phone chargés (les autres champs le sont à la demande)
+    """
+    key = conversation_key(user_id, contact_phone)
+    conversation_id = conversations.get(key)
+    if conversation_id is not MISSING:
+        values = {'id': conversation_id, 'user_id': user_id, 'contact_phone': contact_phone}
+        names = [field.attname for field in Conversation._meta.concrete_fields if field.attname in values]
+        return Conversation.from_db('default', names, [values[name] for name in names]), False
+
+    conversation, created = Conversation.objects.get_or_create(
+        user_id=user_id,
+        contact_phone=contact_phone,
+        defaults={'contact_name': ''}
+    )
+    # Après validation: une conversation créée dans une transaction annulée ne doit pas rester en cache
+    transaction.on_commit(lambda: conversations.set(key, conversation.id))
+    return conversation, created
@@ -1,5 +1,23 @@
 from rest_framework import serializers
-from .models import SMSMessage, Conversation, Contact, MessageStatus
+from .models import SMSMessage, Conversation, Contact, ContactImport, MessageStatus, Campaign
+from .pagination import MessageKeysetPagination
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldset opt-in: ?fields=id,contact_phone ne sérialise que ces champs
+    Les champs non demandés ne sont pas calculés (ex: 'messages' n'exécute aucune requête)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or not self.context.get('sparse_fields', True):
+            return
+        requested = request.query_params.get('fields')
+        if requested:
+            allowed = {name.strip() for name in requested.split(',') if name.strip()}
+            for name in set(self.fields) - allowed:
+                self.fields.pop(name)
 
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,7 +25,7 @@ class ContactSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'phone_number', 'created_at')
         read_only_fields = ('id', 'created_at')
 
-class SMSMessageSerializer(serializers.ModelSerializer):
+class SMSMessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     is_sent_by_user = serializers.SerializerMethodField()
     
     class Meta:
@@ -25,30 +43,50 @@ class SMSMessageSerializer(serializers.ModelSerializer):
             return obj.sender_phone == request.user.telephone
         return False
 
-class ConversationSerializer(serializers.ModelSerializer):
+class ConversationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Métadonnées + fenêtre des derniers messages (context['message_window'], défaut: page_size du paginateur)
+    Les messages plus anciens se lisent via conversations/<id>/messages/?before=<messages_before>
+    """
     last_message = serializers.SerializerMethodField()
     last_message_time = serializers.SerializerMethodField()
     unread_count = serializers.ReadOnlyField()
-    messages = SMSMessageSerializer(many=True, read_only=True)
+    messages = serializers.SerializerMethodField()
+    messages_before = serializers.SerializerMethodField()
 
     class Meta:
         model = Conversation
         fields = (
             'id', 'contact_phone', 'contact_name', 'created_at', 
             'updated_at', 'last_message', 'last_message_time', 
-            'unread_count', 'messages', 'is_archived'
+            'unread_count', 'messages', 'messages_before', 'is_archived'
         )
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+    def _recent_messages(self, obj):
+        if not hasattr(obj, '_recent_page'):
+            paginator = MessageKeysetPagination()
+            window = self.context.get('message_window', paginator.page_size)
+            obj._recent_page = paginator.paginate(obj.messages.all(), window)
+            obj._recent_before = paginator.before
+        return obj._recent_page
+
+    def get_messages(self, obj):
+        # ?fields= concerne la conversation, pas les messages imbriqués
+        context = {**self.context, 'sparse_fields': False}
+        return SMSMessageSerializer(self._recent_messages(obj), many=True, context=context).data
+
+    def get_messages_before(self, obj):
+        self._recent_messages(obj)
+        return obj._recent_before
+
     def get_last_message(self, obj):
-        last_msg = obj.last_message
-        return last_msg.message if last_msg else ""
+        return obj.last_message_text
 
     def get_last_message_time(self, obj):
-        last_msg = obj.last_message
-        return last_msg.sent_at if last_msg else obj.updated_at
+        return obj.last_message_at or obj.updated_at
 
-class ConversationListSerializer(serializers.ModelSerializer):
+class ConversationListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer léger pour la liste des conversations"""
     last_message = serializers.SerializerMethodField()
     last_message_time = serializers.SerializerMethodField()
@@ -62,12 +100,22 @@ class ConversationListSerializer(serializers.ModelSerializer):
         )
 
     def get_last_message(self, obj):
-        last_msg = obj.last_message
-        return last_msg.message if last_msg else ""
+        return obj.last_message_text
 
     def get_last_message_time(self, obj):
-        last_msg = obj.last_message
-        return last_msg.sent_at if last_msg else obj.updated_at
+        return obj.last_message_at or obj.updated_at
+
+class ConversationSearchSerializer(ConversationListSerializer):
+    """Résultat de recherche: conversation, pertinence et extrait du message trouvé"""
+    rank = serializers.FloatField(read_only=True)
+    matched_message_id = serializers.IntegerField(read_only=True, allow_null=True)
+    snippet = serializers.SerializerMethodField()
+
+    class Meta(ConversationListSerializer.Meta):
+        fields = ConversationListSerializer.Meta.fields + ('rank', 'matched_message_id', 'snippet')
+
+    def get_snippet(self, obj):
+        return getattr(obj, 'snippet', None)
 
 class SendSMSSerializer(serializers.Serializer):
     recipient = serializers.CharField(max_length=15)
@@ -92,4 +140,45 @@ class CreateConversationSerializer(serializers.Serializer):
     def validate_contact_phone(self, value):
         if not value.startswith('+') or len(value) < 10:
             raise serializers.ValidationError("Numéro de téléphone invalide.")
-        return value
\ No newline at end of file
+        return value
+
+class CampaignSerializer(serializers.ModelSerializer):
+    processed_count = serializers.ReadOnlyField()
+    progress = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Campaign
+        fields = (
+            'id', 'name', 'message', 'status', 'total_recipients',
+            'sent_count', 'failed_count', 'processed_count', 'progress',
+            'created_at', 'started_at', 'completed_at'
+        )
+        read_only_fields = fields
+
+class CreateCampaignSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    message = serializers.CharField(max_length=160)
+    recipients = serializers.ListField(
+        child=serializers.CharField(max_length=20), required=False, default=list
+    )
+    contact_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    all_contacts = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if not data['recipients'] and not data['contact_ids'] and not data['all_contacts']:
+            raise serializers.ValidationError("Indiquez des destinataires, des contacts ou all_contacts.")
+        return data
+
+class ContactImportSerializer(serializers.ModelSerializer):
+    progress = serializers.ReadOnlyField()
+
+    class Meta:
+        model = ContactImport
+        fields = (
+            'id', 'file_name', 'file_format', 'status', 'total_rows', 'processed_rows',
+            'imported_count', 'rejected_count', 'duplicate_count', 'progress',
+            'rejected_rows', 'error_message', 'created_at', 'started_at', 'completed_at'
+        )
+        read_only_fields = fields
@@ -0,0 +1,1753 @@
+# sms/services.py - Services métier SMS (campagnes, envoi en masse, import de contacts)
+
+import asyncio
+import csv
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+from queue import Queue
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, TrigramSimilarity
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from account.circuitbreaker import CircuitBreaker, CircuitOpenError
+from account.metrics import metrics
+from account.models import CustomUser
+from account.phone import normalize_phone
+from account.ratelimit import OrangeRateLimiter, RateLimitTimeout
+from account.services import OrangeAPIError, OrangeOAuth, RealtimeNotificationService
+from .models import (
+    Campaign, CampaignRecipient, Contact, ContactImport, Conversation, DailyMessageStats, DeliveryReceipt,
+    InboundMessage, PendingReceipt, SMSMessage, MessageStatus
+)
+from .dedup import claim
+from .resolvers import resolve_user_id
+from sms_platform.dbrouter import mark_write
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_campaign_config(key, default=None):
+    """Lit une option de SMS_CAMPAIGN_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_CAMPAIGN_CONFIG', {}).get(key, default)
+
+
+def get_import_config(key, default=None):
+    """Lit une option de SMS_CONTACT_IMPORT_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_CONTACT_IMPORT_CONFIG', {}).get(key, default)
+
+
+def get_ingest_config(key, default=None):
+    """Lit une option de SMS_INGEST_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_INGEST_CONFIG', {}).get(key, default)
+
+
+def get_search_config(key, default=None):
+    """Lit une option de SMS_SEARCH_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_SEARCH_CONFIG', {}).get(key, default)
+
+
+def get_outbox_config(key, default=None):
+    """Lit une option de SMS_OUTBOX_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_OUTBOX_CONFIG', {}).get(key, default)
+
+
+def get_inbound_config(key, default=None):
+    """Lit une option de SMS_INBOUND_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'SMS_INBOUND_CONFIG', {}).get(key, default)
+
+
+class RetryPolicy:
+    """Classement des erreurs Orange et délais de reprise (backoff exponentiel avec gigue)"""
+
+    RETRYABLE_STATUS_CODES = {401, 408, 429}
+
+    @staticmethod
+    def config(key, default=None):
+        return get_outbox_config('RETRY', {}).get(key, default)
+
+    @staticmethod
+    def max_attempts():
+        return RetryPolicy.config('MAX_ATTEMPTS', 5)
+
+    @staticmethod
+    def is_retryable(error):
+        """Erreurs passagères (réseau, timeout, 5xx, 429, limiteur, disjoncteur) = reprise; le reste est définitif"""
+        if isinstance(error, ValueError):
+            # Numéro ou message invalide: inutile de réessayer
+            return False
+        if isinstance(error, OrangeAPIError):
+            status_code = error.status_code or 0
+            return status_code >= 500 or status_code in RetryPolicy.RETRYABLE_STATUS_CODES
+        return True
+
+    @staticmethod
+    def next_delay(attempts):
+        """Délai avant l'essai suivant, tiré entre la moitié et la totalité du backoff"""
+        base = RetryPolicy.config('BASE_DELAY', 2)
+        cap = RetryPolicy.config('MAX_DELAY', 300)
+        backoff = min(cap, base * 2 ** max(attempts - 1, 0))
+        return random.uniform(backoff / 2, backoff)
+
+
+class SMSDispatchService:
+    """Envoi d'un message déjà enregistré en base, toujours hors transaction"""
+
+    @staticmethod
+    def deliver(sms, message_status, allow_retry=True, blocking_retries=False):
+        """
+        Appelle Orange pour un SMSMessage existant puis enregistre le résultat
+        - allow_retry: une erreur passagère remet le message en file avec un délai
+        - blocking_retries: les reprises sont faites sur place (threads de campagne)
+        Retourne la réponse Orange, relève l'exception Orange en cas d'échec
+        """
+        while True:
+            message_status.attempts += 1
+            try:
+                orange_response = OrangeOAuth.send_sms_with_default_sender(
+                    recipient_phone=sms.recipient_phone,
+                    message=sms.message
+                )
+                break
+            except Exception as orange_error:
+                logger.error(f"Erreur Orange API pour SMS {sms.id} (essai {message_status.attempts}): {orange_error}")
+                if (blocking_retries and RetryPolicy.is_retryable(orange_error)
+                        and message_status.attempts < RetryPolicy.max_attempts()):
+                    # Circuit ouvert: attendre l'appel de test plutôt que le backoff
+                    time.sleep(getattr(orange_error, 'retry_after', 0) or RetryPolicy.next_delay(message_status.attempts))
+                    continue
+                SMSDispatchService.record_failure(sms, message_status, orange_error, allow_retry=allow_retry)
+                raise
+
+        SMSDispatchService.record_success(sms, message_status, orange_response)
+        return orange_response
+
+    @staticmethod
+    def record_success(sms, message_status, orange_response):
+        # ✅ 201 Orange = message accepté, pas livré: le statut final ('delivered'/'failed') vient des accusés
+        message_status.status = 'sent'
+        message_status.error_message = ''
+        message_status.claimed_at = None
+        message_status.next_attempt_at = None
+        message_status.save(update_fields=['status', 'error_message', 'claimed_at', 'attempts', 'next_attempt_at', 'updated_at'])
+
+        # ✅ message_id enregistré après le statut: un accusé qui le trouve ne sera plus écrasé par 'sent'
+        sms.is_sent = True
+        sms.message_id = orange_response.get('message_id')
+        SMSMessage.objects.filter(id=sms.id).update(is_sent=True, message_id=sms.message_id)
+
+        # Accusés arrivés avant l'enregistrement du message_id (une requête indexée)
+        for updates in DeliveryReceiptService.apply_pending(sms.message_id).values():
+            for update in updates:
+                # Statut en mémoire aligné sur la base (réponse de la vue, notification du dispatcher),
+                # déjà compté par apply_pending
+                message_status.mark_counted(update['status'])
+        logger.info(f"SMS envoye avec succes! ID: {sms.message_id}")
+
+    @staticmethod
+    def record_failure(sms, message_status, error, allow_retry=True):
+        """Échec définitif ('failed'), reprise programmée ('queued') ou abandon ('dead')"""
+        sms.is_sent = False
+        SMSMessage.objects.filter(id=sms.id).update(is_sent=False)
+
+        message_status.error_message = str(error)
+        message_status.claimed_at = None
+        message_status.next_attempt_at = None
+
+        if isinstance(error, (CircuitOpenError, RateLimitTimeout)) and allow_retry:
+            # ✅ Aucun appel Orange n'a eu lieu (disjoncteur ouvert, limiteur saturé):
+            # le message attend la réouverture ou le prochain jeton sans consommer d'essai
+            message_status.attempts = max(message_status.attempts - 1, 0)
+            message_status.status = 'queued'
+            message_status.next_attempt_at = timezone.now() + timedelta(
+                seconds=error.retry_after + random.uniform(0, RetryPolicy.config('BASE_DELAY', 2))
+            )
+        elif not RetryPolicy.is_retryable(error):
+            message_status.status = 'failed'
+        elif message_status.attempts >= RetryPolicy.max_attempts():
+            message_status.status = 'dead'
+            logger.warning(f"SMS {sms.id} abandonne apres {message_status.attempts} essais: {error}")
+        elif allow_retry:
+            message_status.status = 'queued'
+            message_status.next_attempt_at = timezone.now() + timedelta(
+                seconds=RetryPolicy.next_delay(message_status.attempts)
+            )
+        else:
+            message_status.status = 'failed'
+
+        message_status.save(update_fields=['status', 'error_message', 'claimed_at', 'attempts', 'next_attempt_at', 'updated_at'])
+
+
+class OutboxService:
+    """File d'envoi transactionnelle: les vues enregistrent, les dispatchers envoient"""
+
+    @staticmethod
+    def is_enabled():
+        return get_outbox_config('ENABLED', False)
+
+    @staticmethod
+    def claim_batch(limit):
+        """
+        Réserve jusqu'à `limit` messages en attente (SELECT ... FOR UPDATE SKIP LOCKED)
+        Les messages restés 'sending' trop longtemps (dispatcher arrêté) sont repris
+        """
+        stale_before = timezone.now() - timedelta(seconds=get_outbox_config('CLAIM_TIMEOUT', 300))
+
+        now = timezone.now()
+        ready = Q(status='queued') & (Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+
+        with transaction.atomic():
+            ids = list(
+                MessageStatus.objects.select_for_update(skip_locked=True)
+                .filter(ready | Q(status='sending', claimed_at__lt=stale_before))
+                .order_by('id')
+                .values_list('id', flat=True)[:limit]
+            )
+            if not ids:
+                return []
+            now = timezone.now()
+            MessageStatus.objects.filter(id__in=ids).update(status='sending', claimed_at=now, updated_at=now)
+
+        return list(
+            MessageStatus.objects.select_related('message__conversation').filter(id__in=ids).order_by('id')
+        )
+
+    @staticmethod
+    def process(message_status):
+        """Envoie un message réservé et notifie l'utilisateur du nouveau statut"""
+        sms = message_status.message
+        try:
+            SMSDispatchService.deliver(sms, message_status)
+        except Exception:
+            # L'échec est déjà enregistré sur le MessageStatus par deliver()
+            pass
+
+        RealtimeNotificationService.notify_message_status_update(
+            user_id=sms.conversation.user_id,
+            message_id=sms.id,
+            new_status=message_status.status
+        )
+        return message_status.status in ('sent', 'delivered')
+
+    @staticmethod
+    def requeue(queryset):
+        """Remet en file des messages abandonnés ou en échec, retourne le nombre de messages"""
+        with transaction.atomic():
+            # Verrou sur les statuts concernés: les échecs décomptés sont bien ceux remis en file
+            rows = list(
+                queryset.filter(status__in=['dead', 'failed']).select_for_update(of=('self',))
+                .values_list('id', 'status', 'message_sent_at', 'message__conversation__user_id', 'message__is_received')
+            )
+            if not rows:
+                return 0
+
+            deltas = defaultdict(int)
+            for _, previous, sent_at, user_id, is_received in rows:
+                if not is_received:
+                    for key, delta in MessageStatsService.transition_deltas(
+                        user_id, timezone.localdate(sent_at), previous, 'queued'
+                    ).items():
+                        deltas[key] += delta
+            MessageStatsService.apply(deltas)
+
+            return MessageStatus.objects.filter(id__in=[row[0] for row in rows]).update(
+                status='queued',
+                attempts=0,
+                next_attempt_at=None,
+                claimed_at=None,
+                updated_at=timezone.now()
+            )
+
+
+class OutboxDispatcher:
+    """Pool de workers qui vident l'outbox avec une concurrence bornée"""
+
+    def __init__(self, workers=None, batch_size=None, poll_interval=None):
+        self.workers = workers or get_outbox_config('WORKERS', 8)
+        self.batch_size = batch_size or get_outbox_config('BATCH_SIZE', 20)
+        self.poll_interval = poll_interval or get_outbox_config('POLL_INTERVAL', 1.0)
+        self._stop = threading.Event()
+
+    def run(self, once=False):
+        """Démarre les workers; avec once=True, s'arrête quand l'outbox est vide"""
+        threads = [
+            threading.Thread(target=self._worker, args=(once,), name=f"outbox-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info(f"Dispatcher outbox demarre avec {self.workers} workers")
+        for thread in threads:
+            thread.join()
+        logger.info("Dispatcher outbox arrete")
+
+    def stop(self):
+        self._stop.set()
+
+    def process_batch(self):
+        """Réserve et envoie un lot, retourne le nombre de messages traités"""
+        batch = OutboxService.claim_batch(self.batch_size)
+        for message_status in batch:
+            OutboxService.process(message_status)
+        return len(batch)
+
+    def _worker(self, once):
+        try:
+            while not self._stop.is_set():
+                # Orange indisponible: les messages restent en file au lieu d'être réservés puis garés
+                pause = CircuitBreaker.get('orange').retry_after()
+                if pause:
+                    self._stop.wait(min(pause, self.poll_interval))
+                    continue
+                try:
+                    processed = self.process_batch()
+                except Exception as e:
+                    logger.error(f"Erreur dispatcher outbox: {e}")
+                    processed = 0
+                if not processed:
+                    if once:
+                        break
+                    self._stop.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+
+
+class AsyncOutboxDispatcher:
+    """
+    Variante asyncio du dispatcher: un seul thread garde `concurrency` envois Orange en vol
+    Les accès base (réservation, écriture du statut) passent par sync_to_async
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None):
+        self.concurrency = concurrency or get_outbox_config('ASYNC_CONCURRENCY', 200)
+        self.poll_interval = poll_interval or get_outbox_config('POLL_INTERVAL', 1.0)
+        self._stop = asyncio.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def batch_size(self):
+        """Messages réservés par tour: pas plus que le limiteur de débit ne peut servir en MAX_WAIT"""
+        capacity = OrangeRateLimiter.get_default().capacity(OrangeOAuth.API_SENDER_PHONE)
+        return self.concurrency if capacity is None else min(self.concurrency, capacity)
+
+    async def run(self, once=False):
+        from account.async_services import AsyncOrangeClient
+
+        logger.info(f"Dispatcher outbox asynchrone demarre ({self.concurrency} envois simultanes)")
+        async with AsyncOrangeClient(max_concurrency=self.concurrency) as client:
+            while not self._stop.is_set():
+                pause = CircuitBreaker.get('orange').retry_after()
+                batch = [] if pause else await sync_to_async(OutboxService.claim_batch)(self.batch_size())
+                if not batch:
+                    if once and not pause:
+                        break
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), timeout=min(pause or self.poll_interval, self.poll_interval))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                results = await asyncio.gather(
+                    *(self._process(client, message_status) for message_status in batch), return_exceptions=True
+                )
+                for message_status, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        # Erreur hors appel Orange (base, notification): la ligne reste 'sending'
+                        # et sera reprise après CLAIM_TIMEOUT, le reste du lot n'est pas affecté
+                        logger.error(f"Erreur dispatcher asynchrone pour le statut {message_status.id}: {result}")
+                        metrics.incr('sms.outbox.errors')
+        logger.info("Dispatcher outbox asynchrone arrete")
+
+    async def _process(self, client, message_status):
+        sms = message_status.message
+        message_status.attempts += 1
+        try:
+            orange_response = await client.send_sms_with_default_sender(
+                recipient_phone=sms.recipient_phone,
+                message=sms.message
+            )
+        except Exception as orange_error:
+            await sync_to_async(SMSDispatchService.record_failure)(sms, message_status, orange_error)
+        else:
+            await sync_to_async(SMSDispatchService.record_success)(sms, message_status, orange_response)
+
+        await sync_to_async(RealtimeNotificationService.notify_message_status_update)(
+            user_id=sms.conversation.user_id,
+            message_id=sms.id,
+            new_status=message_status.status
+        )
+
+class ConversationService:
+    """Résumé dénormalisé des conversations (dernier message, non lus)"""
+
+    @staticmethod
+    def unread_count_subquery():
+        """COUNT des messages du contact non lus, corrélé à la conversation courante"""
+        unread = (
+            SMSMessage.objects.filter(
+                conversation=OuterRef('pk'),
+                sender_phone=OuterRef('contact_phone'),
+                is_read=False
+            )
+            .order_by()
+            .values('conversation')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        return Coalesce(Subquery(unread), 0)
+
+    @staticmethod
+    def mark_as_read(conversation, reader_phone):
+        """Marque comme lus les messages reçus par reader_phone et recalcule unread_count"""
+        updated_count = conversation.messages.filter(
+            recipient_phone=reader_phone,
+            is_read=False
+        ).update(is_read=True)
+
+        if updated_count:
+            Conversation.objects.filter(id=conversation.id).update(
+                unread_count=ConversationService.unread_count_subquery()
+            )
+            conversation.refresh_from_db(fields=['unread_count'])
+        return updated_count
+
+    @staticmethod
+    def recompute(queryset, **extra):
+        """
+        Recalcule dernier message et non lus pour un ensemble de conversations (une requête UPDATE)
+        extra: champs supplémentaires mis à jour dans la même requête (ex: updated_at)
+        """
+        last = SMSMessage.objects.filter(conversation=OuterRef('pk')).order_by('-sent_at', '-id')
+        return queryset.update(
+            **extra,
+            last_message_id=Subquery(last.values('id')[:1]),
+            last_message_text=Coalesce(Subquery(last.values('message')[:1]), Value('')),
+            last_message_at=Subquery(last.values('sent_at')[:1]),
+            unread_count=ConversationService.unread_count_subquery()
+        )
+
+
+# Compteurs DailyMessageStats couverts par chaque statut d'un message envoyé
+# (un message reçu compte une fois dans 'received', quel que soit son statut)
+STATUS_STATS = {
+    'sent': ('sent',),
+    'delivered': ('sent', 'delivered'),
+    'read': ('sent', 'delivered'),
+    'failed': ('failed',),
+    'dead': ('failed',),
+}
+
+
+class MessageStatsService:
+    """
+    Statistiques quotidiennes par utilisateur (DailyMessageStats)
+    Chaque compteur reflète le statut courant des messages du jour: un changement de statut
+    déplace le message d'un compteur à l'autre, une reconstruction donne donc le même résultat
+    """
+
+    @staticmethod
+    def transition_deltas(user_id, day, previous, current):
+        before = set(STATUS_STATS.get(previous, ()))
+        after = set(STATUS_STATS.get(current, ()))
+        deltas = {(user_id, day, bucket): 1 for bucket in after - before}
+        deltas.update({(user_id, day, bucket): -1 for bucket in before - after})
+        return deltas
+
+    @staticmethod
+    def record_transition(message_status, previous):
+        """Appelé par MessageStatus.save() quand le statut change"""
+        if STATUS_STATS.get(previous) == STATUS_STATS.get(message_status.status):
+            return  # Ex: queued -> sending, aucun compteur ne bouge
+        message = message_status.message
+        if message.is_received:
+            return
+        MessageStatsService.apply(MessageStatsService.transition_deltas(
+            message.conversation.user_id, timezone.localdate(message_status.message_sent_at),
+            previous, message_status.status
+        ))
+
+    @staticmethod
+    def record_messages(messages, status=None):
+        """Statistiques d'un lot de messages insérés en masse (avec leur statut initial)"""
+        deltas = defaultdict(int)
+        for sms in messages:
+            day = timezone.localdate(sms.sent_at)
+            if sms.is_received:
+                deltas[(sms.conversation.user_id, day, 'received')] += 1
+            else:
+                for bucket in STATUS_STATS.get(status, ()):
+                    deltas[(sms.conversation.user_id, day, bucket)] += 1
+        MessageStatsService.apply(deltas)
+
+    @staticmethod
+    def apply(deltas):
+        """Ajoute {(user_id, jour, compteur): delta} en une requête INSERT ... ON CONFLICT DO UPDATE"""
+        # Ordre fixe des lignes: deux mises à jour concurrentes ne peuvent pas s'interbloquer
+        rows = sorted((key, delta) for key, delta in deltas.items() if delta and key[0])
+        if not rows:
+            return
+        table = DailyMessageStats._meta.db_table
+        placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+        params = [value for (user_id, day, bucket), delta in rows for value in (user_id, day, bucket, delta)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (user_id, day, status, count) VALUES {placeholders} "
+                f"ON CONFLICT (user_id, day, status) DO UPDATE SET count = {table}.count + excluded.count",
+                params
+            )
+
+    @staticmethod
+    def summary(user, days=30):
+        """Totaux, mois en cours et détail des `days` derniers jours: deux requêtes sur les compteurs"""
+        today = timezone.localdate()
+        start = today - timedelta(days=days - 1)
+        buckets = [bucket for bucket, _ in DailyMessageStats.STATUS_CHOICES]
+        queryset = DailyMessageStats.objects.filter(user=user)
+
+        totals = dict.fromkeys(buckets, 0)
+        this_month = dict.fromkeys(buckets, 0)
+        for row in queryset.values('status').annotate(
+            total=Sum('count'), month=Sum('count', filter=Q(day__gte=today.replace(day=1)))
+        ):
+            totals[row['status']] = row['total']
+            this_month[row['status']] = row['month'] or 0
+
+        daily = {}
+        for day, bucket, count in queryset.filter(day__gte=start).values_list('day', 'status', 'count'):
+            daily.setdefault(day, dict.fromkeys(buckets, 0))[bucket] = count
+
+        finished = totals['sent'] + totals['failed']
+        return {
+            'totals': totals,
+            'this_month': this_month,
+            'success_rate': round(totals['sent'] * 100 / finished, 1) if finished else 0,
+            'delivery_rate': round(totals['delivered'] * 100 / totals['sent'], 1) if totals['sent'] else 0,
+            'daily': [
+                {'day': day, **daily.get(day, dict.fromkeys(buckets, 0))}
+                for day in (start + timedelta(days=offset) for offset in range(days))
+            ],
+        }
+
+    @staticmethod
+    def rebuild(user_ids, since=None):
+        """
+        Recalcule les compteurs de ces utilisateurs (depuis le jour `since` inclus) à partir des messages
+        À appeler dans une transaction: les anciens compteurs sont remplacés d'un bloc
+        """
+        messages = SMSMessage.objects.filter(conversation__user_id__in=user_ids)
+        stats = DailyMessageStats.objects.filter(user_id__in=user_ids)
+        if since:
+            messages = messages.filter(sent_at__gte=timezone.make_aware(datetime.combine(since, dt_time.min)))
+            stats = stats.filter(day__gte=since)
+
+        counts = defaultdict(int)
+        rows = (
+            messages.annotate(day=TruncDate('sent_at'))
+            .values_list('conversation__user_id', 'day', 'is_received', 'status__status')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for user_id, day, is_received, status, total in rows:
+            for bucket in ('received',) if is_received else STATUS_STATS.get(status, ()):
+                counts[(user_id, day, bucket)] += total
+
+        stats.delete()
+        DailyMessageStats.objects.bulk_create(
+            [DailyMessageStats(user_id=user_id, day=day, status=bucket, count=total)
+             for (user_id, day, bucket), total in counts.items()],
+            batch_size=1000
+        )
+        return len(counts)
+
+
+class ConversationSearchService:
+    """
+    Recherche classée dans les conversations d'un utilisateur
+    - PostgreSQL: plein texte sur les messages (search_vector, index GIN, configuration française)
+      et trigrammes (pg_trgm) sur le nom et le numéro du contact
+    - autres moteurs (sqlite des tests): simples icontains, sans pertinence
+    """
+
+    CONTACT_FIELDS = ('id', 'contact_phone', 'contact_name', 'updated_at', 'last_message_text', 'last_message_at', 'unread_count')
+
+    @staticmethod
+    def is_full_text():
+        return connection.vendor == 'postgresql'
+
+    @staticmethod
+    def search_query(query):
+        # websearch: syntaxe tolérante ("mots exacts", -exclusion, or), jamais d'erreur de syntaxe
+        return SearchQuery(query, config=get_search_config('CONFIG', 'french'), search_type='websearch')
+
+    @staticmethod
+    def search(user, query):
+        """
+        Conversations correspondant à `query`, annotées rank et matched_message_id
+        (meilleur message trouvé), triées par pertinence puis par activité
+        Un contact trouvé par nom ou numéro passe devant les seuls messages trouvés
+        """
+        # Numéro partiel ("77 123", "+22177..."): comparé sans séparateurs
+        phone_query = re.sub(r'[\s\-().]', '', query)
+        if not re.fullmatch(r'\+?[0-9]+', phone_query):
+            phone_query = None
+        contact_match = Q(contact_name__icontains=query)
+        if phone_query:
+            contact_match |= Q(contact_phone__contains=phone_query)
+
+        messages = SMSMessage.objects.filter(conversation__user=user, conversation__is_archived=False)
+        # Meilleur message de chaque conversation candidate (déjà restreinte à l'utilisateur)
+        conversation_messages = SMSMessage.objects.filter(conversation=OuterRef('pk'))
+        if ConversationSearchService.is_full_text():
+            search_query = ConversationSearchService.search_query(query)
+            hits = messages.filter(search_vector=search_query)
+            best = (
+                conversation_messages.filter(search_vector=search_query)
+                .annotate(rank=SearchRank(F('search_vector'), search_query))
+                .order_by('-rank', '-sent_at', '-id')
+            )
+            message_rank = Coalesce(Subquery(best.values('rank')[:1]), Value(0.0), output_field=FloatField())
+            contact_rank = Value(1.0) + Greatest(
+                TrigramSimilarity('contact_name', query),
+                TrigramSimilarity('contact_phone', phone_query or query)
+            )
+        else:
+            hits = messages.filter(message__icontains=query)
+            best = conversation_messages.filter(message__icontains=query).order_by('-sent_at', '-id')
+            message_rank = Value(0.0)
+            contact_rank = Value(1.0)
+
+        return (
+            Conversation.objects.filter(user=user, is_archived=False)
+            .filter(contact_match | Q(id__in=hits.values('conversation_id')))
+            .only(*ConversationSearchService.CONTACT_FIELDS)
+            .annotate(
+                matched_message_id=Subquery(best.values('id')[:1]),
+                rank=message_rank + Case(When(contact_match, then=contact_rank), default=Value(0.0), output_field=FloatField())
+            )
+            .order_by('-rank', F('last_message_at').desc(nulls_last=True), '-id')
+        )
+
+    @staticmethod
+    def attach_snippets(conversations, query):
+        """
+        Ajoute `snippet` (extrait surligné du meilleur message) à une page de résultats
+        Une seule requête pour la page: ts_headline n'est calculé que pour les messages affichés
+        """
+        ids = [conversation.matched_message_id for conversation in conversations if conversation.matched_message_id]
+        snippets = {}
+        if ids:
+            messages = SMSMessage.objects.filter(id__in=ids)
+            if ConversationSearchService.is_full_text():
+                start_sel, stop_sel = get_search_config('HIGHLIGHT', ('«', '»'))
+                snippets = dict(messages.annotate(snippet=SearchHeadline(
+                    'message',
+                    ConversationSearchService.search_query(query),
+                    config=get_search_config('CONFIG', 'french'),
+                    start_sel=start_sel,
+                    stop_sel=stop_sel,
+                    max_words=get_search_config('SNIPPET_WORDS', 20),
+                    min_words=5
+                )).values_list('id', 'snippet'))
+            else:
+                snippets = dict(messages.values_list('id', 'message'))
+
+        for conversation in conversations:
+            conversation.snippet = snippets.get(conversation.matched_message_id)
+        return conversations
+
+
+class MessageIngestService:
+    """
+    Enregistrement de messages en masse (campagnes, rafales de webhooks) sans SMSMessage.save()
+    Utilisateurs et conversations sont résolus pour tout le lot, les insertions passent par
+    bulk_create et chaque conversation touchée n'est mise à jour qu'une fois par lot
+    """
+
+    @staticmethod
+    def ingest(messages, status=None, batch_size=None):
+        """
+        Enregistre des SMSMessage non sauvegardés, avec ou sans conversation
+        - status: crée aussi un MessageStatus avec ce statut pour chaque message
+        Retourne un dict:
+            messages: messages créés (avec id, conversation et status renseignés)
+            unresolved: messages ignorés car aucun utilisateur ne correspond
+        """
+        batch_size = batch_size or get_ingest_config('BATCH_SIZE', 1000)
+        created = []
+        unresolved = []
+
+        for start in range(0, len(messages), batch_size):
+            batch = messages[start:start + batch_size]
+            with transaction.atomic():
+                unresolved.extend(MessageIngestService.resolve_conversations(batch))
+                batch = [sms for sms in batch if sms.conversation_id]
+                if not batch:
+                    continue
+
+                SMSMessage.objects.bulk_create(batch)
+                if status:
+                    statuses = [MessageStatus(message=sms, status=status, message_sent_at=sms.sent_at) for sms in batch]
+                    MessageStatus.objects.bulk_create(statuses)
+                    for sms, message_status in zip(batch, statuses):
+                        message_status.mark_counted()  # Compté ci-dessous (MessageStatsService)
+                        sms.status = message_status
+                MessageStatsService.record_messages(batch, status)
+                MessageIngestService.update_summaries(batch)
+            created.extend(batch)
+
+        if unresolved:
+            logger.warning(f"Ingestion: {len(unresolved)} message(s) sans utilisateur ignore(s)")
+        return {'messages': created, 'unresolved': unresolved}
+
+    @staticmethod
+    def resolve_conversations(messages):
+        """
+        Rattache chaque message à sa conversation (une requête utilisateurs, deux ou trois requêtes
+        conversations pour tout le lot), retourne les messages sans utilisateur connu
+        """
+        pending = [sms for sms in messages if not sms.conversation_id]
+        if not pending:
+            return []
+
+        phones = {sms.sender_phone for sms in pending} | {sms.recipient_phone for sms in pending}
+        users = dict(CustomUser.objects.filter(telephone__in=phones).values_list('telephone', 'id'))
+
+        groups = defaultdict(list)
+        unresolved = []
+        for sms in pending:
+            # Même priorité que SMSMessage.save(): l'expéditeur d'abord, puis le destinataire
+            if sms.sender_phone in users:
+                groups[(users[sms.sender_phone], sms.recipient_phone)].append(sms)
+            elif sms.recipient_phone in users:
+                groups[(users[sms.recipient_phone], sms.sender_phone)].append(sms)
+            else:
+                unresolved.append(sms)
+
+        conversations = MessageIngestService.get_or_create_conversations(groups.keys())
+        for key, group in groups.items():
+            for sms in group:
+                sms.conversation = conversations[key]
+        return unresolved
+
+    @staticmethod
+    def get_or_create_conversations(keys):
+        """Équivalent de get_or_create pour un ensemble de couples (user_id, contact_phone)"""
+        keys = set(keys)
+        if not keys:
+            return {}
+
+        def fetch(wanted):
+            queryset = Conversation.objects.filter(
+                user_id__in={user_id for user_id, _ in wanted},
+                contact_phone__in={phone for _, phone in wanted}
+            )
+            return {
+                (conversation.user_id, conversation.contact_phone): conversation
+                for conversation in queryset
+                if (conversation.user_id, conversation.contact_phone) in wanted
+            }
+
+        conversations = fetch(keys)
+        missing = keys - conversations.keys()
+        if missing:
+            # ignore_conflicts: une conversation créée entre-temps par un autre process est relue ensuite
+            Conversation.objects.bulk_create(
+                [Conversation(user_id=user_id, contact_phone=phone, contact_name='') for user_id, phone in missing],
+                ignore_conflicts=True
+            )
+            conversations.update(fetch(missing))
+        return conversations
+
+    @staticmethod
+    def update_summaries(messages):
+        """
+        Répercute un lot de messages insérés sur leurs conversations: un seul UPDATE par paquet
+        de conversations touchées (updated_at, dernier message et non lus recalculés en base)
+        """
+        latest = {}
+        unread = defaultdict(int)
+        for sms in messages:
+            conversation = sms.conversation
+            current = latest.get(conversation.id)
+            if current is None or (sms.sent_at, sms.id) > (current.sent_at, current.id):
+                latest[conversation.id] = sms
+            if not sms.is_read and sms.sender_phone == conversation.contact_phone:
+                unread[conversation.id] += 1
+
+        ids = list(latest)
+        chunk_size = get_ingest_config('SUMMARY_CHUNK_SIZE', 500)
+        now = timezone.now()
+        for start in range(0, len(ids), chunk_size):
+            # Recalcul par sous-requêtes indexées plutôt qu'un CASE par conversation:
+            # coût constant côté Python et résultat juste même avec des écritures concurrentes
+            ConversationService.recompute(Conversation.objects.filter(id__in=ids[start:start + chunk_size]), updated_at=now)
+
+        # Objets en mémoire alignés sur la base, comme après SMSMessage.save()
+        for conversation_id, sms in latest.items():
+            conversation = sms.conversation
+            conversation.updated_at = now
+            if conversation.last_message_at is None or conversation.last_message_at <= sms.sent_at:
+                conversation.last_message_text = sms.message
+                conversation.last_message_at = sms.sent_at
+                conversation.last_message_id = sms.id
+            conversation.unread_count += unread[conversation_id]
+
+
+class InboundService:
+    """
+    Réception différée des SMS entrants: le webhook enregistre la notification Orange (InboundMessage)
+    et répond aussitôt, InboundProcessor l'ingère ensuite par lots via MessageIngestService
+    """
+
+    @staticmethod
+    def is_enabled():
+        return get_inbound_config('ENABLED', False)
+
+    @staticmethod
+    def parse(payload):
+        """Champs utiles d'une notification Orange de SMS entrant (MO - Mobile Originated)"""
+        sms_data = payload.get('inboundSMSMessageNotification', {}).get('inboundSMSMessage', {})
+        return {
+            'sender_phone': sms_data.get('senderAddress', '').replace('tel:+', '+').replace('tel:', ''),
+            'recipient_phone': sms_data.get('destinationAddress', '').replace('tel:+', '+').replace('tel:', ''),
+            'message': sms_data.get('message', ''),
+            'message_id': sms_data.get('messageId', '') or '',
+        }
+
+    @staticmethod
+    def enqueue(payload, fields):
+        """
+        Enregistre une notification validée avant de répondre à Orange
+        Retourne None si ce messageId a déjà été reçu (webhook rejoué)
+        """
+        with transaction.atomic():
+            if not claim('inbound', fields['message_id']):
+                return None
+            inbound = InboundMessage.objects.create(payload=payload, **fields)
+        metrics.incr('sms.inbound.received')
+        return inbound
+
+    @staticmethod
+    def claim_batch(limit):
+        """
+        Réserve jusqu'à `limit` notifications en attente (SELECT ... FOR UPDATE SKIP LOCKED)
+        Les notifications restées 'processing' trop longtemps (processeur arrêté) sont reprises
+        """
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=get_inbound_config('CLAIM_TIMEOUT', 300))
+        ready = Q(status='pending') & (Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+
+        with transaction.atomic():
+            ids = list(
+                InboundMessage.objects.select_for_update(skip_locked=True)
+                .filter(ready | Q(status='processing', claimed_at__lt=stale_before))
+                .order_by('id')
+                .values_list('id', flat=True)[:limit]
+            )
+            if not ids:
+                return []
+            InboundMessage.objects.filter(id__in=ids).update(status='processing', claimed_at=timezone.now())
+
+        return list(InboundMessage.objects.filter(id__in=ids).order_by('id'))
+
+    @staticmethod
+    def process_batch(inbound_messages):
+        """Ingère un lot réservé puis notifie chaque utilisateur une seule fois, retourne les messages créés"""
+        if not inbound_messages:
+            return []
+
+        started = time.perf_counter()
+        try:
+            created = InboundService._ingest(inbound_messages)
+        except Exception as e:
+            if len(inbound_messages) == 1:
+                InboundService._record_failure(inbound_messages[0], e)
+                return []
+            # Lot refusé en bloc: reprise une par une pour isoler la notification fautive
+            logger.warning(f"Lot entrant en erreur ({e}), reprise message par message")
+            created = []
+            for inbound in inbound_messages:
+                try:
+                    created.extend(InboundService._ingest([inbound]))
+                except Exception as row_error:
+                    InboundService._record_failure(inbound, row_error)
+
+        metrics.observe('sms.inbound.batch', time.perf_counter() - started)
+        metrics.incr('sms.inbound.ingested', len(created))
+        InboundService.notify(created)
+        return created
+
+    @staticmethod
+    def _ingest(inbound_messages):
+        """Crée les messages d'un lot et supprime leurs notifications dans la même transaction"""
+        with transaction.atomic():
+            # Le destinataire est l'utilisateur de la plateforme, l'expéditeur son contact
+            users = {phone: resolve_user_id(phone) for phone in {inbound.recipient_phone for inbound in inbound_messages}}
+            accepted = [inbound for inbound in inbound_messages if users[inbound.recipient_phone] is not None]
+            rejected = [inbound.id for inbound in inbound_messages if users[inbound.recipient_phone] is None]
+
+            conversations = MessageIngestService.get_or_create_conversations(
+                (users[inbound.recipient_phone], inbound.sender_phone) for inbound in accepted
+            )
+            messages = [
+                SMSMessage(
+                    conversation=conversations[(users[inbound.recipient_phone], inbound.sender_phone)],
+                    sender_phone=inbound.sender_phone,
+                    recipient_phone=inbound.recipient_phone,
+                    message=inbound.message,
+                    is_sent=False,
+                    is_received=True,
+                    is_read=False,
+                    message_id=inbound.message_id or None
+                )
+                for inbound in accepted
+            ]
+            created = MessageIngestService.ingest(messages, status='delivered')['messages']
+
+            if rejected:
+                logger.warning(f"{len(rejected)} SMS entrant(s) sans utilisateur pour le numero destinataire")
+                metrics.incr('sms.inbound.rejected', len(rejected))
+                InboundMessage.objects.filter(id__in=rejected).update(
+                    status='rejected', claimed_at=None, error_message="Aucun utilisateur pour ce numéro"
+                )
+            InboundMessage.objects.filter(id__in=[inbound.id for inbound in accepted]).delete()
+        return created
+
+    @staticmethod
+    def _record_failure(inbound, error):
+        """Reprogramme la notification (délai croissant), ou l'écarte après MAX_ATTEMPTS essais"""
+        attempts = inbound.attempts + 1
+        failed = attempts >= get_inbound_config('MAX_ATTEMPTS', 5)
+        logger.error(f"Erreur ingestion SMS entrant {inbound.id} (essai {attempts}): {error}")
+        if failed:
+            metrics.incr('sms.inbound.failed')
+        InboundMessage.objects.filter(id=inbound.id).update(
+            status='failed' if failed else 'pending',
+            attempts=attempts,
+            claimed_at=None,
+            next_attempt_at=timezone.now() + timedelta(seconds=get_inbound_config('RETRY_DELAY', 30) * attempts),
+            error_message=str(error)
+        )
+
+    @staticmethod
+    def notify(messages):
+        """Une notification temps réel par utilisateur pour tout le lot, au lieu d'une par message"""
+        by_user = defaultdict(list)
+        for sms in messages:
+            by_user[sms.conversation.user_id].append({
+                'conversation_id': sms.conversation_id,
+                'message': {
+                    'id': sms.id,
+                    'sender_phone': sms.sender_phone,
+                    'recipient_phone': sms.recipient_phone,
+                    'message': sms.message,
+                    'sent_at': sms.sent_at.isoformat(),
+                    'is_sent_by_user': False,
+                    'is_received': True,
+                    'is_read': False
+                },
+            })
+
+        for user_id, notifications in by_user.items():
+            mark_write(user_id)  # Le client notifié relira ses conversations sur le primaire
+            RealtimeNotificationService.notify_new_messages(user_id, notifications)
+
+    @staticmethod
+    def backlog():
+        """Notifications en attente et âge (secondes) de la plus ancienne"""
+        pending = InboundMessage.objects.filter(status__in=['pending', 'processing'])
+        oldest = pending.order_by('id').values_list('received_at', flat=True).first()
+        age = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+        return pending.count(), age
+
+
+# Statut de MessageStatus pour chaque deliveryStatus des accusés de réception Orange
+RECEIPT_STATUSES = {
+    'DeliveredToTerminal': 'delivered',
+    'DeliveredToNetwork': 'sent',  # Remis au réseau: un DeliveryImpossible peut encore suivre
+    'DeliveryImpossible': 'failed',
+    'DeliveryUncertain': 'sent',
+    'MessageWaiting': 'sent',
+    'DeliveryNotificationNotSupported': 'sent',
+}
+
+# Ordre des statuts: un accusé n'applique que des transitions vers un rang supérieur
+# (un "sent" arrivé en retard n'écrase jamais "delivered", le premier statut final l'emporte)
+# L'envoi accepté par Orange reste 'sent': 'delivered' et 'failed' sont au-dessus et s'appliquent toujours
+STATUS_RANKS = {
+    'queued': 0,
+    'sending': 1,
+    'sent': 2,
+    'delivered': 3,
+    'failed': 3,
+    'dead': 3,
+    'read': 4,
+}
+
+
+class DeliveryReceiptService:
+    """
+    Accusés de réception Orange appliqués par lots: une requête IN pour tous les messages du lot,
+    transitions monotones, bulk_update et une seule notification par utilisateur
+    """
+
+    @staticmethod
+    def map_status(delivery_status):
+        """Statut MessageStatus correspondant à un deliveryStatus Orange, None s'il est inconnu"""
+        status = RECEIPT_STATUSES.get(delivery_status) or (delivery_status or '').lower()
+        return status if status in STATUS_RANKS else None
+
+    @staticmethod
+    def enqueue(message_id, delivery_status):
+        """Met l'accusé en file (une insertion), retourne None s'il a déjà été reçu"""
+        with transaction.atomic():
+            if not claim('receipt', message_id, delivery_status):
+                return None
+            receipt = DeliveryReceipt.objects.create(message_id=message_id, delivery_status=delivery_status)
+        metrics.incr('sms.receipts.received')
+        return receipt
+
+    @staticmethod
+    def apply(receipts):
+        """
+        Applique des accusés [(message_id Orange, deliveryStatus)]
+        Retourne (mises à jour {user_id: [{'message_id', 'status'}]}, message_id Orange inconnus)
+        """
+        wanted = {}
+        for message_id, delivery_status in receipts:
+            status = DeliveryReceiptService.map_status(delivery_status)
+            if status is None:
+                logger.warning(f"Statut de livraison inconnu pour {message_id}: {delivery_status}")
+                metrics.incr('sms.receipts.ignored')
+                continue
+            # Plusieurs accusés du même message dans le lot: seul le plus avancé compte
+            if message_id not in wanted or STATUS_RANKS[status] > STATUS_RANKS[wanted[message_id]]:
+                wanted[message_id] = status
+        if not wanted:
+            return {}, []
+
+        updates = defaultdict(list)
+        deltas = defaultdict(int)
+        now = timezone.now()
+        with transaction.atomic():
+            # Verrou dans l'ordre des id: deux lots concurrents ne peuvent ni s'interbloquer
+            # ni faire reculer un statut entre la lecture et l'écriture
+            statuses = list(
+                MessageStatus.objects.select_for_update(of=('self',))
+                .filter(message__message_id__in=list(wanted))
+                .annotate(
+                    provider_id=F('message__message_id'),
+                    user_id=F('message__conversation__user_id'),
+                    is_received=F('message__is_received')
+                )
+                .order_by('id')
+            )
+            found = {message_status.provider_id for message_status in statuses}
+
+            # Anciens messages sans MessageStatus: créé à la volée
+            created = []
+            missing = [message_id for message_id in wanted if message_id not in found]
+            if missing:
+                for sms in SMSMessage.objects.filter(message_id__in=missing).annotate(user_id=F('conversation__user_id')):
+                    found.add(sms.message_id)
+                    message_status = MessageStatus(message=sms, status=wanted[sms.message_id], message_sent_at=sms.sent_at)
+                    message_status.provider_id, message_status.user_id = sms.message_id, sms.user_id
+                    message_status.is_received = sms.is_received
+                    created.append(message_status)
+
+            changed = []
+            for message_status in statuses + created:
+                status = wanted[message_status.provider_id]
+                previous = message_status.counted_status
+                if message_status.pk and STATUS_RANKS.get(previous, 0) >= STATUS_RANKS[status]:
+                    metrics.incr('sms.receipts.stale')
+                    continue
+                message_status.mark_counted(status)  # Compté ci-dessous (deltas)
+                message_status.updated_at = now
+                if message_status.pk:
+                    changed.append(message_status)
+                if not message_status.is_received:
+                    for key, delta in MessageStatsService.transition_deltas(
+                        message_status.user_id, timezone.localdate(message_status.message_sent_at), previous, status
+                    ).items():
+                        deltas[key] += delta
+                updates[message_status.user_id].append({'message_id': message_status.message_id, 'status': status})
+
+            MessageStatus.objects.bulk_update(changed, ['status', 'updated_at'])
+            MessageStatus.objects.bulk_create(created)
+            MessageStatsService.apply(deltas)
+
+        metrics.incr('sms.receipts.applied', len(changed) + len(created))
+        return dict(updates), [message_id for message_id in wanted if message_id not in found]
+
+    @staticmethod
+    def park(receipts):
+        """
+        Garde pendant PENDING_RECEIPT_TTL les accusés [(message_id, deliveryStatus)] de messages inconnus:
+        Orange peut répondre au webhook avant que l'envoi ait enregistré le message_id
+        """
+        if not receipts:
+            return
+        expires_at = timezone.now() + timedelta(seconds=get_inbound_config('PENDING_RECEIPT_TTL', 3600))
+        PendingReceipt.objects.bulk_create([
+            PendingReceipt(message_id=message_id, delivery_status=delivery_status, expires_at=expires_at)
+            for message_id, delivery_status in receipts
+        ])
+        logger.info(f"{len(receipts)} accuse(s) de reception en attente de leur message")
+        metrics.incr('sms.receipts.parked', len(receipts))
+
+    @staticmethod
+    def apply_pending(message_id):
+        """
+        Applique les accusés en attente pour ce message_id, tout juste enregistré (aucun dans le cas courant)
+        Sans notification: l'appelant (envoi, dispatcher) notifie déjà le statut du message
+        """
+        if not message_id:
+            return {}
+        pending = list(PendingReceipt.objects.filter(message_id=message_id).values_list('id', 'delivery_status'))
+        if not pending:
+            return {}
+
+        with transaction.atomic():
+            updates, _ = DeliveryReceiptService.apply([(message_id, delivery_status) for _, delivery_status in pending])
+            PendingReceipt.objects.filter(id__in=[receipt_id for receipt_id, _ in pending]).delete()
+        metrics.incr('sms.receipts.recovered', len(pending))
+        return updates
+
+    @staticmethod
+    def sweep(batch_size=1000):
+        """
+        Réapplique les accusés en attente dont le message est maintenant connu (message_id enregistré dans
+        une transaction encore ouverte au moment du contrôle) et supprime ceux expirés
+        Retourne (appliqués, perdus); les perdus sont comptés dans sms.receipts.lost
+        """
+        recovered = lost = 0
+        last_id = 0
+        while True:
+            rows = list(
+                PendingReceipt.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'message_id', 'delivery_status', 'expires_at')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            now = timezone.now()
+            with transaction.atomic():
+                updates, unknown = DeliveryReceiptService.apply([(message_id, status) for _, message_id, status, _ in rows])
+                unknown = set(unknown)
+                applied = [row[0] for row in rows if row[1] not in unknown]
+                expired = [row[0] for row in rows if row[1] in unknown and row[3] <= now]
+                PendingReceipt.objects.filter(id__in=applied + expired).delete()
+            DeliveryReceiptService.notify(updates)
+            recovered += len(applied)
+            lost += len(expired)
+
+        if recovered:
+            metrics.incr('sms.receipts.recovered', recovered)
+        if lost:
+            logger.warning(f"{lost} accuse(s) de reception perdu(s): message jamais enregistre avant expiration")
+            metrics.incr('sms.receipts.lost', lost)
+        return recovered, lost
+
+    @staticmethod
+    def notify(updates):
+        """Une notification de statuts par utilisateur"""
+        for user_id, user_updates in updates.items():
+            mark_write(user_id)  # Le client notifié relira les statuts sur le primaire
+            RealtimeNotificationService.notify_message_status_updates(user_id, user_updates)
+
+    @staticmethod
+    def claim_batch(limit):
+        """Réserve jusqu'à `limit` accusés en attente (SKIP LOCKED), reprend ceux d'un processeur arrêté"""
+        stale_before = timezone.now() - timedelta(seconds=get_inbound_config('CLAIM_TIMEOUT', 300))
+        with transaction.atomic():
+            ids = list(
+                DeliveryReceipt.objects.select_for_update(skip_locked=True)
+                .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale_before))
+                .order_by('id')
+                .values_list('id', flat=True)[:limit]
+            )
+            if not ids:
+                return []
+            DeliveryReceipt.objects.filter(id__in=ids).update(claimed_at=timezone.now())
+        return list(DeliveryReceipt.objects.filter(id__in=ids).order_by('id'))
+
+    @staticmethod
+    def process_batch(receipts):
+        """Applique un lot réservé et le retire de la file dans la même transaction"""
+        if not receipts:
+            return {}
+        started = time.perf_counter()
+        with transaction.atomic():
+            updates, unknown = DeliveryReceiptService.apply(
+                [(receipt.message_id, receipt.delivery_status) for receipt in receipts]
+            )
+            unknown = set(unknown)
+            DeliveryReceiptService.park(
+                [(receipt.message_id, receipt.delivery_status) for receipt in receipts if receipt.message_id in unknown]
+            )
+            DeliveryReceipt.objects.filter(id__in=[receipt.id for receipt in receipts]).delete()
+        metrics.observe('sms.receipts.batch', time.perf_counter() - started)
+        DeliveryReceiptService.notify(updates)
+        return updates
+
+
+class InboundProcessor:
+    """
+    Boucle de traitement de la file des SMS entrants
+    Plusieurs processus peuvent tourner côte à côte: les lots sont réservés avec SKIP LOCKED
+    """
+
+    def __init__(self, batch_size=None, poll_interval=None):
+        self.batch_size = batch_size or get_inbound_config('BATCH_SIZE', 500)
+        self.poll_interval = poll_interval or get_inbound_config('POLL_INTERVAL', 0.5)
+        self.report_interval = get_inbound_config('REPORT_INTERVAL', 60)
+        self.sweep_interval = get_inbound_config('SWEEP_INTERVAL', 60)
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, once=False):
+        """Vide la file en continu; avec once=True, s'arrête quand elle est vide"""
+        logger.info(f"Processeur SMS entrants demarre (lots de {self.batch_size})")
+        reported_at = swept_at = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    processed = self.process_batch()
+                except Exception as e:
+                    logger.error(f"Erreur processeur SMS entrants: {e}")
+                    processed = 0
+
+                if time.monotonic() - swept_at >= self.sweep_interval:
+                    try:
+                        DeliveryReceiptService.sweep()
+                    except Exception as e:
+                        logger.error(f"Erreur purge des accuses en attente: {e}")
+                    swept_at = time.monotonic()
+
+                if time.monotonic() - reported_at >= self.report_interval:
+                    self.report()
+                    reported_at = time.monotonic()
+
+                if not processed:
+                    if once:
+                        break
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self.report()
+            connections.close_all()
+        logger.info("Processeur SMS entrants arrete")
+
+    def process_batch(self):
+        """Réserve et traite un lot de SMS entrants et un lot d'accusés, retourne le nombre de notifications traitées"""
+        batch = InboundService.claim_batch(self.batch_size)
+        InboundService.process_batch(batch)
+        receipts = DeliveryReceiptService.claim_batch(self.batch_size)
+        DeliveryReceiptService.process_batch(receipts)
+        return len(batch) + len(receipts)
+
+    def report(self):
+        """Débit soutenu (messages/s sur la dernière minute), file en attente et retard"""
+        pending, age = InboundService.backlog()
+        rate = metrics.rate('sms.inbound.ingested')
+        receipts = DeliveryReceipt.objects.count()
+        parked = PendingReceipt.objects.count()
+        receipt_rate = metrics.rate('sms.receipts.applied')
+        metrics.set_gauge('sms.inbound.backlog', pending)
+        metrics.set_gauge('sms.inbound.lag_seconds', round(age, 1))
+        metrics.set_gauge('sms.receipts.backlog', receipts)
+        metrics.set_gauge('sms.receipts.pending', parked)
+        logger.info(
+            f"SMS entrants: {rate:.1f} msg/s, {pending} en attente, plus ancien {age:.1f}s - "
+            f"accuses: {receipt_rate:.1f}/s, {receipts} en attente, {parked} sans message, "
+            f"{metrics.get('sms.receipts.lost')} perdu(s)"
+        )
+        return {
+            'rate': rate, 'pending': pending, 'lag_seconds': age,
+            'receipt_rate': receipt_rate, 'receipts': receipts, 'parked': parked,
+        }
+
+
+class CampaignService:
+    """Création et diffusion des campagnes d'envoi en masse"""
+
+    @staticmethod
+    def collect_recipients(user, recipients=None, contact_ids=None, all_contacts=False):
+        """
+        Construit la liste des destinataires normalisés et dédupliqués
+        Retourne le résultat de OrangeOAuth.normalize_phone_numbers (valid, rejected, duplicates, total)
+        """
+        raw_numbers = list(recipients or [])
+
+        contacts = Contact.objects.filter(user=user)
+        if all_contacts:
+            raw_numbers.extend(contacts.values_list('phone_number', flat=True))
+        elif contact_ids:
+            raw_numbers.extend(contacts.filter(id__in=contact_ids).values_list('phone_number', flat=True))
+
+        return OrangeOAuth.normalize_phone_numbers(raw_numbers)
+
+    @staticmethod
+    def create_campaign(user, message, phone_numbers, name=''):
+        """Persiste la campagne et ses destinataires en une seule transaction"""
+        batch_size = get_campaign_config('BATCH_SIZE', 1000)
+
+        with transaction.atomic():
+            campaign = Campaign.objects.create(
+                user=user,
+                name=name,
+                message=message,
+                total_recipients=len(phone_numbers)
+            )
+            CampaignRecipient.objects.bulk_create(
+                [CampaignRecipient(campaign=campaign, phone_number=phone) for phone in phone_numbers],
+                batch_size=batch_size
+            )
+            # Lancer la diffusion uniquement une fois les lignes visibles pour les workers
+            # Sans thread dans le process web, la commande run_campaigns la prend en charge
+            if get_campaign_config('BACKGROUND_THREAD', True):
+                transaction.on_commit(lambda: CampaignService.start(campaign.id))
+
+        logger.info(f"Campagne {campaign.id} creee avec {len(phone_numbers)} destinataires")
+        return campaign
+
+    @staticmethod
+    def start(campaign_id):
+        """Démarre la diffusion d'une campagne dans un thread d'arrière-plan"""
+        thread = threading.Thread(
+            target=CampaignService.run,
+            args=(campaign_id,),
+            name=f"campaign-{campaign_id}",
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    @staticmethod
+    def claim_stale():
+        """
+        Réserve les campagnes à reprendre et retourne leurs id:
+        - 'running' sans signe de vie depuis STALE_AFTER (process web redémarré pendant la diffusion)
+        - 'pending' jamais démarrées (thread perdu avant son lancement, ou BACKGROUND_THREAD désactivé)
+        """
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=get_campaign_config('STALE_AFTER', 600))
+        # Sans thread web, les campagnes en attente sont à la commande dès leur création
+        pending_cutoff = cutoff if get_campaign_config('BACKGROUND_THREAD', True) else now
+        stale = (
+            Q(status='running') & (Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff))
+        ) | Q(status='pending', heartbeat_at__isnull=True, created_at__lte=pending_cutoff)
+
+        claimed = []
+        for campaign_id in Campaign.objects.filter(stale).order_by('id').values_list('id', flat=True):
+            # Mise à jour conditionnelle: une seule commande reprend chaque campagne
+            if Campaign.objects.filter(stale, id=campaign_id).update(status='running', heartbeat_at=now):
+                claimed.append(campaign_id)
+        return claimed
+
+    @staticmethod
+    def run(campaign_id):
+        """
+        Diffuse les destinataires en attente avec un pool de workers
+        Reprise possible: seuls les destinataires encore 'pending' sont traités
+        """
+        max_workers = get_campaign_config('MAX_WORKERS', 8)
+        batch_size = get_campaign_config('BATCH_SIZE', 1000)
+        heartbeat = threading.Event()
+
+        try:
+            campaign = Campaign.objects.select_related('user').get(id=campaign_id)
+            now = timezone.now()
+            Campaign.objects.filter(id=campaign_id).update(status='running', heartbeat_at=now)
+            Campaign.objects.filter(id=campaign_id, started_at__isnull=True).update(started_at=now)
+            threading.Thread(
+                target=CampaignService._heartbeat, args=(campaign_id, heartbeat),
+                name=f"campaign-{campaign_id}-heartbeat", daemon=True
+            ).start()
+            logger.info(f"Diffusion campagne {campaign_id} - {campaign.total_recipients} destinataires")
+
+            pending = Queue(maxsize=batch_size)
+            workers = [
+                threading.Thread(
+                    target=CampaignService._worker,
+                    args=(campaign, pending),
+                    name=f"campaign-{campaign_id}-{i}",
+                    daemon=True
+                )
+                for i in range(max_workers)
+            ]
+            for worker in workers:
+                worker.start()
+
+            try:
+                last_id = 0
+                while True:
+                    # Parcours par clé pour ne pas charger toute la campagne en mémoire
+                    batch = list(
+                        CampaignRecipient.objects.filter(
+                            campaign_id=campaign_id, status='pending', id__gt=last_id
+                        ).order_by('id')[:batch_size]
+                    )
+                    if not batch:
+                        break
+                    last_id = batch[-1].id
+                    CampaignService.prepare_messages(campaign, batch)
+                    for recipient in batch:
+                        pending.put(recipient)
+            finally:
+                for _ in workers:
+                    pending.put(None)
+                for worker in workers:
+                    worker.join()
+
+            # Compteurs recalculés: une diffusion interrompue a pu perdre sa dernière progression
+            counts = CampaignRecipient.objects.filter(campaign_id=campaign_id).aggregate(
+                sent=Count('id', filter=Q(status='sent')),
+                failed=Count('id', filter=Q(status='failed'))
+            )
+            Campaign.objects.filter(id=campaign_id).update(
+                status='completed', completed_at=timezone.now(),
+                sent_count=counts['sent'], failed_count=counts['failed']
+            )
+            logger.info(f"Campagne {campaign_id} terminee")
+
+        except Exception as e:
+            logger.error(f"Erreur diffusion campagne {campaign_id}: {e}")
+            Campaign.objects.filter(id=campaign_id).update(status='failed', completed_at=timezone.now())
+        finally:
+            heartbeat.set()
+            connections.close_all()
+
+    @staticmethod
+    def _heartbeat(campaign_id, stop):
+        """Signe de vie périodique tant que la diffusion tourne dans ce process"""
+        try:
+            while not stop.wait(get_campaign_config('HEARTBEAT_INTERVAL', 30)):
+                Campaign.objects.filter(id=campaign_id, status='running').update(heartbeat_at=timezone.now())
+        except Exception as e:
+            logger.error(f"Erreur signe de vie campagne {campaign_id}: {e}")
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def _worker(campaign, pending):
+        """Consomme la file de destinataires et publie la progression par paquets"""
+        flush_every = get_campaign_config('PROGRESS_INTERVAL', 50)
+        sent = failed = 0
+        try:
+            while True:
+                recipient = pending.get()
+                if recipient is None:
+                    break
+                if CampaignService.send_to_recipient(campaign, recipient):
+                    sent += 1
+                else:
+                    failed += 1
+                if sent + failed >= flush_every:
+                    CampaignService._add_progress(campaign.id, sent, failed)
+                    sent = failed = 0
+            CampaignService._add_progress(campaign.id, sent, failed)
+        finally:
+            # Chaque thread possède sa propre connexion à la base
+            connections.close_all()
+
+    @staticmethod
+    def _add_progress(campaign_id, sent, failed):
+        if sent or failed:
+            Campaign.objects.filter(id=campaign_id).update(
+                sent_count=F('sent_count') + sent,
+                failed_count=F('failed_count') + failed
+            )
+
+    @staticmethod
+    def prepare_messages(campaign, recipients):
+        """
+        Crée en masse les messages et statuts d'un lot de destinataires avant envoi
+        (les destinataires repris après interruption réutilisent leur message)
+        """
+        user = campaign.user
+        missing = [recipient for recipient in recipients if recipient.sms_id is None]
+        if missing:
+            conversations = MessageIngestService.get_or_create_conversations(
+                (user.id, recipient.phone_number) for recipient in missing
+            )
+            # Statut 'sending' sans claimed_at: jamais réservé par les dispatchers de l'outbox
+            result = MessageIngestService.ingest(
+                [
+                    SMSMessage(
+                        conversation=conversations[(user.id, recipient.phone_number)],
+                        sender_phone=user.telephone,
+                        recipient_phone=recipient.phone_number,
+                        message=campaign.message,
+                        is_sent=False
+                    )
+                    for recipient in missing
+                ],
+                status='sending'
+            )
+            for recipient, sms in zip(missing, result['messages']):
+                recipient.sms = sms
+            CampaignRecipient.objects.bulk_update(missing, ['sms'])
+
+        prepared = {id(recipient) for recipient in missing}
+        reused = [recipient for recipient in recipients if id(recipient) not in prepared]
+        if reused:
+            messages = SMSMessage.objects.select_related('conversation', 'status').in_bulk(
+                [recipient.sms_id for recipient in reused]
+            )
+            for recipient in reused:
+                recipient.sms = messages[recipient.sms_id]
+
+    @staticmethod
+    def send_to_recipient(campaign, recipient):
+        """Envoie le message préparé par prepare_messages à un destinataire, retourne True si envoyé"""
+        try:
+            sms = recipient.sms
+            if sms.status.status == 'sending':
+                SMSDispatchService.deliver(sms, sms.status, allow_retry=False, blocking_retries=True)
+            elif sms.status.status in ('failed', 'dead'):
+                # Campagne reprise: échec enregistré avant l'interruption, pas de nouvel envoi
+                recipient.status = 'failed'
+                recipient.error_message = sms.status.error_message
+                recipient.save(update_fields=['status', 'error_message', 'updated_at'])
+                return False
+            # Autre statut: message parti avant l'interruption, pas de second envoi
+
+            recipient.status = 'sent'
+            recipient.save(update_fields=['status', 'updated_at'])
+            return True
+
+        except Exception as e:
+            recipient.status = 'failed'
+            recipient.error_message = str(e)
+            recipient.save(update_fields=['status', 'error_message', 'updated_at'])
+            return False
+
+class ContactImportService:
+    """Import en flux de fichiers de contacts (CSV/XLSX): lecture ligne à ligne, upsert par lots"""
+
+    PHONE_HEADERS = {'phone', 'phone_number', 'telephone', 'téléphone', 'tel', 'tél', 'numero', 'numéro', 'mobile', 'number'}
+    NAME_HEADERS = {'name', 'nom', 'contact', 'contact_name', 'nom complet', 'full_name'}
+
+    @staticmethod
+    def create_import(user, uploaded_file):
+        """Copie le fichier reçu par morceaux puis lance le traitement après commit"""
+        file_format = 'xlsx' if uploaded_file.name.lower().endswith('.xlsx') else 'csv'
+        if file_format == 'xlsx' and openpyxl is None:
+            raise ImproperlyConfigured("L'import XLSX nécessite openpyxl (pip install openpyxl)")
+
+        # Le fichier d'upload temporaire disparaît avec la requête: on garde notre propre copie
+        with tempfile.NamedTemporaryFile(prefix='contacts-', suffix=f'.{file_format}', delete=False) as copy:
+            for chunk in uploaded_file.chunks():
+                copy.write(chunk)
+
+        try:
+            with transaction.atomic():
+                contact_import = ContactImport.objects.create(
+                    user=user,
+                    file_name=uploaded_file.name[:255],
+                    file_format=file_format
+                )
+                transaction.on_commit(lambda: ContactImportService.start(contact_import.id, copy.name))
+        except Exception:
+            os.remove(copy.name)
+            raise
+
+        logger.info(f"Import de contacts {contact_import.id} recu ({uploaded_file.size} octets)")
+        return contact_import
+
+    @staticmethod
+    def start(import_id, path):
+        """Démarre l'import dans un thread d'arrière-plan"""
+        thread = threading.Thread(
+            target=ContactImportService.run,
+            args=(import_id, path),
+            name=f"contact-import-{import_id}",
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    @staticmethod
+    def run(import_id, path):
+        """Lit le fichier ligne à ligne et enregistre les contacts par lots de CHUNK_SIZE"""
+        chunk_size = get_import_config('CHUNK_SIZE', 5000)
+        max_rejected = get_import_config('MAX_REJECTED_ROWS', 1000)
+
+        try:
+            contact_import = ContactImport.objects.select_related('user').get(id=import_id)
+            rows, total_rows = ContactImportService.read_rows(path, contact_import.file_format)
+            ContactImport.objects.filter(id=import_id).update(
+                status='running', started_at=timezone.now(), total_rows=total_rows
+            )
+
+            counters = {'processed': 0, 'imported': 0, 'rejected': 0, 'duplicates': 0}
+            rejected_rows = []
+            chunk = {}  # numéro normalisé -> nom (le dernier l'emporte dans un lot)
+            seen = set()  # numéros déjà lus dans ce fichier, tous lots confondus
+
+            for row_number, phone, name in ContactImportService.parse_rows(rows):
+                counters['processed'] += 1
+                normalized, reason = normalize_phone(phone)
+                if reason:
+                    counters['rejected'] += 1
+                    if len(rejected_rows) < max_rejected:
+                        rejected_rows.append({'row': row_number, 'value': phone, 'reason': reason})
+                elif normalized in seen:
+                    # Doublon, dans ce lot ou un précédent: un nom non vide remplace le précédent
+                    counters['duplicates'] += 1
+                    if name:
+                        chunk[normalized] = name
+                else:
+                    seen.add(normalized)
+                    chunk[normalized] = name
+
+                if counters['processed'] % chunk_size == 0:
+                    ContactImportService.upsert_contacts(contact_import.user, chunk)
+                    counters['imported'] = len(seen)
+                    chunk = {}
+                    ContactImportService._save_progress(import_id, counters, rejected_rows)
+
+            ContactImportService.upsert_contacts(contact_import.user, chunk)
+            counters['imported'] = len(seen)
+            ContactImportService._save_progress(import_id, counters, rejected_rows)
+            ContactImport.objects.filter(id=import_id).update(status='completed', completed_at=timezone.now())
+            logger.info(
+                f"Import de contacts {import_id} termine: {counters['imported']} enregistres, "
+                f"{counters['rejected']} rejetes, {counters['duplicates']} doublons"
+            )
+
+        except Exception as e:
+            logger.error(f"Erreur import de contacts {import_id}: {e}")
+            ContactImport.objects.filter(id=import_id).update(
+                status='failed', error_message=str(e), completed_at=timezone.now()
+            )
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            connections.close_all()
+
+    @staticmethod
+    def read_rows(path, file_format):
+        """Retourne (itérateur de lignes, estimation du nombre de lignes) sans charger le fichier"""
+        if file_format == 'xlsx':
+            workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+            sheet = workbook.worksheets[0]
+
+            def xlsx_rows():
+                try:
+                    yield from sheet.iter_rows(values_only=True)
+                finally:
+                    workbook.close()
+
+            return xlsx_rows(), sheet.max_row or 0
+
+        # Comptage des lignes par blocs binaires: linéaire et sans décodage
+        total_rows = 0
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                total_rows += block.count(b'\n')
+
+        def csv_rows():
+            with open(path, newline='', encoding='utf-8-sig', errors='replace') as f:
+                sample = f.read(64 * 1024)
+                f.seek(0)
+                try:
+                    dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+                except csv.Error:
+                    dialect = csv.excel
+                yield from csv.reader(f, dialect)
+
+        return csv_rows(), total_rows
+
+    @staticmethod
+    def parse_rows(rows):
+        """
+        Produit (numéro de ligne, téléphone, nom) pour chaque ligne non vide
+        Une première ligne non vide d'en-têtes reconnue choisit les colonnes, sinon: téléphone puis nom
+        """
+        phone_col, name_col = 0, 1
+        first_row = True
+        for row_number, row in enumerate(rows, start=1):
+            cells = [ContactImportService._cell_text(value) for value in row]
+            if not any(cells):
+                continue
+
+            if first_row:
+                first_row = False
+                headers = [cell.lower() for cell in cells]
+                if ContactImportService.PHONE_HEADERS.intersection(headers):
+                    phone_col = next(i for i, h in enumerate(headers) if h in ContactImportService.PHONE_HEADERS)
+                    name_col = next((i for i, h in enumerate(headers) if h in ContactImportService.NAME_HEADERS), None)
+                    continue
+
+            phone = cells[phone_col] if phone_col < len(cells) else ''
+            name = cells[name_col] if name_col is not None and name_col < len(cells) else ''
+            yield row_number, phone, name[:100]
+
+    @staticmethod
+    def upsert_contacts(user, chunk):
+        """
+        INSERT ... ON CONFLICT (user, phone_number) DO UPDATE en un lot
+        Un nom vide dans le fichier ne remplace pas le nom déjà connu
+        """
+        if not chunk:
+            return 0
+
+        named = [Contact(user=user, phone_number=phone, name=name) for phone, name in chunk.items() if name]
+        unnamed = [Contact(user=user, phone_number=phone) for phone, name in chunk.items() if not name]
+        with transaction.atomic():
+            if named:
+                Contact.objects.bulk_create(
+                    named, update_conflicts=True,
+                    unique_fields=['user', 'phone_number'], update_fields=['name', 'updated_at']
+                )
+            if unnamed:
+                Contact.objects.bulk_create(
+                    unnamed, update_conflicts=True,
+                    unique_fields=['user', 'phone_number'], update_fields=['updated_at']
+                )
+        return len(chunk)
+
+    @staticmethod
+    def _save_progress(import_id, counters, rejected_rows):
+        ContactImport.objects.filter(id=import_id).update(
+            processed_rows=counters['processed'],
+            imported_count=counters['imported'],
+            rejected_count=counters['rejected'],
+            duplicate_count=counters['duplicates'],
+            rejected_rows=rejected_rows
+        )
+
+    @staticmethod
+    def _cell_text(value):
+        """Texte d'une cellule CSV/XLSX (les numéros saisis comme nombres perdent leur '.0')"""
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        # BOM éventuel en tête de cellule (fichier concaténé, export Excel)
+        return str(value).replace('\ufeff', '').strip()
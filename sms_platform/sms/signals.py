@@ -0,0 +1,45 @@
+# sms/signals.py - Invalidation du cache des correspondances (sms/resolvers.py)
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from account.models import CustomUser
+from .models import Conversation
+from .resolvers import conversation_key, conversations, phone_users
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_telephone(sender, instance, **kwargs):
+    # Numéro au chargement, pour invalider l'ancien après un changement (ProfileView)
+    # __dict__: ne déclenche pas de requête si le champ est différé
+    instance._resolver_telephone = instance.__dict__.get('telephone')
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_user_phone(sender, instance, **kwargs):
+    # Nouveau numéro: l'absence d'utilisateur a pu être mise en cache
+    # Invalidation immédiate, puis après validation (une lecture concurrente a pu remettre l'ancienne valeur)
+    phones = {getattr(instance, '_resolver_telephone', None), instance.__dict__.get('telephone')} - {None}
+    for phone in phones:
+        phone_users.delete(phone)
+    transaction.on_commit(lambda: [phone_users.delete(phone) for phone in phones])
+    instance._resolver_telephone = instance.__dict__.get('telephone')
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    if instance.__dict__.get('telephone'):
+        phone_users.delete(instance.telephone)
+
+
+@receiver(post_save, sender=Conversation)
+def cache_created_conversation(sender, instance, created, **kwargs):
+    if created:
+        key = conversation_key(instance.user_id, instance.contact_phone)
+        transaction.on_commit(lambda: conversations.set(key, instance.id))
+
+
+@receiver(post_delete, sender=Conversation)
+def invalidate_deleted_conversation(sender, instance, **kwargs):
+    conversations.delete(conversation_key(instance.user_id, instance.contact_phone))
@@ -1,3 +1,1296 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.postgres.search import SearchQuery
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Q
+from django.core.cache import cache
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from account.circuitbreaker import CircuitOpenError
+from account.models import CustomUser
+from account.ratelimit import OrangeRateLimiter, RateLimitTimeout
+from account.services import OrangeAPIError
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from sms_platform import channel_layer
+from sms_platform.channel_layer import PostgresChannelLayer
+from sms_platform.dbrouter import (
+    ReplicaLagMonitor, ReplicaReadMixin, ReplicaRouter, ReplicaStickinessMiddleware, get_replica_config, lag_monitor,
+    mark_write, select_read_database
+)
+from .models import (
+    Campaign, CampaignRecipient, Contact, ContactImport, Conversation, DailyMessageStats, InboundMessage, MessageStatus,
+    PendingReceipt, SMSMessage, WebhookEvent
+)
+from .dedup import claim, recent_keys, seen_recently
+from .pagination import MessageKeysetPagination
+from .partitioning import PartitionArchiver, create_partition, list_partitions, partition_name
+from .resolvers import MISSING, TwoTierCache
+from .services import (
+    AsyncOutboxDispatcher, CampaignService, ContactImportService, ConversationService, DeliveryReceiptService,
+    InboundService, MessageIngestService, MessageStatsService, OutboxService, RetryPolicy, SMSDispatchService
+)
+
+
+class SMSMessageIndexPlanTests(TestCase):
+    """Les requêtes chaudes sur SMSMessage doivent utiliser les index de la migration 0007"""
+
+    USER_PHONE = '+221771234567'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='plans', email='plans@example.com', telephone=cls.USER_PHONE)
+        other = CustomUser.objects.create(username='autre', email='autre@example.com', telephone='+221779999999')
+
+        messages = []
+        for owner in (cls.user, other):
+            for c in range(40):
+                conversation = Conversation.objects.create(user=owner, contact_phone=f'+2217{owner.id}{c:07d}')
+                for m in range(50):
+                    incoming = m % 2 == 0
+                    messages.append(SMSMessage(
+                        conversation=conversation,
+                        sender_phone=conversation.contact_phone if incoming else owner.telephone,
+                        recipient_phone=owner.telephone if incoming else conversation.contact_phone,
+                        message=f'Message {m}',
+                        is_read=m < 46,
+                        message_id=f'orange-{conversation.id}-{m}',
+                    ))
+        SMSMessage.objects.bulk_create(messages, batch_size=500)
+        cls.conversation = Conversation.objects.filter(user=cls.user).first()
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Sur un jeu de test réduit le planificateur préfère parfois un parcours séquentiel
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        for index_name in index_names:
+            self.assertIn(index_name, plan, f"Plan sans {index_name}:\n{plan}")
+
+    def test_delivery_receipt_lookup_uses_message_id_index(self):
+        self.assertUsesIndex(
+            SMSMessage.objects.filter(message_id=f'orange-{self.conversation.id}-3'),
+            'sms_msg_message_id_uniq'
+        )
+
+    def test_mark_as_read_uses_unread_index(self):
+        self.assertUsesIndex(
+            self.conversation.messages.filter(recipient_phone=self.USER_PHONE, is_read=False),
+            'sms_msg_unread_idx'
+        )
+
+    def test_conversation_paging_uses_conversation_index(self):
+        self.assertUsesIndex(
+            SMSMessage.objects.filter(conversation=self.conversation).order_by('sent_at', 'id'),
+            'sms_msg_conv_sent_idx'
+        )
+
+    def test_history_uses_sender_and_recipient_indexes(self):
+        self.assertUsesIndex(
+            SMSMessage.objects.filter(
+                Q(sender_phone=self.USER_PHONE) | Q(recipient_phone=self.USER_PHONE)
+            ).order_by('-sent_at'),
+            'sms_msg_sender_sent_idx',
+            'sms_msg_recipient_sent_idx'
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', "Index GIN plein texte: PostgreSQL uniquement")
+    def test_message_search_uses_full_text_index(self):
+        self.assertUsesIndex(
+            SMSMessage.objects.filter(search_vector=SearchQuery('message', config='french')),
+            'sms_msg_search_idx'
+        )
+
+
+class PartitionArchiverTests(TestCase):
+    """Partitions mensuelles: création, archivage puis restauration (détachée ou depuis l'export)"""
+
+    MONTH = datetime(2099, 1, 1, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='archives-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.archiver = PartitionArchiver(directory=self.directory, file_format='ndjson')
+        self.name = partition_name('sms_smsmessage', self.MONTH)
+
+    def write_manifest(self, **manifest):
+        with open(self.archiver.manifest_path(self.name), 'w') as handle:
+            json.dump({'table': 'sms_smsmessage', 'partition': self.name, 'file': None, 'format': 'ndjson', **manifest}, handle)
+
+    def test_manifest_bounds_are_validated_before_touching_the_database(self):
+        for bounds in ({'from': "2099-01-01') TO ('2099-02-01'); DROP TABLE sms_contact; --", 'to': '2099-02-01'},
+                       {'from': '2099-01-01', 'to': 'demain'}):
+            self.write_manifest(**bounds)
+            with self.assertNumQueries(0), self.assertRaisesMessage(RuntimeError, 'bornes invalides'):
+                self.archiver.restore(self.name)
+
+    def test_manifest_table_must_be_partitioned(self):
+        self.write_manifest(table='sms_contact', **{'from': '2099-01-01', 'to': '2099-02-01'})
+        with self.assertNumQueries(0), self.assertRaisesMessage(RuntimeError, 'table inconnue'):
+            self.archiver.restore(self.name)
+
+    def partition(self):
+        return next((p for p in list_partitions('sms_smsmessage') if p['name'] == self.name), None)
+
+    def message_in_month(self):
+        user = CustomUser.objects.create(username='archive', email='archive@example.com', telephone='+221776400000')
+        conversation = Conversation.objects.create(user=user, contact_phone='+221776400001')
+        sms = SMSMessage.objects.create(
+            conversation=conversation, sender_phone=user.telephone,
+            recipient_phone=conversation.contact_phone, message='Rendez-vous archivé'
+        )
+        SMSMessage.objects.filter(pk=sms.pk).update(sent_at=self.MONTH + timedelta(days=14))
+        # Contrôles différés de la transaction du test: un vieux mois archivé n'en a plus
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        return sms
+
+    @skipUnless(connection.vendor == 'postgresql', "Partitionnement: PostgreSQL uniquement")
+    def test_create_partition_is_idempotent(self):
+        self.assertTrue(create_partition('sms_smsmessage', self.MONTH))
+        self.assertFalse(create_partition('sms_smsmessage', self.MONTH))
+        partition = self.partition()
+        self.assertEqual((partition['from'], partition['to']), (self.MONTH, datetime(2099, 2, 1, tzinfo=dt_timezone.utc)))
+
+    @skipUnless(connection.vendor == 'postgresql', "Partitionnement: PostgreSQL uniquement")
+    def test_detached_partition_is_reattached(self):
+        create_partition('sms_smsmessage', self.MONTH)
+        sms = self.message_in_month()
+
+        manifest = self.archiver.archive('sms_smsmessage', self.partition())
+        self.assertEqual(manifest['rows'], 1)
+        self.assertFalse(SMSMessage.objects.filter(pk=sms.pk).exists())
+
+        self.assertEqual(self.archiver.restore(self.name), 0)
+        self.assertIsNotNone(self.partition())
+        self.assertTrue(SMSMessage.objects.filter(pk=sms.pk).exists())
+
+    @skipUnless(connection.vendor == 'postgresql', "Partitionnement: PostgreSQL uniquement")
+    def test_dropped_partition_is_reloaded_from_the_export(self):
+        create_partition('sms_smsmessage', self.MONTH)
+        sms = self.message_in_month()
+
+        manifest = self.archiver.archive('sms_smsmessage', self.partition(), drop=True)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, manifest['file'])))
+        self.assertIsNone(self.partition())
+
+        self.assertEqual(self.archiver.restore(self.name), 1)
+        restored = SMSMessage.objects.get(pk=sms.pk)
+        self.assertEqual((restored.message, restored.sent_at), (sms.message, self.MONTH + timedelta(days=14)))
+        # Colonne non archivée recalculée par le trigger à la restauration
+        self.assertTrue(SMSMessage.objects.filter(pk=sms.pk, search_vector=SearchQuery('rendez', config='french')).exists())
+
+
+class DeliveryReceiptTests(TestCase):
+    """Accusés de réception: transitions monotones, le statut final de l'opérateur l'emporte sur l'envoi"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='accuses', email='accuses@example.com', telephone='+221771111111')
+        cls.conversation = Conversation.objects.create(user=cls.user, contact_phone='+221772222222')
+
+    def send(self, message_id):
+        sms = SMSMessage.objects.create(
+            conversation=self.conversation,
+            sender_phone=self.user.telephone,
+            recipient_phone=self.conversation.contact_phone,
+            message='Bonjour',
+        )
+        message_status = MessageStatus.objects.create(message=sms, status='sending')
+        SMSDispatchService.record_success(
+            sms, message_status, {'message_id': message_id, 'delivery_status': 'DeliveredToNetwork'}
+        )
+        return message_status
+
+    def status_of(self, message_status):
+        return MessageStatus.objects.get(pk=message_status.pk).status
+
+    def test_accepted_send_is_sent_not_delivered(self):
+        self.assertEqual(self.status_of(self.send('orange-accepte')), 'sent')
+
+    def test_delivery_impossible_after_successful_send_is_applied(self):
+        message_status = self.send('orange-echec')
+        updates, unknown = DeliveryReceiptService.apply([('orange-echec', 'DeliveryImpossible')])
+        self.assertEqual(self.status_of(message_status), 'failed')
+        self.assertEqual(updates[self.user.id][0]['status'], 'failed')
+        self.assertEqual(unknown, [])
+
+    def test_network_receipt_does_not_block_a_later_failure(self):
+        message_status = self.send('orange-reseau')
+        DeliveryReceiptService.apply([('orange-reseau', 'DeliveredToNetwork')])
+        DeliveryReceiptService.apply([('orange-reseau', 'DeliveryImpossible')])
+        self.assertEqual(self.status_of(message_status), 'failed')
+
+    def test_late_receipt_never_moves_status_backwards(self):
+        message_status = self.send('orange-livre')
+        DeliveryReceiptService.apply([('orange-livre', 'DeliveredToTerminal')])
+        updates, _ = DeliveryReceiptService.apply([('orange-livre', 'MessageWaiting')])
+        self.assertEqual(self.status_of(message_status), 'delivered')
+        self.assertEqual(updates, {})
+
+    def test_first_final_status_wins(self):
+        message_status = self.send('orange-final')
+        DeliveryReceiptService.apply([('orange-final', 'DeliveredToTerminal')])
+        DeliveryReceiptService.apply([('orange-final', 'DeliveryImpossible')])
+        self.assertEqual(self.status_of(message_status), 'delivered')
+
+    def test_most_advanced_receipt_of_a_batch_wins(self):
+        message_status = self.send('orange-lot')
+        DeliveryReceiptService.apply([('orange-lot', 'DeliveredToTerminal'), ('orange-lot', 'MessageWaiting')])
+        self.assertEqual(self.status_of(message_status), 'delivered')
+
+    def test_unknown_message_id_is_reported(self):
+        updates, unknown = DeliveryReceiptService.apply([('orange-inconnu', 'DeliveredToTerminal')])
+        self.assertEqual(updates, {})
+        self.assertEqual(unknown, ['orange-inconnu'])
+
+    def test_receipt_without_message_id_is_rejected_not_deduplicated(self):
+        message_status = self.send('orange-webhook')
+
+        def post(delivery_info):
+            return self.client.post(
+                '/api/sms/delivery-receipt/', {'deliveryInfoNotification': {'deliveryInfo': delivery_info}},
+                content_type='application/json'
+            )
+
+        for _ in range(2):
+            response = post({'address': 'tel:+221772222222', 'deliveryStatus': 'DeliveredToTerminal'})
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+        response = post({'messageId': 'orange-webhook', 'deliveryStatus': 'DeliveredToTerminal'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.status_of(message_status), 'delivered')
+
+
+class ResolverCacheTests(TestCase):
+    """Le niveau partagé n'est utilisé que si le cache Django est commun aux process"""
+
+    def setUp(self):
+        self.resolver = TwoTierCache('test')
+        cache.clear()
+
+    def test_process_local_cache_is_not_used_as_shared_tier(self):
+        # Tests: LocMemCache, propre au process
+        self.resolver.set('+221770000000', 42)
+        self.assertIsNone(cache.get('sms:resolver:test:+221770000000'))
+        self.resolver.clear()
+        self.assertIs(self.resolver.get('+221770000000'), MISSING)
+
+    @override_settings(SMS_RESOLVER_CACHE_CONFIG={'SHARED': True})
+    def test_shared_tier_when_forced(self):
+        self.resolver.set('+221770000000', 42)
+        self.resolver.clear()
+        self.assertEqual(self.resolver.get('+221770000000'), 42)
+        self.resolver.delete('+221770000000')
+        self.assertIs(self.resolver.get('+221770000000'), MISSING)
+
+
+class OutboxClaimTests(TestCase):
+    """Réservation de l'outbox: messages prêts d'abord, réservations abandonnées reprises, remise en file"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='outbox', email='outbox@example.com', telephone='+221776800000')
+        self.conversation = Conversation.objects.create(user=self.user, contact_phone='+221776800001')
+
+    def queue(self, **fields):
+        sms = SMSMessage.objects.create(
+            conversation=self.conversation, sender_phone=self.user.telephone,
+            recipient_phone=self.conversation.contact_phone, message='outbox'
+        )
+        return MessageStatus.objects.create(message=sms, **{'status': 'queued', **fields})
+
+    def test_claim_takes_ready_messages_and_stale_claims(self):
+        now = timezone.now()
+        ready = self.queue()
+        due = self.queue(next_attempt_at=now - timedelta(seconds=1))
+        self.queue(next_attempt_at=now + timedelta(minutes=5))  # Essai programmé plus tard
+        self.queue(status='sending', claimed_at=now)  # Réservé par un dispatcher actif
+        stale = self.queue(status='sending', claimed_at=now - timedelta(hours=1))
+
+        claimed = OutboxService.claim_batch(10)
+        self.assertEqual([item.pk for item in claimed], [ready.pk, due.pk, stale.pk])
+        self.assertTrue(all(item.status == 'sending' and item.claimed_at for item in claimed))
+        self.assertEqual(OutboxService.claim_batch(10), [])
+
+    def test_claim_respects_limit(self):
+        first, second = self.queue(), self.queue()
+        self.assertEqual([item.pk for item in OutboxService.claim_batch(1)], [first.pk])
+        self.assertEqual([item.pk for item in OutboxService.claim_batch(1)], [second.pk])
+
+    def test_requeue_resets_dead_and_failed_messages_only(self):
+        dead = self.queue(status='dead', attempts=5, next_attempt_at=timezone.now())
+        failed = self.queue(status='failed', attempts=1)
+        sent = self.queue(status='sent', attempts=1)
+
+        self.assertEqual(OutboxService.requeue(MessageStatus.objects.all()), 2)
+        for message_status in (dead, failed):
+            message_status.refresh_from_db()
+            self.assertEqual(
+                (message_status.status, message_status.attempts, message_status.next_attempt_at), ('queued', 0, None)
+            )
+        sent.refresh_from_db()
+        self.assertEqual(sent.status, 'sent')
+        self.assertEqual([item.pk for item in OutboxService.claim_batch(10)], [dead.pk, failed.pk])
+
+
+@skipUnless(connection.vendor == 'postgresql', "SKIP LOCKED: PostgreSQL uniquement")
+class OutboxSkipLockedTests(TransactionTestCase):
+    """Deux dispatchers en parallèle ne réservent jamais le même message"""
+
+    def test_locked_message_is_skipped_by_another_dispatcher(self):
+        user = CustomUser.objects.create(username='verrou', email='verrou@example.com', telephone='+221776800002')
+        conversation = Conversation.objects.create(user=user, contact_phone='+221776800003')
+        locked, free = [
+            MessageStatus.objects.create(message=SMSMessage.objects.create(
+                conversation=conversation, sender_phone=user.telephone,
+                recipient_phone=conversation.contact_phone, message='verrou'
+            ), status='queued')
+            for _ in range(2)
+        ]
+
+        claimed = []
+
+        def other_dispatcher():
+            try:
+                claimed.extend(item.pk for item in OutboxService.claim_batch(10))
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            # Réservation en cours par un premier dispatcher
+            MessageStatus.objects.select_for_update().get(pk=locked.pk)
+            thread = threading.Thread(target=other_dispatcher)
+            thread.start()
+            thread.join(timeout=10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(claimed, [free.pk])
+        locked.refresh_from_db()
+        self.assertEqual(locked.status, 'queued')
+
+
+class RecordFailureTests(TestCase):
+    """Classement des échecs d'envoi: reprise, échec définitif, abandon, attente sans consommer d'essai"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='echecs', email='echecs@example.com', telephone='+221773333333')
+        cls.conversation = Conversation.objects.create(user=cls.user, contact_phone='+221774444444')
+
+    def setUp(self):
+        self.sms = SMSMessage.objects.create(
+            conversation=self.conversation,
+            sender_phone=self.user.telephone,
+            recipient_phone=self.conversation.contact_phone,
+            message='Bonjour',
+        )
+        self.message_status = MessageStatus.objects.create(message=self.sms, status='sending', attempts=1)
+
+    def fail(self, error, attempts=1):
+        self.message_status.attempts = attempts
+        SMSDispatchService.record_failure(self.sms, self.message_status, error)
+        return MessageStatus.objects.get(pk=self.message_status.pk)
+
+    def test_transient_errors_are_retried_and_invalid_requests_are_final(self):
+        for error in (OrangeAPIError("Erreur serveur", 503), OrangeAPIError("Trop de requêtes", 429),
+                      OrangeAPIError("Jeton expiré", 401), ConnectionError("Réseau")):
+            self.assertTrue(RetryPolicy.is_retryable(error), error)
+        for error in (OrangeAPIError("Requête invalide", 400), OrangeAPIError("Interdit", 403),
+                      ValueError("Numéro invalide")):
+            self.assertFalse(RetryPolicy.is_retryable(error), error)
+
+    def test_transient_error_is_requeued_with_backoff(self):
+        message_status = self.fail(OrangeAPIError("Erreur serveur", 503), attempts=1)
+        self.assertEqual(message_status.status, 'queued')
+        self.assertEqual(message_status.attempts, 1)
+        self.assertGreater(message_status.next_attempt_at, message_status.updated_at)
+
+    def test_invalid_request_fails_without_retry(self):
+        message_status = self.fail(OrangeAPIError("Requête invalide", 400), attempts=1)
+        self.assertEqual(message_status.status, 'failed')
+        self.assertIsNone(message_status.next_attempt_at)
+
+    def test_transient_error_after_last_attempt_is_dead(self):
+        message_status = self.fail(OrangeAPIError("Erreur serveur", 503), attempts=RetryPolicy.max_attempts())
+        self.assertEqual(message_status.status, 'dead')
+        self.assertIsNone(message_status.next_attempt_at)
+
+    def test_rate_limit_timeout_requeues_without_consuming_an_attempt(self):
+        message_status = self.fail(RateLimitTimeout("Limite atteinte", retry_after=12), attempts=RetryPolicy.max_attempts())
+        self.assertEqual(message_status.status, 'queued')
+        self.assertEqual(message_status.attempts, RetryPolicy.max_attempts() - 1)
+        self.assertGreaterEqual((message_status.next_attempt_at - message_status.updated_at).total_seconds(), 11)
+
+    def test_open_circuit_requeues_without_consuming_an_attempt(self):
+        message_status = self.fail(CircuitOpenError("Circuit ouvert", retry_after=30), attempts=3)
+        self.assertEqual(message_status.status, 'queued')
+        self.assertEqual(message_status.attempts, 2)
+
+
+class WebhookDedupTests(TestCase):
+    """Webhooks rejoués par Orange: chaque notification n'est traitée qu'une fois"""
+
+    def setUp(self):
+        recent_keys.clear()
+        self.user = CustomUser.objects.create(username='webhooks', email='webhooks@example.com', telephone='+221776100000')
+
+    def test_claim_records_each_event_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(claim('receipt', 'orange-dedup', 'DeliveredToTerminal'))
+        self.assertFalse(claim('receipt', 'orange-dedup', 'DeliveredToTerminal'))
+        # Autre statut du même message: notification distincte
+        self.assertTrue(claim('receipt', 'orange-dedup', 'DeliveryImpossible'))
+
+        # Filtre mémoire: seules les clés validées (transaction commise) y entrent
+        self.assertTrue(seen_recently('receipt', 'orange-dedup', 'DeliveredToTerminal'))
+        self.assertFalse(seen_recently('receipt', 'orange-dedup', 'DeliveryImpossible'))
+
+    def test_replayed_inbound_webhook_creates_a_single_message(self):
+        payload = {'inboundSMSMessageNotification': {'inboundSMSMessage': {
+            'senderAddress': 'tel:+221776100001', 'destinationAddress': 'tel:+221776100000',
+            'message': 'Bonjour', 'messageId': 'orange-entrant',
+        }}}
+        responses = [
+            self.client.post('/api/sms/receive-webhook/', payload, content_type='application/json')
+            for _ in range(2)
+        ]
+
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(responses[1].json()['status'], "SMS déjà reçu")
+        self.assertEqual(SMSMessage.objects.filter(message_id='orange-entrant').count(), 1)
+
+    def test_replayed_receipt_is_acknowledged_without_reapplying(self):
+        conversation = Conversation.objects.create(user=self.user, contact_phone='+221776100002')
+        sms = SMSMessage.objects.create(
+            conversation=conversation, sender_phone=self.user.telephone,
+            recipient_phone=conversation.contact_phone, message='Bonjour', message_id='orange-rejoue'
+        )
+        MessageStatus.objects.create(message=sms, status='sent')
+        body = {'deliveryInfoNotification': {'deliveryInfo': {
+            'messageId': 'orange-rejoue', 'deliveryStatus': 'DeliveredToTerminal',
+        }}}
+
+        with patch.object(DeliveryReceiptService, 'apply', wraps=DeliveryReceiptService.apply) as apply:
+            responses = [
+                self.client.post('/api/sms/delivery-receipt/', body, content_type='application/json')
+                for _ in range(2)
+            ]
+
+        self.assertEqual([response.json()['status'] for response in responses],
+                         ["Notification reçue", "Notification déjà reçue"])
+        self.assertEqual(apply.call_count, 1)
+        self.assertEqual(MessageStatus.objects.get(message=sms).status, 'delivered')
+
+
+class InboundQueueTests(TestCase):
+    """File de réception: intake dédoublonné, ingestion par lots, reprise après erreur"""
+
+    def setUp(self):
+        recent_keys.clear()
+        self.user = CustomUser.objects.create(username='entrants', email='entrants@example.com', telephone='+221776200000')
+
+    def enqueue(self, message_id, recipient='+221776200000'):
+        payload = {'inboundSMSMessageNotification': {'inboundSMSMessage': {
+            'senderAddress': 'tel:+221776200001', 'destinationAddress': f'tel:{recipient}',
+            'message': f'Message {message_id}', 'messageId': message_id,
+        }}}
+        return InboundService.enqueue(payload, InboundService.parse(payload))
+
+    def test_duplicate_notification_is_not_enqueued_twice(self):
+        self.assertIsNotNone(self.enqueue('orange-file'))
+        self.assertIsNone(self.enqueue('orange-file'))
+        self.assertEqual(InboundMessage.objects.count(), 1)
+
+    def test_batch_is_ingested_and_unknown_recipient_rejected(self):
+        self.enqueue('orange-lot-1')
+        self.enqueue('orange-lot-2')
+        unknown = self.enqueue('orange-lot-3', recipient='+221776299999')
+
+        created = InboundService.process_batch(InboundService.claim_batch(10))
+
+        self.assertEqual(sorted(sms.message_id for sms in created), ['orange-lot-1', 'orange-lot-2'])
+        self.assertEqual(
+            set(MessageStatus.objects.filter(message__in=created).values_list('status', flat=True)), {'delivered'}
+        )
+        self.assertEqual(list(InboundMessage.objects.values_list('id', 'status')), [(unknown.id, 'rejected')])
+
+    def test_failed_ingestion_is_rescheduled(self):
+        inbound = self.enqueue('orange-panne')
+        with patch.object(InboundService, '_ingest', side_effect=DatabaseError("connexion perdue")):
+            self.assertEqual(InboundService.process_batch(InboundService.claim_batch(10)), [])
+
+        inbound.refresh_from_db()
+        self.assertEqual((inbound.status, inbound.attempts), ('pending', 1))
+        self.assertGreater(inbound.next_attempt_at, timezone.now())
+        # Pas de nouvel essai avant le délai
+        self.assertEqual(InboundService.claim_batch(10), [])
+
+
+class PendingReceiptTests(TestCase):
+    """Accusés arrivés avant l'enregistrement de l'envoi: gardés puis appliqués, ou perdus à expiration"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='attente', email='attente@example.com', telephone='+221776300000')
+        cls.conversation = Conversation.objects.create(user=cls.user, contact_phone='+221776300001')
+
+    def message(self, message_id=None, status='sending'):
+        sms = SMSMessage.objects.create(
+            conversation=self.conversation, sender_phone=self.user.telephone,
+            recipient_phone=self.conversation.contact_phone, message='Bonjour', message_id=message_id
+        )
+        return sms, MessageStatus.objects.create(message=sms, status=status)
+
+    def test_early_receipt_is_applied_when_the_send_is_recorded(self):
+        _, unknown = DeliveryReceiptService.apply([('orange-tot', 'DeliveryImpossible')])
+        DeliveryReceiptService.park([('orange-tot', 'DeliveryImpossible')])
+        self.assertEqual(unknown, ['orange-tot'])
+
+        sms, message_status = self.message()
+        SMSDispatchService.record_success(
+            sms, message_status, {'message_id': 'orange-tot', 'delivery_status': 'DeliveredToNetwork'}
+        )
+
+        self.assertEqual(MessageStatus.objects.get(pk=message_status.pk).status, 'failed')
+        self.assertFalse(PendingReceipt.objects.exists())
+
+    def test_sweep_applies_known_receipts_and_drops_expired_ones(self):
+        DeliveryReceiptService.park([('orange-balaye', 'DeliveredToTerminal'), ('orange-perdu', 'DeliveredToTerminal')])
+        PendingReceipt.objects.filter(message_id='orange-perdu').update(expires_at=timezone.now() - timedelta(seconds=1))
+        DeliveryReceiptService.park([('orange-patient', 'DeliveredToTerminal')])
+        _, message_status = self.message('orange-balaye', status='sent')
+
+        self.assertEqual(DeliveryReceiptService.sweep(), (1, 1))
+        self.assertEqual(MessageStatus.objects.get(pk=message_status.pk).status, 'delivered')
+        # Message toujours inconnu mais pas encore expiré: l'accusé reste en attente
+        self.assertEqual(list(PendingReceipt.objects.values_list('message_id', flat=True)), ['orange-patient'])
+
+
+class AsyncDispatcherBatchTests(TestCase):
+    """Le dispatcher asynchrone ne réserve pas plus de messages que le limiteur ne peut en servir"""
+
+    @override_settings(ORANGE_SMS_CONFIG={'RATE_LIMIT': {'RATE': 5, 'BURST': 10, 'MAX_WAIT': 30}})
+    def test_batch_is_capped_by_rate_limiter(self):
+        limiter = OrangeRateLimiter(backend='local')
+        with patch.object(OrangeRateLimiter, 'get_default', return_value=limiter):
+            self.assertEqual(AsyncOutboxDispatcher(concurrency=200).batch_size(), 150)
+            self.assertEqual(AsyncOutboxDispatcher(concurrency=20).batch_size(), 20)
+
+    @override_settings(ORANGE_SMS_CONFIG={'RATE_LIMIT': {'ENABLED': False}})
+    def test_batch_uses_concurrency_without_rate_limiter(self):
+        limiter = OrangeRateLimiter(backend='local')
+        with patch.object(OrangeRateLimiter, 'get_default', return_value=limiter):
+            self.assertEqual(AsyncOutboxDispatcher(concurrency=200).batch_size(), 200)
+
+
+class FakeOrangeClient:
+    """Client Orange asynchrone qui accepte tous les envois"""
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def send_sms_with_default_sender(self, recipient_phone, message):
+        return {'message_id': f'orange-{message}', 'delivery_status': 'DeliveredToNetwork'}
+
+
+class AsyncDispatcherIsolationTests(TestCase):
+    """Une erreur sur un message du lot n'interrompt ni le lot ni le dispatcher"""
+
+    def test_error_on_one_message_leaves_it_claimed_and_sends_the_others(self):
+        user = CustomUser.objects.create(username='lot', email='lot@example.com', telephone='+221775555555')
+        conversation = Conversation.objects.create(user=user, contact_phone='+221776666666')
+        statuses = {}
+        for text in ('un', 'panne', 'trois'):
+            sms = SMSMessage.objects.create(
+                conversation=conversation, sender_phone=user.telephone,
+                recipient_phone=conversation.contact_phone, message=text
+            )
+            statuses[text] = MessageStatus.objects.create(message=sms, status='queued')
+
+        record_success = SMSDispatchService.record_success
+
+        def failing_record_success(sms, message_status, orange_response):
+            if sms.message == 'panne':
+                raise DatabaseError("connexion perdue")
+            return record_success(sms, message_status, orange_response)
+
+        with patch('account.async_services.AsyncOrangeClient', FakeOrangeClient), \
+                patch.object(SMSDispatchService, 'record_success', side_effect=failing_record_success):
+            async_to_sync(AsyncOutboxDispatcher(concurrency=10).run)(once=True)
+
+        current = {text: MessageStatus.objects.get(pk=status.pk).status for text, status in statuses.items()}
+        self.assertEqual(current, {'un': 'sent', 'panne': 'sending', 'trois': 'sent'})
+
+
+class CampaignRecoveryTests(TransactionTestCase):
+    """Campagne interrompue (process web redémarré): reprise des seuls destinataires non envoyés"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='campagne', email='campagne@example.com', telephone='+221777000000')
+        self.campaign = Campaign.objects.create(
+            user=self.user, message='Promo', status='running', total_recipients=4, sent_count=1,
+            started_at=timezone.now() - timedelta(hours=1), heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def recipient(self, phone, status='pending', sms_status=None):
+        sms = None
+        if sms_status:
+            conversation = Conversation.objects.create(user=self.user, contact_phone=phone)
+            sms = SMSMessage.objects.create(
+                conversation=conversation, sender_phone=self.user.telephone, recipient_phone=phone, message='Promo'
+            )
+            MessageStatus.objects.create(message=sms, status=sms_status)
+        return CampaignRecipient.objects.create(campaign=self.campaign, phone_number=phone, status=status, sms=sms)
+
+    def test_stale_campaign_is_resumed_without_resending(self):
+        self.recipient('+221777000001')  # Jamais préparé
+        self.recipient('+221777000002', sms_status='sending')  # Préparé, pas envoyé
+        already_sent = self.recipient('+221777000003', sms_status='sent')  # Envoyé, destinataire pas encore mis à jour
+        self.recipient('+221777000004', status='sent', sms_status='sent')
+
+        self.assertEqual(CampaignService.claim_stale(), [self.campaign.id])
+        self.assertEqual(CampaignService.claim_stale(), [])  # Déjà reprise (signe de vie à jour)
+
+        sent = []
+
+        def send(recipient_phone, message):
+            sent.append(recipient_phone)
+            return {'message_id': f'orange-{recipient_phone}', 'delivery_status': 'DeliveredToNetwork'}
+
+        with patch('sms.services.OrangeOAuth.send_sms_with_default_sender', side_effect=send):
+            CampaignService.run(self.campaign.id)
+
+        self.assertEqual(sorted(sent), ['+221777000001', '+221777000002'])
+        self.assertEqual(CampaignRecipient.objects.get(pk=already_sent.pk).status, 'sent')
+        campaign = Campaign.objects.get(pk=self.campaign.pk)
+        self.assertEqual((campaign.status, campaign.sent_count, campaign.failed_count), ('completed', 4, 0))
+
+    def test_live_campaign_is_not_claimed(self):
+        Campaign.objects.filter(pk=self.campaign.pk).update(heartbeat_at=timezone.now())
+        self.assertEqual(CampaignService.claim_stale(), [])
+
+
+class ContactImportTests(TransactionTestCase):
+    """Import de contacts: en-têtes après une ligne vide ou un BOM, doublons entre lots"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='import', email='import@example.com', telephone='+221778000000')
+
+    def test_header_is_detected_on_first_non_empty_row(self):
+        rows = [[], ['', ''], ['\ufeffNom', 'Téléphone'], ['Awa', '771234567']]
+        self.assertEqual(list(ContactImportService.parse_rows(rows)), [(4, '771234567', 'Awa')])
+
+    @override_settings(SMS_CONTACT_IMPORT_CONFIG={'CHUNK_SIZE': 2})
+    def test_duplicates_across_chunks_are_not_counted_as_imported(self):
+        Contact.objects.create(user=self.user, phone_number='+221770000009', name='Ancien')
+        # Contact modifié ailleurs pendant l'import (autre requête): pas un doublon du fichier
+        Contact.objects.filter(phone_number='+221770000009').update(updated_at=timezone.now() + timedelta(hours=1))
+        content = '\n\ufeffphone;nom\n771234567;Awa\n771234568;Bob\n77 123 45 67;\n770000009;Nouveau\n'
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as f:
+            f.write(content)
+        contact_import = ContactImport.objects.create(user=self.user, file_name='contacts.csv')
+
+        ContactImportService.run(contact_import.id, f.name)
+
+        contact_import.refresh_from_db()
+        self.assertEqual(contact_import.status, 'completed')
+        self.assertEqual(
+            (contact_import.processed_rows, contact_import.imported_count, contact_import.duplicate_count,
+             contact_import.rejected_count),
+            (4, 3, 1, 0)
+        )
+        self.assertEqual(
+            dict(Contact.objects.filter(user=self.user).values_list('phone_number', 'name')),
+            {'+221771234567': 'Awa', '+221771234568': 'Bob', '+221770000009': 'Nouveau'}
+        )
+
+
+class ConversationSummaryTests(TestCase):
+    """Résumé stocké sur la conversation: dernier message et non lus tenus à jour, réparables par commande"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='resume', email='resume@example.com', telephone='+221776900000')
+        self.conversation = Conversation.objects.create(user=self.user, contact_phone='+221776900001')
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def message(self, text, minutes, received=False, is_read=False):
+        sender, recipient = self.user.telephone, self.conversation.contact_phone
+        if received:
+            sender, recipient = recipient, sender
+        # sent_at est auto_now_add: horloge fixée pour simuler l'ordre d'arrivée
+        with patch('django.utils.timezone.now', return_value=self.start + timedelta(minutes=minutes)):
+            return SMSMessage.objects.create(
+                conversation=self.conversation, sender_phone=sender, recipient_phone=recipient, message=text,
+                is_sent=not received, is_received=received, is_read=is_read
+            )
+
+    def summary(self):
+        conversation = Conversation.objects.get(pk=self.conversation.pk)
+        return conversation.last_message_text, conversation.last_message_id, conversation.unread_count
+
+    def test_insert_updates_last_message_and_unread_count(self):
+        self.message('bonjour', 1)
+        reply = self.message('salut', 2, received=True)
+        self.assertEqual(self.summary(), ('salut', reply.id, 1))
+
+        # Message plus ancien arrivé en retard: non lu compté, dernier message inchangé
+        self.message('en retard', 0, received=True)
+        self.assertEqual(self.summary(), ('salut', reply.id, 2))
+
+    def test_mark_as_read_recomputes_unread_count(self):
+        self.message('un', 1, received=True)
+        self.message('deux', 2, received=True)
+        self.message('réponse', 3)
+
+        self.assertEqual(ConversationService.mark_as_read(self.conversation, self.user.telephone), 2)
+        self.assertEqual(self.conversation.unread_count, 0)
+        self.assertEqual(self.summary()[2], 0)
+        self.assertEqual(ConversationService.mark_as_read(self.conversation, self.user.telephone), 0)
+
+    def test_repair_command_matches_incremental_summary(self):
+        self.message('bonjour', 1)
+        last = self.message('salut', 2, received=True)
+        self.message('lu', 0, received=True, is_read=True)
+        other = Conversation.objects.create(user=self.user, contact_phone='+221776900002')
+        expected = self.summary()
+
+        Conversation.objects.filter(pk__in=[self.conversation.pk, other.pk]).update(
+            last_message_text='faux', last_message_id=None, last_message_at=None, unread_count=7
+        )
+        out = StringIO()
+        call_command('repair_conversation_summaries', '--user', 'resume', '--batch-size', '1', stdout=out)
+
+        self.assertEqual(expected, ('salut', last.id, 1))
+        self.assertEqual(self.summary(), expected)
+        other.refresh_from_db()
+        self.assertEqual((other.last_message_text, other.last_message_id, other.unread_count), ('', None, 0))
+        self.assertIn("2 conversation(s) réparée(s)", out.getvalue())
+
+
+class MessagePaginationTests(TestCase):
+    """Le curseur 'after' suit toujours le message le plus récent de la page"""
+
+    def setUp(self):
+        user = CustomUser.objects.create(username='pages', email='pages@example.com', telephone='+221779000000')
+        self.conversation = Conversation.objects.create(user=user, contact_phone='+221779000001')
+        self.messages = [self.message(text) for text in ('un', 'deux', 'trois')]
+
+    def message(self, text):
+        return SMSMessage.objects.create(
+            conversation=self.conversation, sender_phone='+221779000000',
+            recipient_phone=self.conversation.contact_phone, message=text
+        )
+
+    def page(self, after=None):
+        paginator = MessageKeysetPagination()
+        after = paginator.decode_cursor(after)
+        rows = paginator.paginate(SMSMessage.objects.filter(conversation=self.conversation), 10, after=after)
+        return [row.message for row in rows], paginator.after
+
+    def test_after_cursor_is_returned_when_there_are_no_newer_messages(self):
+        rows, after = self.page()
+        self.assertEqual(rows, ['un', 'deux', 'trois'])
+        self.assertEqual(after, MessageKeysetPagination.encode_cursor(self.messages[-1]))
+
+        # Rien de nouveau: le curseur est conservé pour le prochain relevé
+        rows, still_after = self.page(after)
+        self.assertEqual((rows, still_after), ([], after))
+
+        self.message('quatre')
+        self.assertEqual(self.page(still_after)[0], ['quatre'])
+
+
+class MessageIngestTests(TestCase):
+    """Ingestion en masse: même résultat en base que des SMSMessage.save() un par un"""
+
+    CONTACTS = ('+221779200001', '+221779200002')
+
+    def scenario(self, telephone):
+        """Messages d'un utilisateur: conversation existante, nouvelle conversation, message lu, numéro inconnu"""
+        known, new = self.CONTACTS
+        user = CustomUser.objects.create(username=f"ingest{telephone[-2:]}", email=f"ingest{telephone[-2:]}@example.com",
+                                         telephone=telephone)
+        Conversation.objects.create(user=user, contact_phone=known, contact_name='Ami')
+        messages = [
+            SMSMessage(sender_phone=telephone, recipient_phone=known, message='bonjour'),
+            SMSMessage(sender_phone=known, recipient_phone=telephone, message='salut', is_sent=False, is_received=True),
+            SMSMessage(sender_phone=known, recipient_phone=telephone, message='déjà lu', is_sent=False,
+                       is_received=True, is_read=True),
+            SMSMessage(sender_phone=telephone, recipient_phone=new, message='nouvelle conversation'),
+            SMSMessage(sender_phone='+221779299998', recipient_phone='+221779299999', message='inconnu'),
+        ]
+        return user, messages
+
+    def snapshot(self, user):
+        role = {user.telephone: 'utilisateur'}
+        conversations = {
+            conversation.contact_phone: (
+                conversation.contact_name, conversation.last_message_text, conversation.unread_count,
+                SMSMessage.objects.get(pk=conversation.last_message_id).message,
+            )
+            for conversation in Conversation.objects.filter(user=user)
+        }
+        messages = sorted(
+            (sms.conversation.contact_phone, role.get(sms.sender_phone, sms.sender_phone),
+             role.get(sms.recipient_phone, sms.recipient_phone), sms.message, sms.is_read, sms.status.status)
+            for sms in SMSMessage.objects.filter(conversation__user=user).select_related('conversation', 'status')
+        )
+        stats = {row.status: row.count for row in DailyMessageStats.objects.filter(user=user) if row.count}
+        return conversations, messages, stats
+
+    def test_ingest_matches_save_path(self):
+        saved_user, messages = self.scenario('+221779200010')
+        for sms in messages:
+            try:
+                sms.save()
+            except ValueError:
+                continue  # Aucun utilisateur pour ce message
+            MessageStatus.objects.create(message=sms, status='sent')
+
+        ingested_user, messages = self.scenario('+221779200020')
+        result = MessageIngestService.ingest(messages, status='sent', batch_size=2)
+
+        self.assertEqual([sms.message for sms in result['unresolved']], ['inconnu'])
+        self.assertEqual(len(result['messages']), 4)
+        self.assertTrue(all(sms.pk and sms.conversation_id and sms.status.pk for sms in result['messages']))
+        self.assertEqual(self.snapshot(ingested_user), self.snapshot(saved_user))
+        self.assertEqual(self.snapshot(ingested_user)[0], {
+            self.CONTACTS[0]: ('Ami', 'déjà lu', 1, 'déjà lu'),
+            self.CONTACTS[1]: ('', 'nouvelle conversation', 0, 'nouvelle conversation'),
+        })
+
+    def test_in_memory_conversation_matches_database(self):
+        user, messages = self.scenario('+221779200030')
+        MessageIngestService.ingest(messages[:3])
+        conversation = messages[0].conversation
+        stored = Conversation.objects.get(pk=conversation.pk)
+        self.assertEqual(
+            (conversation.last_message_id, conversation.last_message_text, conversation.unread_count),
+            (stored.last_message_id, stored.last_message_text, stored.unread_count)
+        )
+
+
+class ConversationDetailTests(TestCase):
+    """Détail d'une conversation: fenêtre bornée des derniers messages, curseur des plus anciens, ?fields="""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='detail', email='detail@example.com', telephone='+221779100000')
+        cls.conversation = Conversation.objects.create(user=cls.user, contact_phone='+221779100001')
+        for index in range(60):
+            SMSMessage.objects.create(
+                conversation=cls.conversation, sender_phone=cls.user.telephone,
+                recipient_phone=cls.conversation.contact_phone, message=f"message {index}"
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def detail(self, **params):
+        response = self.client.get(f"/api/sms/conversations/{self.conversation.pk}/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def texts(self, messages):
+        return [message['message'] for message in messages]
+
+    def test_default_window_and_older_messages_cursor(self):
+        data = self.detail()
+        self.assertEqual(self.texts(data['messages']), [f"message {index}" for index in range(10, 60)])
+        self.assertEqual(data['messages'][0]['is_sent_by_user'], True)
+
+        response = self.client.get(
+            f"/api/sms/conversations/{self.conversation.pk}/messages/", {'before': data['messages_before']}
+        )
+        older = response.json()
+        self.assertEqual(self.texts(older['results']), [f"message {index}" for index in range(10)])
+        self.assertIsNone(older['before'])
+
+    def test_window_size_is_bounded(self):
+        data = self.detail(messages=5)
+        self.assertEqual(self.texts(data['messages']), [f"message {index}" for index in range(55, 60)])
+        self.assertIsNotNone(data['messages_before'])
+
+        data = self.detail(messages=10000)  # Borné à max_page_size (200): tout le fil
+        self.assertEqual(len(data['messages']), 60)
+        self.assertIsNone(data['messages_before'])
+
+        self.assertEqual(len(self.detail(messages=0)['messages']), 1)
+        self.assertEqual(len(self.detail(messages='tout')['messages']), MessageKeysetPagination.page_size)
+
+    def test_sparse_fields_skip_the_message_query(self):
+        table = SMSMessage._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            data = self.detail(fields='id,unread_count')
+        self.assertEqual(data, {'id': self.conversation.pk, 'unread_count': 0})
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and table in query['sql']]
+        self.assertEqual(selects, [])
+
+    def test_sparse_fields_do_not_apply_to_nested_messages(self):
+        data = self.detail(fields='id,messages', messages=1)
+        self.assertEqual(set(data), {'id', 'messages'})
+        self.assertEqual(set(data['messages'][0]), {
+            'id', 'sender_phone', 'recipient_phone', 'message', 'sent_at', 'is_sent', 'is_received', 'is_read',
+            'is_sent_by_user',
+        })
+
+
+class MessageStatsTests(TestCase):
+    """Compteurs quotidiens tenus au fil des statuts: identiques à une reconstruction complète"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='stats', email='stats@example.com', telephone='+221776500000')
+        self.conversation = Conversation.objects.create(user=self.user, contact_phone='+221776500001')
+
+    def send(self, text, status='sending'):
+        sms = SMSMessage.objects.create(
+            conversation=self.conversation, sender_phone=self.user.telephone,
+            recipient_phone=self.conversation.contact_phone, message=text
+        )
+        return sms, MessageStatus.objects.create(message=sms, status=status)
+
+    def counts(self):
+        return {
+            (row.day, row.status): row.count
+            for row in DailyMessageStats.objects.filter(user=self.user) if row.count
+        }
+
+    def test_incremental_counts_match_rebuild(self):
+        sms, message_status = self.send('livré')
+        SMSDispatchService.record_success(sms, message_status, {'message_id': 'orange-stats-1'})
+        DeliveryReceiptService.apply([('orange-stats-1', 'DeliveredToTerminal')])
+
+        sms, message_status = self.send('refusé')
+        message_status.attempts = 1
+        SMSDispatchService.record_failure(sms, message_status, OrangeAPIError("Requête invalide", 400))
+
+        # Accusé arrivé avant l'envoi: compté par apply_pending, pas une seconde fois au save suivant
+        DeliveryReceiptService.park([('orange-stats-3', 'DeliveryImpossible')])
+        sms, message_status = self.send('échec opérateur')
+        SMSDispatchService.record_success(sms, message_status, {'message_id': 'orange-stats-3'})
+        self.assertEqual(message_status.counted_status, 'failed')
+        message_status.save()
+
+        # Lot ingéré: statut initial compté par le lot, seule la transition suivante compte au save
+        ingested = MessageIngestService.ingest([
+            SMSMessage(conversation=self.conversation, sender_phone=self.user.telephone,
+                       recipient_phone=self.conversation.contact_phone, message='lot'),
+            SMSMessage(conversation=self.conversation, sender_phone=self.conversation.contact_phone,
+                       recipient_phone=self.user.telephone, message='réponse', is_sent=False, is_received=True),
+        ], status='sent')['messages']
+        ingested[0].status.status = 'delivered'
+        ingested[0].status.save()
+
+        today = timezone.localdate()
+        incremental = self.counts()
+        self.assertEqual(incremental, {
+            (today, 'sent'): 2, (today, 'delivered'): 2, (today, 'failed'): 2, (today, 'received'): 1,
+        })
+        with transaction.atomic():
+            MessageStatsService.rebuild([self.user.id])
+        self.assertEqual(self.counts(), incremental)
+
+    def test_unchanged_status_is_not_counted_twice(self):
+        _, message_status = self.send('envoyé', status='sent')
+        message_status.save()
+        MessageStatus.objects.get(pk=message_status.pk).save()
+        self.assertEqual(self.counts(), {(timezone.localdate(), 'sent'): 1})
+
+
+class ReplicaProbeView(ReplicaReadMixin, APIView):
+    """Vue de test: base choisie pour les lectures de la requête"""
+    permission_classes = []
+
+    def get(self, request):
+        return Response({'database': ReplicaRouter().db_for_read(Conversation)})
+
+    post = get
+
+
+class ReplicaCountView(ReplicaProbeView):
+    """Vue de test: conversations de l'utilisateur visibles depuis la base choisie"""
+
+    def get(self, request):
+        response = super().get(request)
+        response.data['conversations'] = Conversation.objects.filter(user_id=request.user.pk).count()
+        return response
+
+
+class ReplicaRoutingTests(TestCase):
+    """Lectures sur réplica: méthodes sûres seulement, primaire après une écriture ou si le réplica est en retard"""
+
+    REPLICA = 'replica_test'
+
+    def setUp(self):
+        cache.clear()
+        lag_monitor.reset()
+        self.user = CustomUser.objects.create(username='replica', email='replica@example.com', telephone='+221776600000')
+        replicas = override_settings(DATABASE_REPLICA_CONFIG={
+            'ALIASES': [self.REPLICA], 'STICKY_SECONDS': 5, 'MAX_LAG_SECONDS': 10, 'SHARED_CACHE': True,
+        })
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        aliases = patch.dict(connections.settings, {self.REPLICA: dict(connections.settings['default'])})
+        aliases.start()
+        self.addCleanup(aliases.stop)
+        self.lag = patch.object(lag_monitor, 'lag', return_value=0.5).start()
+        self.addCleanup(patch.stopall)
+
+    def request(self, method):
+        request = getattr(APIRequestFactory(), method)('/probe/')
+        force_authenticate(request, user=self.user)
+        return ReplicaProbeView.as_view()(request).data['database']
+
+    def test_safe_methods_read_a_replica_and_writes_do_not(self):
+        self.assertEqual(self.request('get'), self.REPLICA)
+        self.assertIsNone(self.request('post'))  # Base par défaut: le primaire
+        # Choix limité à la requête
+        self.assertIsNone(ReplicaRouter().db_for_read(Conversation))
+
+    def test_user_who_just_wrote_reads_the_primary(self):
+        other = CustomUser.objects.create(username='autre', email='autre@example.com', telephone='+221776600001')
+        middleware = ReplicaStickinessMiddleware(lambda request: HttpResponse(status=201))
+        request = RequestFactory().post('/api/sms/send/')
+        request.user = self.user
+        middleware(request)
+
+        self.assertEqual(self.request('get'), 'default')
+        self.assertEqual(select_read_database(other.pk), self.REPLICA)
+
+    def test_failed_write_does_not_make_the_user_sticky(self):
+        request = RequestFactory().post('/api/sms/send/')
+        request.user = self.user
+        ReplicaStickinessMiddleware(lambda request: HttpResponse(status=400))(request)
+        self.assertEqual(select_read_database(self.user.pk), self.REPLICA)
+
+    def test_lagging_or_unreachable_replica_falls_back_to_the_primary(self):
+        self.lag.return_value = 30
+        self.assertEqual(select_read_database(self.user.pk), 'default')
+        self.lag.return_value = None  # Injoignable
+        self.assertEqual(select_read_database(self.user.pk), 'default')
+
+    def test_process_local_cache_disables_replicas(self):
+        with override_settings(DATABASE_REPLICA_CONFIG={'ALIASES': [self.REPLICA], 'SHARED_CACHE': None}):
+            # Tests: LocMemCache, la marque de mark_write ne serait vue que par ce process
+            self.assertIsNone(select_read_database(self.user.pk))
+
+    @skipUnless(channel_layer.psycopg2 is not None, "psycopg2 requis")
+    def test_unreachable_replica_is_measured_as_none(self):
+        from django.db.backends.postgresql.base import DatabaseWrapper
+
+        alias = 'replica_down'
+        connections[alias] = DatabaseWrapper({
+            **connections['default'].settings_dict, 'ENGINE': 'django.db.backends.postgresql',
+            'NAME': 'replica', 'HOST': '127.0.0.1', 'PORT': '1', 'OPTIONS': {'connect_timeout': 1},
+        }, alias)
+        self.addCleanup(connections.__delitem__, alias)
+        self.assertIsNone(ReplicaLagMonitor()._measure(alias))
+
+
+REPLICA_ALIASES = get_replica_config('ALIASES', [])
+
+
+@skipUnless(
+    connection.vendor == 'postgresql' and REPLICA_ALIASES and settings.REPLICAS_TEST_SEPARATE,
+    "Deux bases PostgreSQL distinctes requises (DB_REPLICAS + DB_REPLICAS_TEST_SEPARATE=True, voir README)"
+)
+class ReplicaDatabasesTests(TransactionTestCase):
+    """Routage réel entre deux bases PostgreSQL sans réplication: une écriture n'est visible que sur le primaire"""
+
+    databases = {'default', *REPLICA_ALIASES}
+
+    def setUp(self):
+        cache.clear()
+        lag_monitor.reset()
+        self.addCleanup(lag_monitor.reset)
+        self.user = CustomUser.objects.create(username='primaire', email='primaire@example.com', telephone='+221776700000')
+        Conversation.objects.create(user=self.user, contact_phone='+221776700001')
+        shared = override_settings(DATABASE_REPLICA_CONFIG={**settings.DATABASE_REPLICA_CONFIG, 'SHARED_CACHE': True})
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    def read(self):
+        request = APIRequestFactory().get('/probe/')
+        force_authenticate(request, user=self.user)
+        return ReplicaCountView.as_view()(request).data
+
+    def test_reads_go_to_the_replica_until_the_user_writes(self):
+        self.assertEqual(lag_monitor.lag(REPLICA_ALIASES[0]), 0.0)
+        data = self.read()
+        self.assertIn(data['database'], REPLICA_ALIASES)
+        self.assertEqual(data['conversations'], 0)  # Écriture absente du réplica
+
+        mark_write(self.user.pk)
+        self.assertEqual(self.read(), {'database': 'default', 'conversations': 1})
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        with patch.object(ReplicaLagMonitor, 'LAG_SQL', 'SELECT 3600'):
+            self.assertEqual(self.read(), {'database': 'default', 'conversations': 1})
+
+
+class FakeListenConnection:
+    """Connexion d'écoute psycopg2 simulée: instructions notées, descripteur réel pour add_reader"""
+
+    def __init__(self):
+        self.executed = []
+        self.notifies = []
+        self.closed = False
+        self.sockets = socket.socketpair()
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    def fileno(self):
+        return self.sockets[0].fileno()
+
+    def poll(self):
+        pass
+
+    def close(self):
+        self.closed = True
+        for sock in self.sockets:
+            sock.close()
+
+
+@skipUnless(channel_layer.psycopg2 is not None, "psycopg2 requis")
+class PostgresChannelLayerTests(SimpleTestCase):
+    """Fragments NOTIFY, capacité des canaux et abonnements LISTEN (sans base PostgreSQL)"""
+
+    def setUp(self):
+        self.layer = PostgresChannelLayer(prefix='test', capacity=2, payload_limit=200, reconnect_delay=0.01)
+        self.channel = 'specific.test!abc'
+        self.queue = self.layer.channels[self.channel] = asyncio.Queue()
+        self.connections = []
+        self.connect_threads = []
+
+    def connect(self):
+        self.connect_threads.append(threading.get_ident())
+        conn = FakeListenConnection()
+        self.connections.append(conn)
+        return conn
+
+    def statements(self, name):
+        return [sql for conn in self.connections for sql in conn.executed if name in sql]
+
+    def test_large_message_is_fragmented_and_reassembled_in_any_order(self):
+        message = {'type': 'send_notification', 'text': 'x' * 1000}
+        payloads = self.layer._payloads({'c': self.channel, 'm': message})
+
+        self.assertGreater(len(payloads), 1)
+        self.assertTrue(all(payload.startswith('#') and len(payload) <= 200 for payload in payloads))
+        for payload in reversed(payloads):
+            self.layer._receive_payload(payload)
+
+        self.assertEqual(self.queue.get_nowait()[1], message)
+        self.assertEqual(self.layer._partial, {})
+
+    def test_orphan_fragments_are_expired(self):
+        first = self.layer._payloads({'c': self.channel, 'm': {'text': 'a' * 1000}})
+        second = self.layer._payloads({'c': self.channel, 'm': {'text': 'b' * 1000}})
+        self.layer._receive_payload(first[0])
+        orphan = first[0][1:].split(':', 1)[0]
+        started, chunks = self.layer._partial[orphan]
+        self.layer._partial[orphan] = (started - self.layer.expiry - 1, chunks)
+
+        self.layer._receive_payload(second[0])
+
+        self.assertNotIn(orphan, self.layer._partial)
+        self.assertEqual(len(self.layer._partial), 1)
+
+    def test_full_channel_drops_messages(self):
+        self.layer.groups['alertes'] = {self.channel}
+        for i in range(3):
+            for payload in self.layer._payloads({'g': 'alertes', 'm': {'id': i}}):
+                self.layer._receive_payload(payload)
+
+        self.assertEqual(self.queue.qsize(), 2)
+        self.assertEqual([self.queue.get_nowait()[1]['id'] for _ in range(2)], [0, 1])
+
+    def test_group_listen_is_reference_counted(self):
+        group = self.layer._notify_channel('g', 'alertes')
+        del self.layer.channels[self.channel]
+
+        async def scenario():
+            first, second = await self.layer.new_channel(), await self.layer.new_channel()
+            await self.layer.group_add('alertes', first)
+            await self.layer.group_add('alertes', second)
+            await self.layer.group_discard('alertes', first)
+            still_listening = self.statements(group)
+            await self.layer.group_discard('alertes', second)
+            loop_thread = threading.get_ident()
+            await self.layer.close()
+            return still_listening, loop_thread
+
+        with patch.object(PostgresChannelLayer, '_connect', side_effect=self.connect):
+            still_listening, loop_thread = async_to_sync(scenario)()
+
+        self.assertEqual(still_listening, [f'LISTEN "{group}"'])
+        self.assertEqual(self.statements(group), [f'LISTEN "{group}"', f'UNLISTEN "{group}"'])
+        # Connexion ouverte dans l'exécuteur, pas sur la boucle d'événements
+        self.assertEqual(len(self.connect_threads), 1)
+        self.assertNotEqual(self.connect_threads[0], loop_thread)
+
+    def test_subscriptions_are_applied_once_the_listener_reconnects(self):
+        group = self.layer._notify_channel('g', 'alertes')
+        del self.layer.channels[self.channel]
+        attempts = []
+
+        def flaky_connect():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise channel_layer.psycopg2.OperationalError("base injoignable")
+            return self.connect()
+
+        async def scenario():
+            # Première connexion en échec: l'abonnement est noté sans bloquer le consommateur
+            await self.layer.group_add('alertes', await self.layer.new_channel())
+            for _ in range(100):
+                if self.layer._listener is not None:
+                    break
+                await asyncio.sleep(0.01)
+            await self.layer.close()
+
+        with patch.object(PostgresChannelLayer, '_connect', side_effect=flaky_connect):
+            async_to_sync(scenario)()
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.statements(group), [f'LISTEN "{group}"'])
@@ -5,19 +5,31 @@ from .views import (
     SendSMSView, SMSHistoryView, ConversationListView,
     ConversationDetailView, ConversationMessagesView,
     CreateConversationView, SearchConversationsView,
-    MarkAsReadView, DeliveryReceiptView, ReceiveSMSWebhookView
+    MarkAsReadView, DeliveryReceiptView, ReceiveSMSWebhookView,
+    CampaignListView, CampaignDetailView, CreateCampaignView,
+    ContactImportView, ContactImportDetailView, MessageStatsView
 )
 
 urlpatterns = [
     # Envoi et gestion des conversations
     path('send/', SendSMSView.as_view(), name='send-sms'),
     path('history/', SMSHistoryView.as_view(), name='sms-history'),
+    path('stats/', MessageStatsView.as_view(), name='sms-stats'),
     path('conversations/', ConversationListView.as_view(), name='conversation-list'),
     path('conversations/create/', CreateConversationView.as_view(), name='conversation-create'),
     path('conversations/search/', SearchConversationsView.as_view(), name='conversation-search'),
     path('conversations/<int:pk>/', ConversationDetailView.as_view(), name='conversation-detail'),
     path('conversations/<int:conversation_id>/messages/', ConversationMessagesView.as_view(), name='conversation-messages'),
     path('conversations/<int:conversation_id>/mark-read/', MarkAsReadView.as_view(), name='mark-as-read'),
+
+    # Campagnes d'envoi en masse
+    path('campaigns/', CampaignListView.as_view(), name='campaign-list'),
+    path('campaigns/create/', CreateCampaignView.as_view(), name='campaign-create'),
+    path('campaigns/<int:pk>/', CampaignDetailView.as_view(), name='campaign-detail'),
+
+    # Import de contacts CSV/XLSX
+    path('contacts/import/', ContactImportView.as_view(), name='contact-import'),
+    path('contacts/imports/<int:pk>/', ContactImportDetailView.as_view(), name='contact-import-detail'),
     
     # 🆕 Webhooks Orange
     path('delivery-receipt/', DeliveryReceiptView.as_view(), name='delivery-receipt'),
@@ -3,13 +3,15 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from rest_framework.parsers import MultiPartParser
 from django.db import transaction
 from django.utils import timezone
 import logging
 
-from account.models import CustomUser
+from account.circuitbreaker import CircuitBreaker, CircuitOpenError
+from account.metrics import metrics
 from account.services import OrangeOAuth
+from sms_platform.dbrouter import ReplicaReadMixin, mark_write
 
 # ✅ Import corrigé pour RealtimeNotificationService
 try:
@@ -20,50 +22,74 @@ except ImportError:
 # Imports corrects
 from .serializers import (
     SendSMSSerializer, SMSMessageSerializer, ConversationSerializer,
-    ConversationListSerializer, CreateConversationSerializer
+    ConversationListSerializer, ConversationSearchSerializer, CreateConversationSerializer,
+    CampaignSerializer, CreateCampaignSerializer, ContactImportSerializer
+)
+from .pagination import HistoryKeysetPagination, MessageKeysetPagination, SearchPagination
+from .models import SMSMessage, Conversation, Contact, ContactImport, MessageStatus, Campaign
+from .dedup import claim, seen_recently
+from .resolvers import get_or_create_conversation, resolve_user_id
+from .services import (
+    CampaignService, ContactImportService, ConversationSearchService, ConversationService, DeliveryReceiptService,
+    InboundService, MessageStatsService, OutboxService, SMSDispatchService, get_campaign_config, get_import_config
 )
-from .models import SMSMessage, Conversation, Contact, MessageStatus
 
 logger = logging.getLogger(__name__)
 
-class ConversationListView(generics.ListAPIView):
-    """Liste toutes les conversations de l'utilisateur"""
+class ConversationListView(ReplicaReadMixin, generics.ListAPIView):
+    """Liste toutes les conversations de l'utilisateur (lue sur un réplica)"""
     serializer_class = ConversationListSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        # Résumé dénormalisé: une seule requête par page, sans sous-requête par conversation
         return Conversation.objects.filter(
             user=self.request.user,
             is_archived=False
+        ).only(
+            'id', 'contact_phone', 'contact_name', 'updated_at',
+            'last_message_text', 'last_message_at', 'unread_count'
         ).order_by('-updated_at')
 
 class ConversationDetailView(generics.RetrieveAPIView):
-    """Détails d'une conversation avec tous ses messages"""
+    """
+    Détails d'une conversation avec ses derniers messages
+    ?messages=<n>: taille de la fenêtre (bornée), ?fields=a,b: champs renvoyés
+    """
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         return Conversation.objects.filter(user=self.request.user)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        paginator = MessageKeysetPagination()
+        try:
+            window = int(self.request.query_params.get('messages', paginator.page_size))
+        except ValueError:
+            window = paginator.page_size
+        context['message_window'] = max(1, min(window, paginator.max_page_size))
+        return context
+
     def retrieve(self, request, *args, **kwargs):
         conversation = self.get_object()
         
         # Marquer les messages comme lus
-        updated_count = conversation.messages.filter(
-            recipient_phone=request.user.telephone,
-            is_read=False
-        ).update(is_read=True)
+        updated_count = ConversationService.mark_as_read(conversation, request.user.telephone)
         
         if updated_count > 0:
+            mark_write(request.user.pk)  # Écriture sur un GET: le middleware ne la voit pas
             logger.info(f"{updated_count} messages marques comme lus")  # ✅ Émoji supprimé
         
         serializer = self.get_serializer(conversation)
         return Response(serializer.data)
 
-class ConversationMessagesView(generics.ListAPIView):
-    """Messages d'une conversation spécifique"""
+class ConversationMessagesView(ReplicaReadMixin, generics.ListAPIView):
+    """Messages d'une conversation spécifique (curseurs ?before= / ?after=), lus sur un réplica"""
     serializer_class = SMSMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageKeysetPagination
 
     def get_queryset(self):
         conversation_id = self.kwargs['conversation_id']
@@ -96,7 +122,7 @@ class CreateConversationView(APIView):
                 defaults={'contact_name': contact_name}
             )
 
-            serializer = ConversationSerializer(conversation)
+            serializer = ConversationSerializer(conversation, context={'request': request})
             status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
             
             message = "Nouvelle conversation creee" if created else "Conversation existante recuperee"  # ✅ Émojis supprimés
@@ -130,7 +156,12 @@ class SendSMSView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+            # ✅ Circuit Orange ouvert: le message est garé dans l'outbox au lieu de bloquer la requête
+            circuit_open = bool(CircuitBreaker.get('orange').retry_after())
+            use_outbox = OutboxService.is_enabled() or circuit_open
+
             try:
+                # La transaction ne couvre que les écritures locales, jamais l'appel Orange
                 with transaction.atomic():
                     # Récupérer ou créer la conversation
                     if conversation_id:
@@ -145,11 +176,7 @@ class SendSMSView(APIView):
                                 status=status.HTTP_404_NOT_FOUND
                             )
                     else:
-                        conversation, created = Conversation.objects.get_or_create(
-                            user=request.user,
-                            contact_phone=recipient,
-                            defaults={'contact_name': ''}
-                        )
+                        conversation, created = get_or_create_conversation(request.user.id, recipient)
 
                     # Créer le message en base (en attente)
                     sms = SMSMessage.objects.create(
@@ -163,108 +190,224 @@ class SendSMSView(APIView):
                     # Créer le statut initial
                     message_status = MessageStatus.objects.create(
                         message=sms,
-                        status='sent'
+                        status='queued' if use_outbox else 'sent'
                     )
 
-                    try:
-                        # Envoyer le SMS via Orange API
-                        logger.info(f"Envoi SMS vers {recipient}")  # ✅ Émoji supprimé
-                        
-                        orange_response = OrangeOAuth.send_sms_with_default_sender(
-                            recipient_phone=recipient,
-                            message=message
-                        )
-
-                        # Mettre à jour le message avec les infos Orange
-                        sms.is_sent = True
-                        sms.message_id = orange_response.get('message_id')
-                        sms.save()
-
-                        # Mettre à jour le statut
-                        message_status.status = 'delivered' if orange_response.get('delivery_status') == 'DeliveredToNetwork' else 'sent'
-                        message_status.save()
-
-                        logger.info(f"SMS envoye avec succes! ID: {orange_response.get('message_id')}")  # ✅ Émoji supprimé
-
-                        # Notification temps réel pour l'expéditeur
-                        if RealtimeNotificationService:
-                            try:
-                                message_data = {
-                                    'id': sms.id,
-                                    'sender_phone': sms.sender_phone,
-                                    'recipient_phone': sms.recipient_phone,
-                                    'message': sms.message,
-                                    'sent_at': sms.sent_at.isoformat(),
-                                    'is_sent_by_user': True,
-                                    'status': message_status.status
-                                }
-                                
-                                RealtimeNotificationService.notify_new_message(
-                                    user_id=request.user.id,
-                                    conversation_id=conversation.id,
-                                    message_data=message_data
-                                )
-                            except Exception as notif_error:
-                                logger.warning(f"Erreur notification temps reel: {notif_error}")  # ✅ Émoji supprimé
-
-                        # Sérialiser la réponse
-                        message_serializer = SMSMessageSerializer(sms, context={'request': request})
-                        
-                        return Response({
-                            "message": "SMS envoyé avec succès",
-                            "sms": message_serializer.data,
-                            "conversation_id": conversation.id,
-                            "orange_message_id": orange_response.get('message_id'),
-                            "delivery_status": orange_response.get('delivery_status')
-                        }, status=status.HTTP_200_OK)
-
-                    except Exception as orange_error:
-                        # Erreur lors de l'envoi via Orange
-                        logger.error(f"Erreur Orange API: {orange_error}")  # ✅ Émoji supprimé
-                        
-                        # Marquer le message comme échoué
-                        sms.is_sent = False
-                        sms.save()
-                        
-                        message_status.status = 'failed'
-                        message_status.error_message = str(orange_error)
-                        message_status.save()
-
-                        return Response({
-                            "error": f"Erreur lors de l'envoi SMS: {str(orange_error)}",
-                            "sms_id": sms.id,
-                            "conversation_id": conversation.id
-                        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
             except Exception as e:
                 logger.error(f"Erreur generale lors de l'envoi SMS: {e}")  # ✅ Émoji supprimé
                 return Response(
                     {"error": f"Erreur interne: {str(e)}"}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
+
+            if use_outbox:
+                # Mode outbox (ou circuit ouvert): un dispatcher (manage.py run_sms_dispatcher) enverra le message
+                logger.info(f"SMS {sms.id} mis en file d'attente vers {recipient}")
+                self._notify_new_message(request, sms, conversation, message_status)
+
+                message_serializer = SMSMessageSerializer(sms, context={'request': request})
+                return Response({
+                    "message": "Service Orange indisponible, SMS mis en file d'attente" if circuit_open else "SMS mis en file d'attente",
+                    "sms": message_serializer.data,
+                    "conversation_id": conversation.id,
+                    "delivery_status": message_status.status
+                }, status=status.HTTP_202_ACCEPTED)
+
+            try:
+                # Envoyer le SMS via Orange API
+                logger.info(f"Envoi SMS vers {recipient}")  # ✅ Émoji supprimé
+                orange_response = SMSDispatchService.deliver(sms, message_status, allow_retry=False)
+
+            except Exception as orange_error:
+                # Erreur lors de l'envoi via Orange, déjà enregistrée sur le statut
+                return Response({
+                    "error": f"Erreur lors de l'envoi SMS: {str(orange_error)}",
+                    "sms_id": sms.id,
+                    "conversation_id": conversation.id
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE if isinstance(orange_error, CircuitOpenError)
+                   else status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            # Notification temps réel pour l'expéditeur
+            self._notify_new_message(request, sms, conversation, message_status)
+
+            # Sérialiser la réponse
+            message_serializer = SMSMessageSerializer(sms, context={'request': request})
+            
+            return Response({
+                "message": "SMS envoyé avec succès",
+                "sms": message_serializer.data,
+                "conversation_id": conversation.id,
+                "orange_message_id": orange_response.get('message_id'),
+                "delivery_status": orange_response.get('delivery_status')
+            }, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class SearchConversationsView(APIView):
-    """Rechercher dans les conversations"""
+    def _notify_new_message(self, request, sms, conversation, message_status):
+        if not RealtimeNotificationService:
+            return
+        try:
+            message_data = {
+                'id': sms.id,
+                'sender_phone': sms.sender_phone,
+                'recipient_phone': sms.recipient_phone,
+                'message': sms.message,
+                'sent_at': sms.sent_at.isoformat(),
+                'is_sent_by_user': True,
+                'status': message_status.status
+            }
+            
+            RealtimeNotificationService.notify_new_message(
+                user_id=request.user.id,
+                conversation_id=conversation.id,
+                message_data=message_data
+            )
+        except Exception as notif_error:
+            logger.warning(f"Erreur notification temps reel: {notif_error}")  # ✅ Émoji supprimé
+
+class CampaignListView(generics.ListAPIView):
+    """Liste des campagnes d'envoi en masse de l'utilisateur"""
+    serializer_class = CampaignSerializer
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        query = request.query_params.get('q', '')
-        if not query:
-            return Response([], status=status.HTTP_200_OK)
+    def get_queryset(self):
+        return Campaign.objects.filter(user=self.request.user).order_by('-created_at')
 
-        conversations = Conversation.objects.filter(
-            user=request.user,
-            is_archived=False
-        ).filter(
-            Q(contact_name__icontains=query) |
-            Q(contact_phone__icontains=query) |
-            Q(messages__message__icontains=query)
-        ).distinct().order_by('-updated_at')
+class CampaignDetailView(generics.RetrieveAPIView):
+    """Progression d'une campagne"""
+    serializer_class = CampaignSerializer
+    permission_classes = [IsAuthenticated]
 
-        serializer = ConversationListSerializer(conversations, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return Campaign.objects.filter(user=self.request.user)
+
+class CreateCampaignView(APIView):
+    """Créer une campagne: un message, plusieurs destinataires, diffusion côté serveur"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = CreateCampaignSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if not OrangeOAuth.validate_phone_number(request.user.telephone):
+            return Response(
+                {"error": "Votre numéro de téléphone est invalide. Contactez l'administrateur."}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = serializer.validated_data
+        recipients = CampaignService.collect_recipients(
+            request.user,
+            recipients=data['recipients'],
+            contact_ids=data['contact_ids'],
+            all_contacts=data['all_contacts']
+        )
+        phone_numbers = recipients['valid']
+
+        if not phone_numbers:
+            return Response(
+                {"error": "Aucun numéro destinataire valide", "rejected": recipients['rejected']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_recipients = get_campaign_config('MAX_RECIPIENTS', 10000)
+        if len(phone_numbers) > max_recipients:
+            return Response(
+                {"error": f"Trop de destinataires (max {max_recipients})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            campaign = CampaignService.create_campaign(
+                user=request.user,
+                message=data['message'],
+                phone_numbers=phone_numbers,
+                name=data.get('name', '')
+            )
+        except Exception as e:
+            logger.error(f"Erreur creation campagne: {e}")
+            return Response(
+                {"error": f"Erreur interne: {str(e)}"}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response({
+            "message": "Campagne créée, envoi en cours",
+            "campaign": CampaignSerializer(campaign).data,
+            "rejected": recipients['rejected'],
+            "duplicates": recipients['duplicates']
+        }, status=status.HTTP_202_ACCEPTED)
+
+class ContactImportView(APIView):
+    """Importer des contacts depuis un fichier CSV ou XLSX (champ multipart 'file')"""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response(
+                {"error": "Fichier manquant (champ 'file')"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not uploaded_file.name.lower().endswith(('.csv', '.txt', '.xlsx')):
+            return Response(
+                {"error": "Format non supporté: CSV ou XLSX attendu"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_size = get_import_config('MAX_FILE_SIZE', 200 * 1024 * 1024)
+        if uploaded_file.size > max_size:
+            return Response(
+                {"error": f"Fichier trop volumineux (max {max_size // (1024 * 1024)} Mo)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            contact_import = ContactImportService.create_import(request.user, uploaded_file)
+        except Exception as e:
+            logger.error(f"Erreur import de contacts: {e}")
+            return Response(
+                {"error": f"Erreur interne: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response({
+            "message": "Import de contacts en cours",
+            "import": ContactImportSerializer(contact_import).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+class ContactImportDetailView(generics.RetrieveAPIView):
+    """Progression et lignes rejetées d'un import de contacts"""
+    serializer_class = ContactImportSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ContactImport.objects.filter(user=self.request.user)
+
+class SearchConversationsView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    Rechercher dans les conversations: ?q=<texte>, résultats classés et paginés (?page=, ?page_size=)
+    Chaque résultat donne sa pertinence (rank) et un extrait du meilleur message trouvé (snippet)
+    """
+    serializer_class = ConversationSearchSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        return ConversationSearchService.search(self.request.user, self.query)
+
+    def list(self, request, *args, **kwargs):
+        self.query = request.query_params.get('q', '').strip()
+        if not self.query:
+            return Response({'count': 0, 'next': None, 'previous': None, 'results': []})
+
+        page = self.paginate_queryset(self.get_queryset())
+        ConversationSearchService.attach_snippets(page, self.query)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class MarkAsReadView(APIView):
     """Marquer les messages d'une conversation comme lus"""
@@ -278,10 +421,7 @@ class MarkAsReadView(APIView):
             )
             
             # Marquer tous les messages reçus comme lus
-            updated_count = conversation.messages.filter(
-                recipient_phone=request.user.telephone,
-                is_read=False
-            ).update(is_read=True)
+            updated_count = ConversationService.mark_as_read(conversation, request.user.telephone)
             
             logger.info(f"{updated_count} messages marques comme lus pour conversation {conversation_id}")  # ✅ Émoji supprimé
             
@@ -296,18 +436,34 @@ class MarkAsReadView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class SMSHistoryView(APIView):
-    """Historique global des SMS"""
+class SMSHistoryView(ReplicaReadMixin, APIView):
+    """Historique global des SMS (lu sur un réplica)"""
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        messages = SMSMessage.objects.filter(
-            Q(sender_phone=request.user.telephone) |
-            Q(recipient_phone=request.user.telephone)
-        ).order_by('-sent_at')
-        
+        # Envoyés OU reçus: deux parcours d'index fusionnés par le paginateur plutôt qu'un OR trié
+        paginator = HistoryKeysetPagination()
+        messages = paginator.paginate_queryset([
+            SMSMessage.objects.filter(sender_phone=request.user.telephone),
+            SMSMessage.objects.filter(recipient_phone=request.user.telephone),
+        ], request, view=self)
+
         serializer = SMSMessageSerializer(messages, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
+
+class MessageStatsView(ReplicaReadMixin, APIView):
+    """
+    Statistiques du tableau de bord lues dans les compteurs quotidiens (coût indépendant du volume de messages)
+    ?days=<n>: détail jour par jour des n derniers jours (30 par défaut, 366 au plus)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = 30
+        return Response(MessageStatsService.summary(request.user, days=max(1, min(days, 366))))
 
 class DeliveryReceiptView(APIView):
     """Reçoit les notifications de livraison de l'API Orange"""
@@ -317,45 +473,47 @@ class DeliveryReceiptView(APIView):
         try:
             data = request.data.get('deliveryInfoNotification', {})
             delivery_info = data.get('deliveryInfo', {})
-            message_id = delivery_info.get('messageId', 'N/A')
+            message_id = delivery_info.get('messageId')
             address = delivery_info.get('address', 'N/A')
-            delivery_status = delivery_info.get('deliveryStatus', 'N/A')
+            delivery_status = delivery_info.get('deliveryStatus')
 
             logger.info(f"Delivery Receipt recu - Message ID: {message_id}, Statut: {delivery_status}, Destinataire: {address}")  # ✅ Émoji supprimé
 
-            # Mettre à jour le statut du message dans la base
-            try:
-                sms = SMSMessage.objects.get(message_id=message_id)
-                
-                # Mettre à jour le statut
-                if hasattr(sms, 'status'):
-                    sms.status.status = delivery_status.lower()
-                    sms.status.save()
-                else:
-                    MessageStatus.objects.create(
-                        message=sms,
-                        status=delivery_status.lower()
-                    )
-                
+            # ✅ Accusé sans messageId: rattachable à aucun envoi, refusé (jamais dédoublonné sous un id par défaut)
+            if not message_id or not delivery_status:
+                logger.warning(f"Accuse de reception incomplet refuse: {delivery_info}")
+                metrics.incr('sms.receipts.rejected')
+                return Response({
+                    "error": "Accusé de réception incomplet",
+                    "required": ["messageId", "deliveryStatus"]
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # ✅ Accusé rejoué par Orange: acquitté sans requête ni notification
+            if seen_recently('receipt', message_id, delivery_status):
+                return Response({"status": "Notification déjà reçue"}, status=status.HTTP_200_OK)
+
+            # ✅ File d'accusés: une insertion puis réponse immédiate, appliqués par lots (run_inbound_processor)
+            if InboundService.is_enabled():
+                if DeliveryReceiptService.enqueue(message_id, delivery_status) is None:
+                    return Response({"status": "Notification déjà reçue"}, status=status.HTTP_200_OK)
+                return Response({"status": "Notification reçue"}, status=status.HTTP_200_OK)
+
+            # Application immédiate: même traitement qu'un lot d'un seul accusé (transition monotone)
+            with transaction.atomic():
+                if not claim('receipt', message_id, delivery_status):
+                    logger.info(f"Accuse de reception deja traite: {message_id} {delivery_status}")
+                    return Response({"status": "Notification déjà reçue"}, status=status.HTTP_200_OK)
+                updates, unknown = DeliveryReceiptService.apply([(message_id, delivery_status)])
+                if unknown:
+                    # ✅ Envoi pas encore enregistré: l'accusé attend son message_id au lieu d'être perdu
+                    DeliveryReceiptService.park([(message_id, delivery_status)])
+
+            if unknown:
+                logger.info(f"SMS avec message_id {message_id} pas encore enregistre, accuse mis en attente")
+            else:
                 logger.info(f"Statut mis a jour pour SMS {message_id}: {delivery_status}")  # ✅ Émoji supprimé
-                
                 # Notification temps réel du changement de statut
-                if RealtimeNotificationService:
-                    try:
-                        # Trouver l'utilisateur qui a envoyé le message
-                        user = CustomUser.objects.get(telephone=sms.sender_phone)
-                        RealtimeNotificationService.notify_message_status_update(
-                            user_id=user.id,
-                            message_id=sms.id,
-                            new_status=delivery_status.lower()
-                        )
-                    except CustomUser.DoesNotExist:
-                        logger.warning(f"Utilisateur non trouve pour le numero {sms.sender_phone}")  # ✅ Émoji supprimé
-                    except Exception as notif_error:
-                        logger.warning(f"Erreur notification statut: {notif_error}")
-                
-            except SMSMessage.DoesNotExist:
-                logger.warning(f"SMS avec message_id {message_id} non trouve")  # ✅ Émoji supprimé
+                DeliveryReceiptService.notify(updates)
 
             return Response({"status": "Notification reçue"}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -368,25 +526,18 @@ class ReceiveSMSWebhookView(APIView):
     
     def post(self, request):
         try:
-            logger.info("=== RECEPTION SMS WEBHOOK ===")  # ✅ Émoji supprimé
-            logger.info(f"Headers: {dict(request.headers)}")
-            logger.info(f"Body: {request.data}")
+            # ✅ Corps et en-têtes complets seulement en DEBUG (rafales de réponses aux campagnes)
+            logger.debug(f"Webhook SMS - Headers: {dict(request.headers)}")
+            logger.debug(f"Webhook SMS - Body: {request.data}")
             
             # Format webhook Orange pour SMS reçus (MO - Mobile Originated)
-            data = request.data.get('inboundSMSMessageNotification', {})
-            sms_data = data.get('inboundSMSMessage', {})
-            
-            # Extraire les données du SMS reçu
-            sender_address = sms_data.get('senderAddress', '')
-            sender_phone = sender_address.replace('tel:+', '+').replace('tel:', '')
-            recipient_address = sms_data.get('destinationAddress', '')
-            recipient_phone = recipient_address.replace('tel:+', '+').replace('tel:', '')
-            message_text = sms_data.get('message', '')
-            received_at = sms_data.get('dateTime')
-            message_id = sms_data.get('messageId', '')
+            fields = InboundService.parse(request.data)
+            sender_phone = fields['sender_phone']
+            recipient_phone = fields['recipient_phone']
+            message_text = fields['message']
+            message_id = fields['message_id']
             
             logger.info(f"SMS recu de {sender_phone} vers {recipient_phone}")  # ✅ Émoji supprimé
-            logger.info(f"Message: {message_text}")  # ✅ Émoji supprimé
             
             # Validation des données
             if not sender_phone or not message_text:
@@ -396,13 +547,27 @@ class ReceiveSMSWebhookView(APIView):
                     "required": ["senderAddress", "message"]
                 }, status=400)
             
+            # ✅ Webhook rejoué par Orange: acquitté sans rien réécrire ni renotifier
+            if seen_recently('inbound', message_id):
+                return self.duplicate_response(message_id)
+            
+            # ✅ File de réception: une insertion puis réponse immédiate à Orange,
+            # utilisateur, conversation et notification sont traités par run_inbound_processor
+            if InboundService.is_enabled():
+                inbound = InboundService.enqueue(request.data, fields)
+                if inbound is None:
+                    return self.duplicate_response(message_id)
+                return Response({
+                    "status": "SMS reçu, traitement en cours",
+                    "inbound_id": inbound.id
+                }, status=200)
+            
             # Trouver l'utilisateur destinataire (celui qui a reçu le SMS)
-            try:
-                # Le destinataire est l'utilisateur de votre plateforme
-                user = CustomUser.objects.get(telephone=recipient_phone)
-                logger.info(f"Utilisateur trouve: {user.username}")  # ✅ Émoji supprimé
-                
-            except CustomUser.DoesNotExist:
+            # Le destinataire est l'utilisateur de votre plateforme
+            user_id = resolve_user_id(recipient_phone)
+            if user_id is not None:
+                logger.info(f"Utilisateur trouve: {user_id}")  # ✅ Émoji supprimé
+            else:
                 logger.error(f"Aucun utilisateur avec le numero {recipient_phone}")  # ✅ Émoji supprimé
                 return Response({
                     "error": f"Utilisateur non trouvé pour le numéro {recipient_phone}",
@@ -411,12 +576,11 @@ class ReceiveSMSWebhookView(APIView):
             
             try:
                 with transaction.atomic():
+                    if not claim('inbound', message_id):
+                        return self.duplicate_response(message_id)
+                    
                     # Trouver ou créer la conversation
-                    conversation, created = Conversation.objects.get_or_create(
-                        user=user,
-                        contact_phone=sender_phone,
-                        defaults={'contact_name': ''}
-                    )
+                    conversation, created = get_or_create_conversation(user_id, sender_phone)
                     
                     if created:
                         logger.info(f"Nouvelle conversation creee avec {sender_phone}")  # ✅ Émoji supprimé
@@ -430,7 +594,7 @@ class ReceiveSMSWebhookView(APIView):
                         is_sent=False,      # Ce n'est pas un message envoyé
                         is_received=True,   # C'est un message reçu
                         is_read=False,      # Pas encore lu
-                        message_id=message_id
+                        message_id=message_id or None
                     )
                     
                     # Créer le statut du message
@@ -440,6 +604,7 @@ class ReceiveSMSWebhookView(APIView):
                     )
                     
                     logger.info(f"Message sauvegarde avec ID: {received_sms.id}")  # ✅ Émoji supprimé
+                    mark_write(user_id)  # Le client notifié relira la conversation sur le primaire
                     
                     # Notification temps réel
                     if RealtimeNotificationService:
@@ -456,7 +621,7 @@ class ReceiveSMSWebhookView(APIView):
                             }
                             
                             RealtimeNotificationService.notify_new_message(
-                                user_id=user.id,
+                                user_id=user_id,
                                 conversation_id=conversation.id,
                                 message_data=message_data
                             )
@@ -487,6 +652,11 @@ class ReceiveSMSWebhookView(APIView):
                 "help": "Vérifiez le format des données envoyées par Orange"
             }, status=500)
     
+    @staticmethod
+    def duplicate_response(message_id):
+        logger.info(f"SMS entrant {message_id} deja recu, ignore")
+        return Response({"status": "SMS déjà reçu", "message_id": message_id}, status=200)
+    
     def get(self, request):
         """Endpoint de vérification pour Orange (optionnel)"""
         return Response({
@@ -0,0 +1,375 @@
+# sms_platform/channel_layer.py - Channel layer PostgreSQL (LISTEN/NOTIFY) partagé entre processus ASGI/WSGI
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from channels.layers import BaseChannelLayer
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+from account.metrics import metrics
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+# Limite PostgreSQL d'une charge NOTIFY: 8000 octets (en-tête de fragment compris)
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+class PostgresChannelLayer(BaseChannelLayer):
+    """
+    Channel layer sur PostgreSQL: send/group_send publient un NOTIFY, chaque process écoute (LISTEN)
+    les groupes de ses consommateurs locaux et ses propres canaux (specific.<process>!...)
+    Appartenance aux groupes et files de réception locales au process; livraison au mieux,
+    comme NOTIFY: un message publié pendant une reconnexion de l'écoute est perdu
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, database='default', prefix='sms', expiry=60, capacity=100, channel_capacity=None,
+                 payload_limit=NOTIFY_PAYLOAD_LIMIT, reconnect_delay=1.0):
+        if psycopg2 is None:
+            raise ImproperlyConfigured("PostgresChannelLayer nécessite psycopg2")
+        super().__init__(expiry=expiry, capacity=capacity)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.database = database
+        self.prefix = prefix.lower()
+        self.payload_limit = min(payload_limit, NOTIFY_PAYLOAD_LIMIT)
+        self.reconnect_delay = reconnect_delay
+        # Identifiant du process dans les noms de canaux spécifiques
+        self.client_prefix = uuid.uuid4().hex[:12]
+
+        # Réception (boucle d'événements du serveur ASGI)
+        self.channels = {}  # canal local -> asyncio.Queue de (expiration, message)
+        self.groups = {}  # groupe -> canaux locaux
+        self._listening = set()  # canaux NOTIFY écoutés
+        self._listener = None
+        self._listener_fd = None
+        self._loop = None
+        self._connector = None  # Tâche de (re)connexion de l'écoute
+        self._first_attempt = None
+        self._partial = {}  # id -> (reçu à, fragments) des messages découpés
+
+        # Publication (n'importe quel thread, via l'exécuteur)
+        self._sender = None
+        self._sender_pid = None
+        self._sender_lock = threading.Lock()
+
+    # API channel layer
+
+    async def new_channel(self, prefix='specific.'):
+        return f"{prefix}{self.client_prefix}!{uuid.uuid4().hex}"
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        await self._publish(self._notify_channel('c', self.non_local_name(channel)), {'c': channel, 'm': message})
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        queue = await self._queue(channel)
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+        except asyncio.CancelledError:
+            # Consommateur arrêté: la file disparaît avec lui s'il a quitté ses groupes
+            if not any(channel in members for members in self.groups.values()):
+                self.channels.pop(channel, None)
+            raise
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        # Appartenance locale: le canal est celui d'un consommateur de ce process (file créée d'avance,
+        # pour ne rien perdre avant son premier receive)
+        await self._queue(channel)
+        members = self.groups.setdefault(group, set())
+        if not members:
+            self._listen(self._notify_channel('g', group))
+        members.add(channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        members = self.groups.get(group)
+        if members is None:
+            return
+        members.discard(channel)
+        if not members:
+            del self.groups[group]
+            self._unlisten(self._notify_channel('g', group))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        await self._publish(self._notify_channel('g', group), {'g': group, 'm': message})
+
+    async def flush(self):
+        self.channels.clear()
+        self.groups.clear()
+        self._partial.clear()
+        for name in list(self._listening):
+            self._unlisten(name)
+
+    async def close(self):
+        if self._connector is not None and not self._connector.done() and self._loop is asyncio.get_running_loop():
+            self._connector.cancel()
+        self._close_listener()
+        self._loop = None
+        with self._sender_lock:
+            self._close_sender()
+
+    # Publication
+
+    def _notify_channel(self, kind, name):
+        """Nom du canal NOTIFY (identifiant PostgreSQL de 63 caractères au plus)"""
+        return f"{self.prefix}_{kind}_{hashlib.sha1(name.encode()).hexdigest()[:24]}"
+
+    def _payloads(self, data):
+        """Charge JSON (ASCII) découpée en fragments #id:rang:total:... au-delà de la limite NOTIFY"""
+        body = json.dumps({**data, 't': time.time()}, cls=DjangoJSONEncoder, separators=(',', ':'))
+        if len(body) <= self.payload_limit:
+            return [body]
+        message_id = uuid.uuid4().hex
+        size = self.payload_limit - 64
+        chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        return [f"#{message_id}:{rank}:{len(chunks)}:{chunk}" for rank, chunk in enumerate(chunks)]
+
+    async def _publish(self, name, data):
+        payloads = self._payloads(data)
+        await asyncio.get_running_loop().run_in_executor(None, self._notify, name, payloads)
+        metrics.incr('channel_layer.published')
+
+    def _notify(self, name, payloads):
+        # Une seule instruction: les fragments sont validés ensemble et livrés d'un bloc
+        sql = 'SELECT ' + ', '.join(['pg_notify(%s, %s)'] * len(payloads))
+        params = [value for payload in payloads for value in (name, payload)]
+        with self._sender_lock:
+            for attempt in range(2):
+                try:
+                    with self._sender_connection().cursor() as cursor:
+                        cursor.execute(sql, params)
+                    return
+                except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                    # Connexion coupée (redémarrage, failover): une nouvelle tentative sur une connexion neuve
+                    self._close_sender()
+                    if attempt:
+                        raise
+                    logger.warning(f"Channel layer: connexion de publication perdue ({e}), reconnexion")
+
+    def _sender_connection(self):
+        # Connexion propre au process (pas de partage après un fork)
+        if self._sender is None or self._sender.closed or self._sender_pid != os.getpid():
+            self._sender = self._connect()
+            self._sender_pid = os.getpid()
+        return self._sender
+
+    def _close_sender(self):
+        if self._sender is not None and self._sender_pid == os.getpid():
+            try:
+                self._sender.close()
+            except psycopg2.Error:
+                pass
+        self._sender = None
+
+    def _connect(self):
+        # Paramètres de la base Django (base de test comprise), hors connexion gérée par Django
+        conn = psycopg2.connect(**connections[self.database].get_connection_params())
+        conn.autocommit = True
+        return conn
+
+    # Réception
+
+    async def _queue(self, channel):
+        await self._start()
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = asyncio.Queue()
+            self._listen(self._notify_channel('c', self.non_local_name(channel)))
+        return queue
+
+    async def _start(self):
+        """
+        Écoute liée à la boucle d'événements courante (une seule par process)
+        La connexion est ouverte dans l'exécuteur: une base injoignable ne bloque pas les autres WebSockets
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._loop is not None and not self._loop.is_closed():
+                raise RuntimeError("PostgresChannelLayer: réception déjà liée à une autre boucle d'événements")
+            # Ancienne boucle fermée (tests, async_to_sync): ses files et abonnements sont morts
+            self._close_listener()
+            self.channels.clear()
+            self.groups.clear()
+            self._partial.clear()
+            self._listening.clear()
+            self._loop = loop
+            self._first_attempt = loop.create_future()
+            self._connector = loop.create_task(self._connect_listener(delay=0))
+        # Seule la première tentative est attendue; pendant une reconnexion, les abonnements
+        # sont notés et appliqués une fois la connexion rétablie
+        if not self._first_attempt.done():
+            await asyncio.shield(self._first_attempt)
+
+    async def _connect_listener(self, delay):
+        """Ouvre la connexion d'écoute, en réessayant toutes les reconnect_delay secondes"""
+        while True:
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                await self._open_listener()
+                return
+            except Exception as e:
+                logger.warning(f"Channel layer: connexion d'écoute impossible ({self._reason(e)})")
+                delay = self.reconnect_delay
+            finally:
+                if not self._first_attempt.done():
+                    self._first_attempt.set_result(None)
+
+    async def _open_listener(self):
+        loop = self._loop
+        names = set(self._listening)
+        conn = await loop.run_in_executor(None, self._connect_listening, names)
+        if self._loop is not loop:
+            # Layer fermé ou rattaché à une autre boucle pendant la connexion
+            conn.close()
+            return
+        self._listener = conn
+        # Descripteur gardé: fileno() échoue une fois la connexion coupée par le serveur
+        self._listener_fd = conn.fileno()
+        loop.add_reader(self._listener_fd, self._on_readable)
+        # Abonnements modifiés pendant la connexion
+        for name in self._listening - names:
+            self._execute(f'LISTEN "{name}"')
+        for name in names - self._listening:
+            self._execute(f'UNLISTEN "{name}"')
+        self._drain()
+        logger.info(f"Channel layer: écoute active ({len(self._listening)} canal(aux))")
+
+    def _connect_listening(self, names):
+        # Exécuteur: connexion et LISTEN initiaux, la connexion n'est pas encore partagée
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                for name in names:
+                    cursor.execute(f'LISTEN "{name}"')
+        except psycopg2.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _close_listener(self):
+        if self._listener is None:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self._listener_fd)
+        try:
+            self._listener.close()
+        except psycopg2.Error:
+            pass
+        self._listener = None
+
+    def _listen(self, name):
+        if name in self._listening:
+            return
+        self._listening.add(name)
+        self._execute(f'LISTEN "{name}"')
+
+    def _unlisten(self, name):
+        if name not in self._listening:
+            return
+        self._listening.discard(name)
+        self._execute(f'UNLISTEN "{name}"')
+
+    def _execute(self, sql):
+        # Instruction courte sur la connexion d'écoute, dans la boucle (pas d'accès concurrent)
+        # Sans connexion (reconnexion en cours): appliqué à la reconnexion via _listening
+        if self._listener is None:
+            return
+        try:
+            with self._listener.cursor() as cursor:
+                cursor.execute(sql)
+        except psycopg2.Error as e:
+            self._lost(e)
+            return
+        # Les notifications lues pendant l'instruction ne réveilleront pas le lecteur
+        self._drain()
+
+    def _on_readable(self):
+        try:
+            self._listener.poll()
+        except psycopg2.Error as e:
+            self._lost(e)
+            return
+        self._drain()
+
+    @staticmethod
+    def _reason(error):
+        return str(error).strip().splitlines()[0] if str(error).strip() else type(error).__name__
+
+    def _lost(self, error):
+        logger.warning(
+            f"Channel layer: connexion d'écoute perdue ({self._reason(error)}), reconnexion dans {self.reconnect_delay}s"
+        )
+        metrics.incr('channel_layer.reconnects')
+        self._close_listener()
+        if self._connector is None or self._connector.done():
+            self._connector = self._loop.create_task(self._connect_listener(delay=self.reconnect_delay))
+
+    def _drain(self):
+        listener = self._listener
+        while listener is not None and listener.notifies:
+            notify = listener.notifies.pop(0)
+            try:
+                self._receive_payload(notify.payload)
+            except Exception as e:
+                logger.error(f"Channel layer: notification illisible sur {notify.channel}: {e}")
+
+    def _receive_payload(self, payload):
+        if payload.startswith('#'):
+            message_id, rank, total, chunk = payload[1:].split(':', 3)
+            now = time.monotonic()
+            # Fragments orphelins (message jamais complété) oubliés après expiry
+            for key in [key for key, (started, _) in self._partial.items() if now - started > self.expiry]:
+                del self._partial[key]
+            started, chunks = self._partial.setdefault(message_id, (now, [None] * int(total)))
+            chunks[int(rank)] = chunk
+            if None in chunks:
+                return
+            del self._partial[message_id]
+            payload = ''.join(chunks)
+
+        data = json.loads(payload)
+        metrics.observe('channel_layer.latency', max(time.time() - data['t'], 0))
+        expires = data['t'] + self.expiry
+        if 'g' in data:
+            targets = list(self.groups.get(data['g'], ()))
+        else:
+            targets = [data['c']]
+
+        for rank, channel in enumerate(targets):
+            queue = self.channels.get(channel)
+            if queue is None:
+                continue
+            if queue.qsize() >= self.get_capacity(channel):
+                metrics.incr('channel_layer.dropped')
+                logger.warning(f"Channel layer: canal {channel} plein, message ignoré")
+                continue
+            # Copie propre à chaque consommateur (décodage plus rapide qu'un deepcopy)
+            message = data['m'] if rank == 0 else json.loads(payload)['m']
+            queue.put_nowait((expires, message))
+            metrics.incr('channel_layer.delivered')
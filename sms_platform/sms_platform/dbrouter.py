@@ -0,0 +1,196 @@
+# sms_platform/dbrouter.py - Lectures sur réplicas PostgreSQL (lecture de ses propres écritures, repli selon le retard)
+
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from account.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+
+# Base choisie pour les lectures de la requête en cours (None: base par défaut)
+_read_database = contextvars.ContextVar('read_database', default=None)
+
+
+def get_replica_config(key, default=None):
+    """Lit une option de DATABASE_REPLICA_CONFIG avec valeur par défaut"""
+    return getattr(settings, 'DATABASE_REPLICA_CONFIG', {}).get(key, default)
+
+
+def replicas_enabled():
+    """
+    Réplicas seulement si le cache Django est commun aux process (Redis, Memcached, base...):
+    la marque de mark_write doit être vue par le worker qui servira la lecture suivante.
+    Avec LocMemCache, propre au process, un autre worker lirait un réplica en retard
+    """
+    shared = get_replica_config('SHARED_CACHE')
+    if shared is not None:
+        return shared
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _sticky_key(user_id):
+    return f"db:sticky:{user_id}"
+
+
+def mark_write(user_id):
+    """Les lectures de cet utilisateur restent sur le primaire pendant STICKY_SECONDS"""
+    seconds = get_replica_config('STICKY_SECONDS', 5)
+    if user_id and seconds:
+        cache.set(_sticky_key(user_id), True, seconds)
+
+
+def is_sticky(user_id):
+    return bool(user_id) and cache.get(_sticky_key(user_id)) is not None
+
+
+class ReplicaLagMonitor:
+    """
+    Retard de réplication de chaque réplica, mesuré au plus toutes les CHECK_INTERVAL secondes (par process)
+    Un réplica injoignable est noté None et écarté jusqu'à la mesure suivante
+    """
+
+    # Réplica à jour de tout le WAL reçu: retard nul, même si le primaire n'a rien écrit depuis longtemps
+    LAG_SQL = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lags = {}  # alias -> (mesuré à, retard en secondes ou None)
+
+    def lag(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked_at, lag = self._lags.get(alias, (None, None))
+            if checked_at is not None and now - checked_at < get_replica_config('CHECK_INTERVAL', 5):
+                return lag
+            # Un seul thread mesure: les autres gardent la dernière valeur connue en attendant
+            self._lags[alias] = (now, lag)
+
+        lag = self._measure(alias)
+        with self._lock:
+            self._lags[alias] = (time.monotonic(), lag)
+        metrics.set_gauge(f"db.{alias}.lag_seconds", -1 if lag is None else round(lag, 3))
+        return lag
+
+    def reset(self):
+        with self._lock:
+            self._lags.clear()
+
+    def _measure(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.LAG_SQL)
+                return float(cursor.fetchone()[0])
+        except DatabaseError as e:
+            logger.warning(f"Replica {alias} injoignable: {e}")
+            # Connexion éventuellement cassée: Django en rouvrira une à la prochaine mesure
+            connection.close_if_unusable_or_obsolete()
+            return None
+
+
+lag_monitor = ReplicaLagMonitor()
+
+
+def select_read_database(user_id=None):
+    """
+    Base pour les lectures d'une requête: un réplica sain au hasard, sinon le primaire
+    - l'utilisateur vient d'écrire (STICKY_SECONDS): primaire, pour qu'il relise ses propres écritures
+    - tous les réplicas dépassent MAX_LAG_SECONDS ou sont injoignables: primaire
+    - cache propre au process (voir replicas_enabled): base par défaut, réplicas ignorés
+    """
+    aliases = [alias for alias in get_replica_config('ALIASES', []) if alias in connections.settings]
+    if not aliases or not replicas_enabled():
+        return None
+
+    if is_sticky(user_id):
+        metrics.incr('db.replica.sticky')
+        return PRIMARY
+
+    max_lag = get_replica_config('MAX_LAG_SECONDS', 10)
+    healthy = []
+    for alias in aliases:
+        lag = lag_monitor.lag(alias)
+        if lag is not None and lag <= max_lag:
+            healthy.append(alias)
+
+    if not healthy:
+        metrics.incr('db.replica.fallback')
+        logger.warning(f"Aucun replica sous {max_lag}s de retard, lecture sur le primaire")
+        return PRIMARY
+
+    metrics.incr('db.replica.reads')
+    return random.choice(healthy)
+
+
+class ReplicaRouter:
+    """
+    Routeur DATABASE_ROUTERS: écritures et migrations sur le primaire
+    Les lectures n'utilisent un réplica que dans les vues qui l'ont demandé (ReplicaReadMixin):
+    tout le reste (services, webhooks, workers) lit le primaire comme avant
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas physiques: mêmes données que le primaire
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # MIGRATE: réplicas de test indépendants (sans réplication), schéma créé sur chacun
+        return db == PRIMARY or get_replica_config('MIGRATE', False)
+
+
+class ReplicaReadMixin:
+    """Vues DRF: les requêtes GET lisent un réplica choisi par select_read_database"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # Authentification faite ici: request.user est connu
+        if request.method in SAFE_METHODS:
+            self._read_database_token = _read_database.set(select_read_database(request.user.pk))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_database_token', None)
+        if token is not None:
+            _read_database.reset(token)
+            self._read_database_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaStickinessMiddleware:
+    """Après une requête d'écriture réussie, ramène les lectures de l'utilisateur sur le primaire"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            # DRF recopie l'utilisateur authentifié (JWT) sur la requête Django
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                mark_write(user.pk)
+        return response
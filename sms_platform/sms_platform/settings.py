@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'sms_platform.dbrouter.ReplicaStickinessMiddleware',  # ✅ Lecture de ses propres écritures avec les réplicas
 ]
 
 ROOT_URLCONF = 'sms_platform.urls'
@@ -84,6 +85,36 @@ DATABASES = {
     }
 }
 
+# ✅ Réplicas en lecture (streaming PostgreSQL): DB_REPLICAS="hote[:port][/base],..."
+# Utilisés par les vues de liste, messages, recherche et historique (sms_platform/dbrouter.py),
+# seulement avec un cache commun aux process (CACHES: Redis, Memcached...), ignorés avec LocMemCache
+# Tests: réplicas miroirs du primaire, ou bases de test distinctes avec DB_REPLICAS_TEST_SEPARATE=True
+# (deux PostgreSQL locaux, tests réels du routage: voir README)
+REPLICAS_TEST_SEPARATE = os.getenv('DB_REPLICAS_TEST_SEPARATE', 'False') == 'True'
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    address, _, name = replica.strip().partition('/')
+    host, _, port = address.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'OPTIONS': {'connect_timeout': 2},  # Réplica injoignable: repli rapide sur le primaire
+        'TEST': {} if REPLICAS_TEST_SEPARATE else {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['sms_platform.dbrouter.ReplicaRouter']
+
+DATABASE_REPLICA_CONFIG = {
+    'ALIASES': [alias for alias in DATABASES if alias.startswith('replica_')],
+    'STICKY_SECONDS': int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5)),  # Lectures sur le primaire après une écriture de l'utilisateur
+    'MAX_LAG_SECONDS': int(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', 10)),  # Au-delà, le réplica est écarté
+    'CHECK_INTERVAL': 5,  # Secondes entre deux mesures du retard (par process)
+    # Cache commun aux process: None = détecté (pas LocMemCache), True/False pour forcer
+    'SHARED_CACHE': None,
+    'MIGRATE': REPLICAS_TEST_SEPARATE,  # Schéma créé aussi sur les réplicas (bases de test indépendantes)
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -195,16 +226,26 @@ if DEBUG:
     ]
 
 # ✅ Configuration des WebSockets (Django Channels)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-        # Pour la production, utilisez Redis:
-        # 'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        # 'CONFIG': {
-        #     "hosts": [('127.0.0.1', 6379)],
-        # },
-    },
-}
+# 'postgres': LISTEN/NOTIFY sur la base par défaut, partagé entre processus daphne/gunicorn/commandes
+# 'memory': un seul process (les notifications émises ailleurs ne parviennent pas aux WebSockets)
+if os.getenv('CHANNEL_LAYER_BACKEND', 'postgres') == 'postgres':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'sms_platform.channel_layer.PostgresChannelLayer',
+            'CONFIG': {
+                'database': 'default',
+                'prefix': os.getenv('CHANNEL_LAYER_PREFIX', 'sms'),  # Canaux NOTIFY distincts par déploiement
+                'expiry': 60,  # Secondes avant l'abandon d'un message non lu
+                'capacity': 100,  # Messages en attente par WebSocket, au-delà ignorés
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
 
 # ✅ Configuration du logging AMÉLIORÉE
 LOGGING = {
@@ -287,6 +328,141 @@ ORANGE_SMS_CONFIG = {
     'BASE_URL': os.getenv('ORANGE_BASE_URL', 'https://api.orange.com'),
     'SENDER_PHONE': os.getenv('ORANGE_SENDER_PHONE'),
     'DEFAULT_SENDER_NAME': 'SMS215858',
+    # Transport HTTP partagé (account/transport.py)
+    'TRANSPORT': {
+        'BACKEND': 'account.transport.RequestsBackend',
+        'BASE_URL': os.getenv('ORANGE_TRANSPORT_URL'),  # ex: http://127.0.0.1:8089 (manage.py run_orange_stub)
+        'POOL_SIZE': int(os.getenv('ORANGE_POOL_SIZE', 20)),
+        'CONNECT_TIMEOUT': 5,
+        'READ_TIMEOUT': 30,
+        'KEEP_ALIVE': True,
+    },
+    # Client asynchrone httpx (account.async_services.AsyncOrangeClient)
+    'ASYNC': {
+        'MAX_CONCURRENCY': int(os.getenv('ORANGE_ASYNC_CONCURRENCY', 200)),
+    },
+    # Débit du contrat Orange, partagé par tous les process (account.ratelimit)
+    'RATE_LIMIT': {
+        'ENABLED': True,
+        'BACKEND': 'auto',  # 'postgres' (table partagée), 'local' (mémoire du process) ou 'auto'
+        'RATE': float(os.getenv('ORANGE_RATE_LIMIT', 5)),  # SMS par seconde
+        'BURST': int(os.getenv('ORANGE_RATE_BURST', 10)),
+        'PER_SENDER': {},  # {'+221777567226': {'RATE': 10, 'BURST': 20}}
+        'MAX_WAIT': 30,  # Secondes d'attente maximale d'un jeton
+    },
+    # Cache mémoire du token OAuth (account.services.OrangeTokenProvider)
+    'TOKEN': {
+        'BACKGROUND_REFRESH': True,
+        'RENEW_BEFORE': 300,  # Secondes avant expiration pour le renouvellement anticipé
+    },
+    # Disjoncteur autour des appels Orange (account.circuitbreaker.CircuitBreaker)
+    'CIRCUIT_BREAKER': {
+        'ENABLED': True,
+        'WINDOW': 30,  # Fenêtre glissante d'observation (secondes)
+        'MIN_CALLS': 10,  # Appels minimum dans la fenêtre avant de pouvoir ouvrir
+        'ERROR_THRESHOLD': 0.5,  # Taux d'erreurs (réseau, 5xx, 408, 429) qui ouvre le circuit
+        'SLOW_CALL_SECONDS': 5,  # Au-delà, un appel compte comme lent
+        'SLOW_THRESHOLD': 0.5,  # Taux d'appels lents qui ouvre le circuit
+        'OPEN_SECONDS': 30,  # Durée d'ouverture avant l'appel de test
+        'HALF_OPEN_CALLS': 1,  # Appels de test simultanés en semi-ouvert
+    },
+}
+
+# ✅ Configuration des campagnes d'envoi en masse
+SMS_CAMPAIGN_CONFIG = {
+    'MAX_RECIPIENTS': int(os.getenv('SMS_CAMPAIGN_MAX_RECIPIENTS', 10000)),
+    'MAX_WORKERS': int(os.getenv('SMS_CAMPAIGN_MAX_WORKERS', 8)),  # Envois Orange en parallèle
+    'BATCH_SIZE': 1000,  # Taille des bulk_create et des lots lus par le diffuseur
+    'PROGRESS_INTERVAL': 50,  # Fréquence de mise à jour des compteurs
+    # False: aucune diffusion dans le process web, python manage.py run_campaigns --loop s'en charge
+    'BACKGROUND_THREAD': os.getenv('SMS_CAMPAIGN_BACKGROUND_THREAD', 'True') == 'True',
+    'HEARTBEAT_INTERVAL': 30,  # Secondes entre deux signes de vie d'une diffusion
+    'STALE_AFTER': 600,  # Sans signe de vie depuis ce délai, run_campaigns reprend la campagne
+}
+
+# ✅ Import de contacts CSV/XLSX (sms.services.ContactImportService)
+SMS_CONTACT_IMPORT_CONFIG = {
+    'CHUNK_SIZE': 5000,  # Lignes par upsert et par mise à jour de progression
+    'MAX_FILE_SIZE': int(os.getenv('SMS_CONTACT_IMPORT_MAX_FILE_SIZE', 200 * 1024 * 1024)),  # Octets
+    'MAX_REJECTED_ROWS': 1000,  # Lignes rejetées conservées pour le rapport
+}
+
+# ✅ Ingestion de messages en masse (sms.services.MessageIngestService: campagnes, rafales)
+SMS_INGEST_CONFIG = {
+    'BATCH_SIZE': 1000,  # Messages par bulk_create et par transaction
+    'SUMMARY_CHUNK_SIZE': 500,  # Conversations mises à jour par requête UPDATE
+}
+
+# ✅ Cache des correspondances téléphone -> utilisateur et (utilisateur, téléphone) -> conversation (sms/resolvers.py)
+# Compteurs resolver.<nom>.local_hits / shared_hits / misses exposés par /api/account/metrics/
+SMS_RESOLVER_CACHE_CONFIG = {
+    'ENABLED': os.getenv('SMS_RESOLVER_CACHE_ENABLED', 'True') == 'True',
+    'LOCAL_MAX_SIZE': 10000,  # Entrées gardées en mémoire par process (LRU)
+    'LOCAL_TTL': 60,  # Secondes: durée maximale d'une valeur invalidée par un autre process
+    'SHARED_TTL': 3600,  # Secondes dans le cache Django
+    # Niveau partagé: None = seulement si CACHES['default'] est commun aux process (pas LocMemCache)
+    'SHARED': None,
+}
+
+# ✅ Recherche dans les conversations (plein texte + pg_trgm sous PostgreSQL)
+SMS_SEARCH_CONFIG = {
+    'CONFIG': 'french',  # Configuration plein texte (doit correspondre au trigger de la migration 0008)
+    'HIGHLIGHT': ('«', '»'),  # Délimiteurs des termes trouvés dans les extraits (texte brut, pas de HTML)
+    'SNIPPET_WORDS': 20,  # Longueur maximale des extraits
+}
+
+# ✅ Partitions mensuelles des messages et statuts (PostgreSQL, python manage.py archive_messages)
+# --ensure chaque mois (cron) pour créer les partitions à venir, --archive pour sortir les vieux mois
+SMS_ARCHIVE_CONFIG = {
+    'MONTHS_AHEAD': 3,  # Partitions créées à l'avance
+    'RETENTION_MONTHS': int(os.getenv('SMS_ARCHIVE_RETENTION_MONTHS', 12)),  # Mois conservés en ligne
+    'DIRECTORY': os.getenv('SMS_ARCHIVE_DIRECTORY', os.path.join(BASE_DIR, 'archives')),
+    'FORMAT': 'ndjson',  # 'ndjson' (gzip) ou 'parquet' (nécessite pyarrow)
+    'PARQUET_COMPRESSION': 'zstd',
+    'BATCH_SIZE': 10000,  # Lignes lues / rechargées par lot
+    'LOCK_TIMEOUT': '5s',  # Attente maximale du verrou pour détacher une partition
+}
+
+# ✅ Outbox SMS: la vue enregistre le message, les dispatchers l'envoient
+# (python manage.py run_sms_dispatcher)
+SMS_OUTBOX_CONFIG = {
+    'ENABLED': os.getenv('SMS_OUTBOX_ENABLED', 'False') == 'True',
+    'WORKERS': int(os.getenv('SMS_OUTBOX_WORKERS', 8)),  # Envois Orange simultanés par process
+    'ASYNC_CONCURRENCY': 200,  # Envois simultanés avec run_sms_dispatcher --async (bornés à RATE x MAX_WAIT du limiteur)
+    'BATCH_SIZE': 20,  # Messages réservés par worker (FOR UPDATE SKIP LOCKED)
+    'POLL_INTERVAL': 1.0,  # Secondes d'attente quand l'outbox est vide
+    'CLAIM_TIMEOUT': 300,  # Reprise des messages d'un dispatcher arrêté en cours d'envoi
+    # Reprises des erreurs passagères (timeouts, 5xx, 429...), puis statut 'dead'
+    'RETRY': {
+        'MAX_ATTEMPTS': 5,
+        'BASE_DELAY': 2,  # Secondes, doublé à chaque essai (avec gigue)
+        'MAX_DELAY': 300,
+    },
+}
+
+# ✅ File de réception des SMS entrants et des accusés de réception: les webhooks enregistrent et répondent
+# aussitôt à Orange, messages et statuts sont traités par lots (python manage.py run_inbound_processor)
+# Débit et file exposés par les métriques sms.inbound.* (ingested, backlog, lag_seconds) et sms.receipts.*
+SMS_INBOUND_CONFIG = {
+    'ENABLED': os.getenv('SMS_INBOUND_QUEUE_ENABLED', 'False') == 'True',
+    'BATCH_SIZE': int(os.getenv('SMS_INBOUND_BATCH_SIZE', 500)),  # SMS et accusés réservés par tour (SKIP LOCKED)
+    'POLL_INTERVAL': 0.5,  # Secondes d'attente quand la file est vide
+    'CLAIM_TIMEOUT': 300,  # Reprise des lots d'un processeur arrêté en cours de traitement
+    'MAX_ATTEMPTS': 5,  # Au-delà, la notification passe en 'failed' (visible dans l'admin)
+    'RETRY_DELAY': 30,  # Secondes avant un nouvel essai, multipliées par le nombre d'essais
+    'REPORT_INTERVAL': 60,  # Secondes entre deux relevés de débit dans les logs
+    # Accusés reçus avant l'enregistrement du message_id de l'envoi: gardés puis perdus (sms.receipts.lost)
+    'PENDING_RECEIPT_TTL': int(os.getenv('SMS_PENDING_RECEIPT_TTL', 3600)),  # Secondes
+    'SWEEP_INTERVAL': 60,  # Secondes entre deux passages du processeur sur les accusés en attente
+}
+
+# ✅ Idempotence des webhooks Orange rejoués (sms/dedup.py): SMS entrants et accusés de réception par messageId
+# Compteurs dedup.<inbound|receipt>.local_hits / db_hits / misses et jauge hit_rate dans /api/account/metrics/
+SMS_WEBHOOK_DEDUP_CONFIG = {
+    'ENABLED': True,
+    'LOCAL_MAX_SIZE': 50000,  # Notifications récentes gardées en mémoire par process (LRU)
+    'LOCAL_TTL': 3600,  # Secondes: fenêtre des rejeus acquittés sans requête
+    'RETENTION_DAYS': 7,  # Clés conservées en base (python manage.py purge_webhook_events)
 }
 
 # ✅ Configuration Email (optionnel pour notifications)
@@ -300,6 +476,7 @@ if not DEBUG:
     EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 
 # ✅ Configuration cache (optionnel)
+# Réplicas en lecture: ignorés avec ce cache propre au process, un cache partagé (Redis) porte la fenêtre STICKY_SECONDS
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -338,11 +515,12 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 if DEBUG:
     # Désactiver les migrations pour les tests plus rapides
     import sys
-    if 'test' in sys.argv:
+    if 'test' in sys.argv and not REPLICAS_TEST_SEPARATE:
         DATABASES['default'] = {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': ':memory:'
         }
+        CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
     
     # Toolbar de debug Django (optionnel)
     try: